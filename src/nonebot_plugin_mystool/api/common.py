@@ -1,6 +1,7 @@
+import asyncio
 import json
 import time
-from typing import List, Optional, Tuple, Dict, Any, Union, Type
+from typing import List, Optional, Tuple, Dict, Any, Union, Type, NamedTuple, AsyncIterator
 from urllib.parse import urlencode, urlparse, parse_qs
 
 import httpx
@@ -15,7 +16,8 @@ from ..model import GameRecord, GameInfo, Good, Address, BaseApiStatus, MmtData,
     GetFpStatus, StarRailNoteStatus, StarRailNote, UserAccount, BBSCookies, ExchangePlan, ExchangeResult, plugin_env, \
     plugin_config, QueryGameTokenQrCodeStatus
 from ..utils import generate_device_id, logger, generate_ds, \
-    get_async_retry, generate_seed_id, generate_fp_locally
+    get_async_retry, generate_seed_id, generate_fp_locally, HttpClientManager, cookie_dict_to_str, RequestCache, \
+    is_circuit_open
 
 URL_LOGIN_TICKET_BY_CAPTCHA = "https://webapi.account.mihoyo.com/Api/login_by_mobilecaptcha"
 URL_LOGIN_TICKET_BY_PASSWORD = "https://webapi.account.mihoyo.com/Api/login_by_password"
@@ -386,17 +388,48 @@ class ApiResultHandler(BaseModel):
         return self.message in ["invalid request"]
 
 
+game_record_cache: RequestCache[str, Tuple[BaseApiStatus, Optional[List[GameRecord]]]] = RequestCache(
+    "GameRecord", lambda: plugin_config.preference.game_record_cache_ttl)
+"""用户游戏数据缓存，米游社UID -> 请求结果"""
+game_list_cache: RequestCache[None, Tuple[BaseApiStatus, Optional[List[GameInfo]]]] = RequestCache(
+    "GameInfo", lambda: plugin_config.preference.game_list_cache_ttl)
+"""游戏信息缓存"""
+
+
+def invalidate_game_record(bbs_uid: Optional[str] = None):
+    """
+    使用户游戏数据缓存失效，在登录、删除账户等账户发生变化时调用
+
+    :param bbs_uid: 米游社UID，为空则清空所有用户的缓存
+    """
+    game_record_cache.invalidate(bbs_uid)
+
+
 async def get_game_record(account: UserAccount, retry: bool = True) -> Tuple[BaseApiStatus, Optional[List[GameRecord]]]:
     """
     获取用户绑定的游戏账户信息，返回一个GameRecord对象的列表
 
+    结果会缓存 ``Preference.game_record_cache_ttl`` 秒，同一账户同时发起的多个请求只会实际发送一次。
+
     :param account: 用户账户数据
     :param retry: 是否允许重试
     """
+    status, records = await game_record_cache.get(
+        account.bbs_uid,
+        lambda: _get_game_record(account, retry),
+        lambda result: bool(result[0])
+    )
+    return status, list(records) if records is not None else None
+
+
+async def _get_game_record(account: UserAccount, retry: bool = True) -> Tuple[BaseApiStatus, Optional[List[GameRecord]]]:
+    """
+    请求用户绑定的游戏账户信息（不使用缓存）
+    """
     try:
         async for attempt in get_async_retry(retry):
             with attempt:
-                async with httpx.AsyncClient() as client:
+                async with HttpClientManager.client(URL_GAME_RECORD) as client:
                     res = await client.get(URL_GAME_RECORD.format(account.bbs_uid), headers=HEADERS_GAME_RECORD,
                                            cookies=account.cookies.dict(v2_stoken=True, cookie_type=True),
                                            timeout=plugin_config.preference.timeout)
@@ -415,21 +448,31 @@ async def get_game_record(account: UserAccount, retry: bool = True) -> Tuple[Bas
             return BaseApiStatus(incorrect_return=True), None
         else:
             logger.exception("获取用户游戏数据(GameRecord) - 请求失败")
-            return BaseApiStatus(network_error=True), None
+            return BaseApiStatus(network_error=True, circuit_open=is_circuit_open(e)), None
 
 
 async def get_game_list(retry: bool = True) -> Tuple[BaseApiStatus, Optional[List[GameInfo]]]:
     """
     获取米哈游游戏的详细信息，若返回`None`说明获取失败
 
+    结果会缓存 ``Preference.game_list_cache_ttl`` 秒，同时发起的多个请求只会实际发送一次。
+
     :param retry: 是否允许重试
     """
+    status, game_list = await game_list_cache.get(None, lambda: _get_game_list(retry), lambda result: bool(result[0]))
+    return status, list(game_list) if game_list is not None else None
+
+
+async def _get_game_list(retry: bool = True) -> Tuple[BaseApiStatus, Optional[List[GameInfo]]]:
+    """
+    请求米哈游游戏的详细信息（不使用缓存）
+    """
     headers = HEADERS_BBS_API.copy()
     try:
         async for attempt in get_async_retry(retry):
             with attempt:
                 headers["DS"] = generate_ds()
-                async with httpx.AsyncClient() as client:
+                async with HttpClientManager.client(URL_GAME_LIST) as client:
                     res = await client.get(URL_GAME_LIST, headers=headers, timeout=plugin_config.preference.timeout)
                 api_result = ApiResultHandler(res.json())
                 return BaseApiStatus(success=True), list(
@@ -441,7 +484,7 @@ async def get_game_list(retry: bool = True) -> Tuple[BaseApiStatus, Optional[Lis
             return BaseApiStatus(incorrect_return=True), None
         else:
             logger.exception(f"获取游戏信息(GameInfo) - 请求失败")
-            return BaseApiStatus(network_error=True), None
+            return BaseApiStatus(network_error=True, circuit_open=is_circuit_open(e)), None
 
 
 async def get_user_myb(account: UserAccount, retry: bool = True) -> Tuple[BaseApiStatus, Optional[int]]:
@@ -454,7 +497,7 @@ async def get_user_myb(account: UserAccount, retry: bool = True) -> Tuple[BaseAp
     try:
         async for attempt in get_async_retry(retry):
             with attempt:
-                async with httpx.AsyncClient() as client:
+                async with HttpClientManager.client(URL_MYB) as client:
                     res = await client.get(URL_MYB, headers=HEADERS_MYB,
                                            cookies=account.cookies.dict(v2_stoken=True, cookie_type=True),
                                            timeout=plugin_config.preference.timeout)
@@ -472,7 +515,7 @@ async def get_user_myb(account: UserAccount, retry: bool = True) -> Tuple[BaseAp
             return BaseApiStatus(incorrect_return=True), None
         else:
             logger.exception(f"获取用户米游币 - 请求失败")
-            return BaseApiStatus(network_error=True), None
+            return BaseApiStatus(network_error=True, circuit_open=is_circuit_open(e)), None
 
 
 async def device_login(account: UserAccount, retry: bool = True):
@@ -496,7 +539,7 @@ async def device_login(account: UserAccount, retry: bool = True):
         async for attempt in get_async_retry(retry):
             with attempt:
                 headers["DS"] = generate_ds(data)
-                async with httpx.AsyncClient() as client:
+                async with HttpClientManager.client(URL_DEVICE_LOGIN) as client:
                     res = await client.post(URL_DEVICE_LOGIN, headers=headers, json=data,
                                             cookies=account.cookies.dict(v2_stoken=True, cookie_type=True),
                                             timeout=plugin_config.preference.timeout)
@@ -517,7 +560,7 @@ async def device_login(account: UserAccount, retry: bool = True):
             return BaseApiStatus(incorrect_return=True)
         else:
             logger.exception(f"设备登录(device_login) - 请求失败")
-            return BaseApiStatus(network_error=True)
+            return BaseApiStatus(network_error=True, circuit_open=is_circuit_open(e))
 
 
 async def device_save(account: UserAccount, retry: bool = True):
@@ -541,7 +584,7 @@ async def device_save(account: UserAccount, retry: bool = True):
         async for attempt in get_async_retry(retry):
             with attempt:
                 headers["DS"] = generate_ds(data)
-                async with httpx.AsyncClient() as client:
+                async with HttpClientManager.client(URL_DEVICE_SAVE) as client:
                     res = await client.post(URL_DEVICE_SAVE, headers=headers, json=data,
                                             cookies=account.cookies.dict(v2_stoken=True, cookie_type=True),
                                             timeout=plugin_config.preference.timeout)
@@ -562,31 +605,56 @@ async def device_save(account: UserAccount, retry: bool = True):
             return BaseApiStatus(incorrect_return=True)
         else:
             logger.exception(f"设备保存(device_save) - 请求失败")
-            return BaseApiStatus(network_error=True)
+            return BaseApiStatus(network_error=True, circuit_open=is_circuit_open(e))
+
+
+good_detail_cache: RequestCache[str, Tuple[GetGoodDetailStatus, Optional[Dict[str, Any]]]] = RequestCache(
+    "GoodDetail", lambda: plugin_config.preference.good_detail_cache_ttl)
+"""商品详细信息缓存，商品ID -> (请求状态, 接口返回的商品数据)"""
 
 
 async def get_good_detail(good: Union[Good, str], retry: bool = True) -> Tuple[GetGoodDetailStatus, Optional[Good]]:
     """
     获取某商品的详细信息
 
+    同一商品同时发起的多个请求只会实际发送一次，结果会缓存 ``Preference.good_detail_cache_ttl`` 秒。
+
     :param good: 商品对象 / 商品ID，如果指定为商品对象，则会更新商品对象的数据并返回其引用
     :param retry: 是否允许重试
     :return: 商品数据
     """
     good_id = good.goods_id if isinstance(good, Good) else good
+    status, data = await good_detail_cache.get(
+        good_id,
+        lambda: _get_good_detail(good_id, retry),
+        lambda result: result[0].success or result[0].good_not_existed
+    )
+    if data is None:
+        return status, None
+    if isinstance(good, Good):
+        return status, good.update(dict(data))
+    else:
+        return status, Good.parse_obj(data)
+
+
+async def _get_good_detail(good_id: str, retry: bool = True) -> Tuple[GetGoodDetailStatus, Optional[Dict[str, Any]]]:
+    """
+    请求某商品的详细信息（不使用缓存）
+
+    :return: 接口返回的商品数据
+    """
     try:
         async for attempt in get_async_retry(retry):
             with attempt:
-                async with httpx.AsyncClient() as client:
+                async with HttpClientManager.client(URL_CHECK_GOOD) as client:
                     res = await client.get(URL_CHECK_GOOD.format(good_id), timeout=plugin_config.preference.timeout)
                 api_result = ApiResultHandler(res.json())
                 # -2109 商品不存在；-2105 商品已下架
                 if api_result.retcode == -2109 or api_result.message == -2105:
                     return GetGoodDetailStatus(good_not_existed=True), None
-                if isinstance(good, Good):
-                    return GetGoodDetailStatus(success=True), good.update(api_result.data)
-                else:
-                    return GetGoodDetailStatus(success=True), Good.parse_obj(api_result.data)
+                # 确认返回数据可以解析为商品数据
+                Good.parse_obj(api_result.data)
+                return GetGoodDetailStatus(success=True), api_result.data
     except tenacity.RetryError as e:
         if is_incorrect_return(e):
             logger.exception(f"米游币商品兑换 - 获取商品详细信息: 服务器没有正确返回")
@@ -594,7 +662,7 @@ async def get_good_detail(good: Union[Good, str], retry: bool = True) -> Tuple[G
             return GetGoodDetailStatus(incorrect_return=True), None
         else:
             logger.exception(f"米游币商品兑换 - 获取商品详细信息: 网络请求失败")
-            return GetGoodDetailStatus(network_error=True), None
+            return GetGoodDetailStatus(network_error=True, circuit_open=is_circuit_open(e)), None
 
 
 async def get_good_games(retry: bool = True) -> Tuple[BaseApiStatus, Optional[List[Tuple[str, str]]]]:
@@ -607,7 +675,7 @@ async def get_good_games(retry: bool = True) -> Tuple[BaseApiStatus, Optional[Li
     try:
         async for attempt in get_async_retry(retry):
             with attempt:
-                async with httpx.AsyncClient() as client:
+                async with HttpClientManager.client(URL_GOOD_LIST) as client:
                     res = await client.get(URL_GOOD_LIST.format(page=1,
                                                                 game=""),
                                            headers=HEADERS_GOOD_LIST,
@@ -621,7 +689,80 @@ async def get_good_games(retry: bool = True) -> Tuple[BaseApiStatus, Optional[Li
             return BaseApiStatus(incorrect_return=True), None
         else:
             logger.exception("米游币商品兑换 - 获取商品列表: 网络请求失败")
-            return BaseApiStatus(network_error=True), None
+            return BaseApiStatus(network_error=True, circuit_open=is_circuit_open(e)), None
+
+
+GOOD_LIST_PAGE_SIZE = 20
+"""商品信息列表每页的商品数（与 ``URL_GOOD_LIST`` 中的 page_size 一致）"""
+
+
+async def _get_good_list_page(game: str, page: int, retry: bool = True) -> Dict[str, Any]:
+    """
+    获取商品信息列表的某一页
+
+    :param game: 游戏简称
+    :param page: 页码（从1开始）
+    :param retry: 是否允许重试
+    :return: 接口返回的 data 字段
+    :raise tenacity.RetryError
+    """
+    async for attempt in get_async_retry(retry):
+        with attempt:
+            async with HttpClientManager.client(URL_GOOD_LIST) as client:
+                res = await client.get(URL_GOOD_LIST.format(page=page, game=game), headers=HEADERS_GOOD_LIST,
+                                       timeout=plugin_config.preference.timeout)
+            try:
+                data = ApiResultHandler(res.json()).data
+                # 确认返回数据中包含商品列表
+                data["list"]
+            except Exception:
+                logger.debug(f"网络请求返回: {res.text}")
+                raise
+            return data
+
+
+async def iter_good_list(game: str = "", retry: bool = True) -> AsyncIterator[Good]:
+    """
+    逐个获取商品信息
+
+    先获取第一页并根据商品总数计算页数，其余页面并发获取（并发数上限为 ``Preference.good_list_concurrency``），
+    按页码顺序逐个返回商品，调用方无需等待所有页面获取完毕即可开始处理。
+    如果接口没有返回商品总数，则依次获取直到某一页没有商品。
+
+    :param game: 游戏简称（默认为空，即获取所有游戏的商品）
+    :param retry: 是否允许重试
+    :raise tenacity.RetryError
+    """
+    data = await _get_good_list_page(game, 1, retry)
+    for good in data["list"]:
+        yield Good.parse_obj(good)
+    if not data["list"]:
+        return
+
+    total = data.get("total")
+    if total is None:
+        page = 2
+        while goods := (await _get_good_list_page(game, page, retry))["list"]:
+            for good in goods:
+                yield Good.parse_obj(good)
+            page += 1
+        return
+
+    semaphore = asyncio.Semaphore(max(1, plugin_config.preference.good_list_concurrency))
+
+    async def get_page(page_to_get: int):
+        async with semaphore:
+            return await _get_good_list_page(game, page_to_get, retry)
+
+    page_count = -(-int(total) // GOOD_LIST_PAGE_SIZE)
+    tasks = [asyncio.create_task(get_page(page)) for page in range(2, page_count + 1)]
+    try:
+        for task in tasks:
+            for good in (await task)["list"]:
+                yield Good.parse_obj(good)
+    finally:
+        for task in tasks:
+            task.cancel()
 
 
 async def get_good_list(game: str = "", retry: bool = True) -> Tuple[
@@ -635,32 +776,15 @@ async def get_good_list(game: str = "", retry: bool = True) -> Tuple[
     :param retry: 是否允许重试
     :return: 商品信息列表
     """
-    good_list = []
-    page = 1
-
     try:
-        async for attempt in get_async_retry(retry):
-            with attempt:
-                async with httpx.AsyncClient() as client:
-                    res = await client.get(URL_GOOD_LIST.format(page=page,
-                                                                game=game), headers=HEADERS_GOOD_LIST,
-                                           timeout=plugin_config.preference.timeout)
-                api_result = ApiResultHandler(res.json())
-                goods = map(Good.parse_obj, api_result.data["list"])
-                # 判断是否已经读完所有商品
-                if not goods:
-                    break
-                else:
-                    good_list += goods
-                page += 1
-    except tenacity.RetryError as e:
+        good_list = [good async for good in iter_good_list(game, retry)]
+    except (tenacity.RetryError, ValidationError) as e:
         if is_incorrect_return(e):
             logger.exception("获取商品信息列表 - 获取商品列表: 服务器没有正确返回")
-            logger.debug(f"网络请求返回: {res.text}")
             return BaseApiStatus(incorrect_return=True), None
         else:
             logger.exception("获取商品信息列表 - 获取商品列表: 网络请求失败")
-            return BaseApiStatus(network_error=True), None
+            return BaseApiStatus(network_error=True, circuit_open=is_circuit_open(e)), None
 
     return BaseApiStatus(success=True), good_list
 
@@ -677,7 +801,7 @@ async def get_address(account: UserAccount, retry: bool = True) -> Tuple[BaseApi
     try:
         async for attempt in get_async_retry(retry):
             with attempt:
-                async with httpx.AsyncClient() as client:
+                async with HttpClientManager.client(URL_ADDRESS) as client:
                     res = await client.get(URL_ADDRESS.format(
                         round(time.time() * 1000)), headers=headers,
                         cookies=account.cookies.dict(v2_stoken=True, cookie_type=True),
@@ -696,7 +820,7 @@ async def get_address(account: UserAccount, retry: bool = True) -> Tuple[BaseApi
             return BaseApiStatus(incorrect_return=True), None
         else:
             logger.exception("获取地址数据 - 请求失败")
-            return BaseApiStatus(network_error=True), None
+            return BaseApiStatus(network_error=True, circuit_open=is_circuit_open(e)), None
     return BaseApiStatus(success=True), address_list
 
 
@@ -717,8 +841,9 @@ async def check_registrable(phone_number: int, keep_client: bool = False, retry:
     headers = HEADERS_WEBAPI.copy()
     device_id = generate_device_id()
     headers["x-rpc-device_id"] = device_id
+    client = httpx.AsyncClient() if keep_client else None
 
-    async def request():
+    async def request(client: httpx.AsyncClient):
         """
         发送请求的闭包函数
         """
@@ -731,12 +856,8 @@ async def check_registrable(phone_number: int, keep_client: bool = False, retry:
     try:
         async for attempt in get_async_retry(retry):
             with attempt:
-                if keep_client:
-                    client = httpx.AsyncClient()
-                else:
-                    async with httpx.AsyncClient() as client:
-                        res = await request()
-                res = await request()
+                async with HttpClientManager.client(URL_REGISTRABLE, session=client) as session:
+                    res = await request(session)
                 api_result = ApiResultHandler(res.json())
                 return BaseApiStatus(success=True), bool(api_result.data["is_registable"]), device_id, client
     except tenacity.RetryError as e:
@@ -748,7 +869,7 @@ async def check_registrable(phone_number: int, keep_client: bool = False, retry:
             return BaseApiStatus(incorrect_return=True), None, device_id, client
         else:
             logger.exception(f"检查用户 {phone_number} 是否可以注册 - 请求失败")
-            return BaseApiStatus(network_error=True), None, device_id, None
+            return BaseApiStatus(network_error=True, circuit_open=is_circuit_open(e)), None, device_id, None
 
 
 async def create_mmt(client: Optional[httpx.AsyncClient] = None,
@@ -775,7 +896,7 @@ async def create_mmt(client: Optional[httpx.AsyncClient] = None,
     if use_v4:
         headers.setdefault("x-rpc-source", "accountWebsite")
 
-    async def request():
+    async def request(client: httpx.AsyncClient):
         """
         发送请求的闭包函数
         """
@@ -788,11 +909,8 @@ async def create_mmt(client: Optional[httpx.AsyncClient] = None,
     try:
         async for attempt in get_async_retry(retry):
             with attempt:
-                if client:
-                    res = await request()
-                else:
-                    async with httpx.AsyncClient() as client:
-                        res = await request()
+                async with HttpClientManager.client(URL_CREATE_MMT, session=client) as session:
+                    res = await request(session)
                 api_result = ApiResultHandler(res.json())
                 return BaseApiStatus(success=True), MmtData.parse_obj(api_result.data["mmt_data"]), device_id, client
     except tenacity.RetryError as e:
@@ -804,7 +922,7 @@ async def create_mmt(client: Optional[httpx.AsyncClient] = None,
             return BaseApiStatus(incorrect_return=True), None, device_id, client
         else:
             logger.exception("获取短信验证-人机验证任务(create_mmt) - 请求失败")
-            return BaseApiStatus(network_error=True), None, device_id, None
+            return BaseApiStatus(network_error=True, circuit_open=is_circuit_open(e)), None, device_id, None
 
 
 async def create_mobile_captcha(phone_number: str,
@@ -854,7 +972,7 @@ async def create_mobile_captcha(phone_number: str,
             "t": round(time.time() * 1000)
         }
 
-    async def request():
+    async def request(client: httpx.AsyncClient):
         """
         发送请求的闭包函数
         """
@@ -866,11 +984,10 @@ async def create_mobile_captcha(phone_number: str,
     try:
         async for attempt in get_async_retry(retry):
             with attempt:
-                if client and not client.is_closed:
-                    res = await request()
-                else:
-                    async with httpx.AsyncClient() as client:
-                        res = await request()
+                if client is not None and client.is_closed:
+                    client = None
+                async with HttpClientManager.client(URL_CREATE_MOBILE_CAPTCHA, session=client) as session:
+                    res = await request(session)
                 api_result = ApiResultHandler(res.json())
                 if api_result.success:
                     return CreateMobileCaptchaStatus(success=True), client
@@ -893,7 +1010,7 @@ async def create_mobile_captcha(phone_number: str,
             return CreateMobileCaptchaStatus(incorrect_return=True), client
         else:
             logger.exception("发送短信验证码 - 请求失败")
-            return CreateMobileCaptchaStatus(network_error=True), None
+            return CreateMobileCaptchaStatus(network_error=True, circuit_open=is_circuit_open(e)), None
 
 
 async def get_login_ticket_by_captcha(phone_number: str,
@@ -927,7 +1044,7 @@ async def get_login_ticket_by_captcha(phone_number: str,
     }
     encoded_params = urlencode(params)
 
-    async def request():
+    async def request(client: httpx.AsyncClient):
         """
         发送请求的闭包函数
         """
@@ -941,11 +1058,8 @@ async def get_login_ticket_by_captcha(phone_number: str,
     try:
         async for attempt in get_async_retry(retry):
             with attempt:
-                if client is not None:
-                    res = await request()
-                else:
-                    async with httpx.AsyncClient() as client:
-                        res = await request()
+                async with HttpClientManager.client(URL_LOGIN_TICKET_BY_CAPTCHA, session=client) as session:
+                    res = await request(session)
                 api_result = ApiResultHandler(res.json())
                 if api_result.success:
                     cookies = BBSCookies.parse_obj(dict_from_cookiejar(
@@ -969,7 +1083,7 @@ async def get_login_ticket_by_captcha(phone_number: str,
             return GetCookieStatus(incorrect_return=True), None
         else:
             logger.exception(f"通过短信验证码获取 login_ticket: 网络请求失败")
-            return GetCookieStatus(network_error=True), None
+            return GetCookieStatus(network_error=True, circuit_open=is_circuit_open(e)), None
 
 
 async def get_multi_token_by_login_ticket(cookies: BBSCookies, retry: bool = True) -> Tuple[
@@ -989,7 +1103,7 @@ async def get_multi_token_by_login_ticket(cookies: BBSCookies, retry: bool = Tru
     try:
         async for attempt in get_async_retry(retry):
             with attempt:
-                async with httpx.AsyncClient() as client:
+                async with HttpClientManager.client(URL_MULTI_TOKEN_BY_LOGIN_TICKET) as client:
                     res = await client.get(
                         URL_MULTI_TOKEN_BY_LOGIN_TICKET.format(cookies.login_ticket, cookies.bbs_uid),
                         headers=HEADERS_API_TAKUMI_PC,
@@ -1011,7 +1125,7 @@ async def get_multi_token_by_login_ticket(cookies: BBSCookies, retry: bool = Tru
             return GetCookieStatus(incorrect_return=True), None
         else:
             logger.exception(f"通过 login_ticket 获取 stoken: 网络请求失败")
-            return GetCookieStatus(network_error=True), None
+            return GetCookieStatus(network_error=True, circuit_open=is_circuit_open(e)), None
 
 
 async def get_cookie_token_by_captcha(phone_number: str, captcha: int, retry: bool = True) -> Tuple[
@@ -1032,7 +1146,7 @@ async def get_cookie_token_by_captcha(phone_number: str, captcha: int, retry: bo
     try:
         async for attempt in get_async_retry(retry):
             with attempt:
-                async with httpx.AsyncClient() as client:
+                async with HttpClientManager.client(URL_COOKIE_TOKEN_BY_CAPTCHA) as client:
                     res = await client.post(URL_COOKIE_TOKEN_BY_CAPTCHA,
                                             headers=HEADERS_API_TAKUMI_PC,
                                             json={
@@ -1063,7 +1177,7 @@ async def get_cookie_token_by_captcha(phone_number: str, captcha: int, retry: bo
             return GetCookieStatus(incorrect_return=True), None
         else:
             logger.exception(f"通过短信验证码获取 cookie_token: 网络请求失败")
-            return GetCookieStatus(network_error=True), None
+            return GetCookieStatus(network_error=True, circuit_open=is_circuit_open(e)), None
 
 
 async def get_login_ticket_by_password(account: str, password: str, mmt_data: MmtData, geetest_result: GeetestResult,
@@ -1094,7 +1208,7 @@ async def get_login_ticket_by_password(account: str, password: str, mmt_data: Mm
     try:
         async for attempt in get_async_retry(retry):
             with attempt:
-                async with httpx.AsyncClient() as client:
+                async with HttpClientManager.client(URL_LOGIN_TICKET_BY_PASSWORD) as client:
                     res = await client.post(
                         URL_LOGIN_TICKET_BY_PASSWORD,
                         content=encoded_params,
@@ -1115,7 +1229,7 @@ async def get_login_ticket_by_password(account: str, password: str, mmt_data: Mm
             return GetCookieStatus(incorrect_return=True), None
         else:
             logger.exception("使用密码登录获取login_ticket - 请求失败")
-            return GetCookieStatus(network_error=True), None
+            return GetCookieStatus(network_error=True, circuit_open=is_circuit_open(e)), None
 
 
 async def get_cookie_token_by_stoken(cookies: BBSCookies, device_id: str = None, retry: bool = True) -> Tuple[
@@ -1140,7 +1254,7 @@ async def get_cookie_token_by_stoken(cookies: BBSCookies, device_id: str = None,
     try:
         async for attempt in get_async_retry(retry):
             with attempt:
-                async with httpx.AsyncClient() as client:
+                async with HttpClientManager.client(URL_COOKIE_TOKEN_BY_STOKEN) as client:
                     res = await client.get(
                         URL_COOKIE_TOKEN_BY_STOKEN,
                         cookies=cookies.dict(v2_stoken=True, cookie_type=True),
@@ -1166,7 +1280,7 @@ async def get_cookie_token_by_stoken(cookies: BBSCookies, device_id: str = None,
             return GetCookieStatus(incorrect_return=True), None
         else:
             logger.exception("通过 stoken 获取 cookie_token: 网络请求失败")
-            return GetCookieStatus(network_error=True), None
+            return GetCookieStatus(network_error=True, circuit_open=is_circuit_open(e)), None
 
 
 async def get_stoken_v2_by_v1(cookies: BBSCookies, device_id: str = None, retry: bool = True) -> Tuple[
@@ -1194,7 +1308,7 @@ async def get_stoken_v2_by_v1(cookies: BBSCookies, device_id: str = None, retry:
     try:
         async for attempt in get_async_retry(retry):
             with attempt:
-                async with httpx.AsyncClient() as client:
+                async with HttpClientManager.client(URL_STOKEN_V2_BY_V1) as client:
                     headers.setdefault("DS", generate_ds(salt=plugin_env.salt_config.SALT_PROD))
                     res = await client.post(
                         URL_STOKEN_V2_BY_V1,
@@ -1222,7 +1336,7 @@ async def get_stoken_v2_by_v1(cookies: BBSCookies, device_id: str = None, retry:
             return GetCookieStatus(incorrect_return=True), None
         else:
             logger.exception("通过 stoken_v1 获取 stoken_v2: 网络请求失败")
-            return GetCookieStatus(network_error=True), None
+            return GetCookieStatus(network_error=True, circuit_open=is_circuit_open(e)), None
 
 
 async def get_ltoken_by_stoken(cookies: BBSCookies, device_id: str = None, retry: bool = True) -> Tuple[
@@ -1249,7 +1363,7 @@ async def get_ltoken_by_stoken(cookies: BBSCookies, device_id: str = None, retry
     try:
         async for attempt in get_async_retry(retry):
             with attempt:
-                async with httpx.AsyncClient() as client:
+                async with HttpClientManager.client(URL_LTOKEN_BY_STOKEN) as client:
                     res = await client.get(
                         URL_LTOKEN_BY_STOKEN,
                         cookies=cookies.dict(v2_stoken=True, cookie_type=True),
@@ -1273,7 +1387,7 @@ async def get_ltoken_by_stoken(cookies: BBSCookies, device_id: str = None, retry
             return GetCookieStatus(incorrect_return=True), None
         else:
             logger.exception("通过 stoken 获取 ltoken: 网络请求失败")
-            return GetCookieStatus(network_error=True), None
+            return GetCookieStatus(network_error=True, circuit_open=is_circuit_open(e)), None
 
 
 async def get_device_fp(device_id: str, retry: bool = True) -> Tuple[GetFpStatus, Optional[str]]:
@@ -1307,7 +1421,7 @@ async def get_device_fp(device_id: str, retry: bool = True) -> Tuple[GetFpStatus
     try:
         async for attempt in get_async_retry(retry):
             with attempt:
-                async with httpx.AsyncClient() as client:
+                async with HttpClientManager.client(URL_GET_DEVICE_FP) as client:
                     res = await client.post(
                         URL_GET_DEVICE_FP,
                         json=content,
@@ -1331,18 +1445,31 @@ async def get_device_fp(device_id: str, retry: bool = True) -> Tuple[GetFpStatus
             return GetFpStatus(incorrect_return=True), None
         else:
             logger.exception("获取 x-rpc-device_fp: 网络请求失败")
-            return GetFpStatus(network_error=True), None
+            return GetFpStatus(network_error=True, circuit_open=is_circuit_open(e)), None
 
 
-async def good_exchange(plan: ExchangePlan) -> Tuple[ExchangeStatus, Optional[ExchangeResult]]:
+class PreparedExchange(NamedTuple):
+    """
+    预先构建好的兑换请求，兑换时只需发送
     """
-    执行米游币商品兑换
+    plan: ExchangePlan
+    """兑换计划"""
+    headers: Dict[str, str]
+    """请求头（已包含 Cookie）"""
+    content: bytes
+    """已序列化的请求体"""
+
+
+def prepare_exchange(plan: ExchangePlan) -> PreparedExchange:
+    """
+    构建兑换请求的请求头和请求体
 
     :param plan: 兑换计划
     """
-    headers = HEADERS_EXCHANGE
+    headers = HEADERS_EXCHANGE.copy()
     headers["x-rpc-device_id"] = plan.account.device_id_ios
     headers["x-rpc-device_fp"] = plan.account.device_fp or generate_fp_locally()
+    headers["Cookie"] = cookie_dict_to_str(plan.account.cookies.dict(cookie_type=True))
     content = {
         "app_id": 1,
         "point_sn": "myb",
@@ -1357,99 +1484,63 @@ async def good_exchange(plan: ExchangePlan) -> Tuple[ExchangeStatus, Optional[Ex
         content.setdefault("region", plan.game_record.region)
         # 例: hk4e_cn
         content.setdefault("game_biz", plan.good.game_biz)
-    start_time = 0
-    try:
-        start_time = time.time()
-        async with httpx.AsyncClient() as client:
-            res = await client.post(
-                URL_EXCHANGE, headers=headers, json=content,
-                cookies=plan.account.cookies.dict(cookie_type=True),
-                timeout=plugin_config.preference.timeout)
-        api_result = ApiResultHandler(res.json())
-        if api_result.login_expired:
-            logger.info(
-                f"米游币商品兑换 - 执行兑换: 用户 {plan.account.display_name} 登录失效 - 请求发送时间: {start_time}")
-            logger.debug(f"网络请求返回: {res.text}")
-            return ExchangeStatus(login_expired=True), None
-        if api_result.success:
-            logger.info(
-                f"米游币商品兑换: 用户 {plan.account.display_name} 商品 {plan.good.goods_id} 兑换成功！可以自行确认 - 请求发送时间: {start_time}")
-            logger.debug(f"网络请求返回: {res.text}")
-            return ExchangeStatus(success=True), ExchangeResult(result=True, return_data=res.json(), plan=plan)
-        else:
-            logger.info(
-                f"米游币商品兑换: 用户 {plan.account.display_name} 商品 {plan.good.goods_id} 兑换失败，可以自行确认 - 请求发送时间: {start_time}")
-            logger.debug(f"网络请求返回: {res.text}")
-            return ExchangeStatus(success=True), ExchangeResult(result=False, return_data=res.json(), plan=plan)
-    except Exception as e:
-        if is_incorrect_return(e):
-            logger.error(
-                f"米游币商品兑换: 用户 {plan.account.display_name} 商品 {plan.good.goods_id} 服务器没有正确返回 - 请求发送时间: {start_time}")
-            logger.debug(f"网络请求返回: {res.text}")
-            return ExchangeStatus(incorrect_return=True), None
-        else:
-            logger.exception(
-                f"米游币商品兑换: 用户 {plan.account.display_name} 商品 {plan.good.goods_id} 请求失败 - 请求发送时间: {start_time}")
-            return ExchangeStatus(network_error=True), None
+    return PreparedExchange(plan=plan, headers=headers, content=json.dumps(content).encode())
+
+
+def _exchange_result(
+        prepared: PreparedExchange,
+        res: httpx.Response,
+        start_time: float
+) -> Tuple[ExchangeStatus, Optional[ExchangeResult]]:
+    """
+    处理兑换请求的返回结果
+    """
+    plan = prepared.plan
+    api_result = ApiResultHandler(res.json())
+    if api_result.login_expired:
+        logger.info(
+            f"米游币商品兑换 - 执行兑换: 用户 {plan.account.display_name} 登录失效 - 请求发送时间: {start_time}")
+        logger.debug(f"网络请求返回: {res.text}")
+        return ExchangeStatus(login_expired=True), None
+    if api_result.success:
+        logger.info(
+            f"米游币商品兑换: 用户 {plan.account.display_name} 商品 {plan.good.goods_id} 兑换成功！可以自行确认 - 请求发送时间: {start_time}")
+        logger.debug(f"网络请求返回: {res.text}")
+        return ExchangeStatus(success=True), ExchangeResult(result=True, return_data=res.json(), plan=plan)
+    else:
+        logger.info(
+            f"米游币商品兑换: 用户 {plan.account.display_name} 商品 {plan.good.goods_id} 兑换失败，可以自行确认 - 请求发送时间: {start_time}")
+        logger.debug(f"网络请求返回: {res.text}")
+        return ExchangeStatus(success=True), ExchangeResult(result=False, return_data=res.json(), plan=plan)
 
 
-def good_exchange_sync(plan: ExchangePlan) -> Tuple[ExchangeStatus, Optional[ExchangeResult]]:
+async def send_exchange(prepared: PreparedExchange) -> Tuple[ExchangeStatus, Optional[ExchangeResult]]:
     """
-    执行米游币商品兑换
+    发送预先构建好的兑换请求
 
-    :param plan: 兑换计划
+    :param prepared: 预先构建好的兑换请求
     """
-    headers = HEADERS_EXCHANGE
-    headers["x-rpc-device_id"] = plan.account.device_id_ios
-    headers["x-rpc-device_fp"] = plan.account.device_fp or generate_fp_locally()
-    content = {
-        "app_id": 1,
-        "point_sn": "myb",
-        "goods_id": plan.good.goods_id,
-        "exchange_num": 1
-    }
-    if plan.address is not None:
-        content.setdefault("address_id", plan.address.id)
-    if plan.game_record is not None:
-        content.setdefault("uid", plan.game_record.game_role_id)
-        # 例: cn_gf01
-        content.setdefault("region", plan.game_record.region)
-        # 例: hk4e_cn
-        content.setdefault("game_biz", plan.good.game_biz)
+    plan = prepared.plan
     start_time = 0
+    res = None
     try:
-        start_time = time.time()
-        with httpx.Client() as client:
-            res = client.post(
-                URL_EXCHANGE, headers=headers, json=content,
-                cookies=plan.account.cookies.dict(cookie_type=True),
+        # 兑换请求不占用主机并发请求名额，避免在开售时刻排队等待
+        async with HttpClientManager.client(URL_EXCHANGE, limited=False) as client:
+            start_time = time.time()
+            res = await client.post(
+                URL_EXCHANGE, headers=prepared.headers, content=prepared.content,
                 timeout=plugin_config.preference.timeout)
-        api_result = ApiResultHandler(res.json())
-        if api_result.login_expired:
-            logger.info(
-                f"米游币商品兑换 - 执行兑换: 用户 {plan.account.display_name} 登录失效 - 请求发送时间: {start_time}")
-            logger.debug(f"网络请求返回: {res.text}")
-            return ExchangeStatus(login_expired=True), None
-        if api_result.success:
-            logger.info(
-                f"米游币商品兑换: 用户 {plan.account.display_name} 商品 {plan.good.goods_id} 兑换成功！可以自行确认 - 请求发送时间: {start_time}")
-            logger.debug(f"网络请求返回: {res.text}")
-            return ExchangeStatus(success=True), ExchangeResult(result=True, return_data=res.json(), plan=plan)
-        else:
-            logger.info(
-                f"米游币商品兑换: 用户 {plan.account.display_name} 商品 {plan.good.goods_id} 兑换失败，可以自行确认 - 请求发送时间: {start_time}")
-            logger.debug(f"网络请求返回: {res.text}")
-            return ExchangeStatus(success=True), ExchangeResult(result=False, return_data=res.json(), plan=plan)
+        return _exchange_result(prepared, res, start_time)
     except Exception as e:
         if is_incorrect_return(e):
             logger.error(
                 f"米游币商品兑换: 用户 {plan.account.display_name} 商品 {plan.good.goods_id} 服务器没有正确返回 - 请求发送时间: {start_time}")
-            logger.debug(f"网络请求返回: {res.text}")
+            logger.debug(f"网络请求返回: {res.text if res else None}")
             return ExchangeStatus(incorrect_return=True), None
         else:
             logger.exception(
                 f"米游币商品兑换: 用户 {plan.account.display_name} 商品 {plan.good.goods_id} 请求失败 - 请求发送时间: {start_time}")
-            return ExchangeStatus(network_error=True), None
+            return ExchangeStatus(network_error=True, circuit_open=is_circuit_open(e)), None
 
 
 async def genshin_note(account: UserAccount) -> Tuple[
@@ -1486,7 +1577,7 @@ async def genshin_note(account: UserAccount) -> Tuple[
                     with attempt:
                         headers["DS"] = generate_ds(
                             params={"role_id": record.game_role_id, "server": record.region})
-                        async with httpx.AsyncClient() as client:
+                        async with HttpClientManager.client(URL_GENSHEN_NOTE_BBS) as client:
                             res = await client.get(
                                 URL_GENSHEN_NOTE_BBS,
                                 headers=headers,
@@ -1512,7 +1603,7 @@ async def genshin_note(account: UserAccount) -> Tuple[
                         if not api_result.success:
                             headers["DS"] = generate_ds()
                             headers["x-rpc-device_id"] = account.device_id_ios
-                            async with httpx.AsyncClient() as client:
+                            async with HttpClientManager.client(URL_GENSHEN_NOTE_WIDGET) as client:
                                 res = await client.get(
                                     URL_GENSHEN_NOTE_WIDGET,
                                     headers=headers,
@@ -1530,7 +1621,7 @@ async def genshin_note(account: UserAccount) -> Tuple[
                     return GenshinNoteStatus(incorrect_return=True), None
                 else:
                     logger.exception(f"原神实时便笺: 请求失败")
-                    return GenshinNoteStatus(network_error=True), None
+                    return GenshinNoteStatus(network_error=True, circuit_open=is_circuit_open(e)), None
     if flag:
         return GenshinNoteStatus(no_genshin_account=True), None
 
@@ -1566,7 +1657,7 @@ async def starrail_note(account: UserAccount) -> Tuple[
                 async for attempt in get_async_retry(False):
                     with attempt:
                         headers["DS"] = generate_ds(data={})
-                        async with httpx.AsyncClient() as client:
+                        async with HttpClientManager.client(url) as client:
                             cookies = account.cookies.dict(v2_stoken=True, cookie_type=True)
                             res = await client.get(url, headers=headers,
                                                    cookies=cookies,
@@ -1594,7 +1685,7 @@ async def starrail_note(account: UserAccount) -> Tuple[
                     return StarRailNoteStatus(incorrect_return=True), None
                 else:
                     logger.exception("崩铁实时便笺: 请求失败")
-                    return StarRailNoteStatus(network_error=True), None
+                    return StarRailNoteStatus(network_error=True, circuit_open=is_circuit_open(e)), None
     if flag:
         return StarRailNoteStatus(no_starrail_account=True), None
 
@@ -1618,7 +1709,7 @@ async def create_verification(
                 headers["x-rpc-device_fp"] = account.device_fp if account and account.device_fp else \
                     generate_fp_locally()
                 headers["DS"] = generate_ds()
-                async with httpx.AsyncClient() as client:
+                async with HttpClientManager.client(URL_CREATE_VERIFICATION) as client:
                     res = await client.get(
                         URL_CREATE_VERIFICATION,
                         headers=headers,
@@ -1634,7 +1725,7 @@ async def create_verification(
             return BaseApiStatus(incorrect_return=True), None
         else:
             logger.exception("创建人机验证任务(create_verification) - 请求失败")
-            return BaseApiStatus(network_error=True), None
+            return BaseApiStatus(network_error=True, circuit_open=is_circuit_open(e)), None
 
 
 async def verify_verification(
@@ -1665,7 +1756,7 @@ async def verify_verification(
                 headers["x-rpc-device_fp"] = account.device_fp if account and account.device_fp else \
                     generate_fp_locally()
                 headers["DS"] = generate_ds()
-                async with httpx.AsyncClient() as client:
+                async with HttpClientManager.client(URL_VERIFY_VERIFICATION) as client:
                     res = await client.post(
                         URL_VERIFY_VERIFICATION,
                         headers=headers,
@@ -1684,7 +1775,7 @@ async def verify_verification(
             return BaseApiStatus(incorrect_return=True)
         else:
             logger.exception("验证人机验证结果(verify_verification) - 请求失败")
-            return BaseApiStatus(network_error=True)
+            return BaseApiStatus(network_error=True, circuit_open=is_circuit_open(e))
 
 
 async def fetch_game_token_qrcode(
@@ -1707,7 +1798,7 @@ async def fetch_game_token_qrcode(
                     "app_id": app_id,
                     "device": device_id,
                 }
-                async with httpx.AsyncClient() as client:
+                async with HttpClientManager.client(URL_FETCH_GAME_TOKEN_QRCODE) as client:
                     res = await client.post(
                         URL_FETCH_GAME_TOKEN_QRCODE,
                         json=content,
@@ -1728,7 +1819,7 @@ async def fetch_game_token_qrcode(
             return BaseApiStatus(incorrect_return=True), None
         else:
             logger.exception("获取米游社扫码登录(fetch_game_token_qrcode) - 请求失败")
-            return BaseApiStatus(network_error=True), None
+            return BaseApiStatus(network_error=True, circuit_open=is_circuit_open(e)), None
 
 
 async def query_game_token_qrcode(
@@ -1754,7 +1845,7 @@ async def query_game_token_qrcode(
                     "device": device_id,
                     "ticket": ticket
                 }
-                async with httpx.AsyncClient() as client:
+                async with HttpClientManager.client(URL_QUERY_GAME_TOKEN_QRCODE) as client:
                     res = await client.post(
                         URL_QUERY_GAME_TOKEN_QRCODE,
                         json=content,
@@ -1784,7 +1875,7 @@ async def query_game_token_qrcode(
             return QueryGameTokenQrCodeStatus(incorrect_return=True), None
         else:
             logger.exception("查询米游社扫码登录(query_game_token_qrcode) - 请求失败")
-            return QueryGameTokenQrCodeStatus(network_error=True), None
+            return QueryGameTokenQrCodeStatus(network_error=True, circuit_open=is_circuit_open(e)), None
 
 
 async def get_token_by_game_token(
@@ -1806,7 +1897,7 @@ async def get_token_by_game_token(
                     "account_id": int(bbs_uid),
                     "game_token": game_token
                 }
-                async with httpx.AsyncClient() as client:
+                async with HttpClientManager.client(URL_GET_TOKEN_BY_GAME_TOKEN) as client:
                     res = await client.post(
                         URL_GET_TOKEN_BY_GAME_TOKEN,
                         headers={"x-rpc-app_id": "bll8iq97cem8"},
@@ -1828,7 +1919,7 @@ async def get_token_by_game_token(
             return BaseApiStatus(incorrect_return=True), None
         else:
             logger.exception("通过 GameToken 获取 SToken(get_token_by_game_token) - 请求失败")
-            return BaseApiStatus(network_error=True), None
+            return BaseApiStatus(network_error=True, circuit_open=is_circuit_open(e)), None
 
 
 async def get_cookie_token_by_game_token(
@@ -1850,7 +1941,7 @@ async def get_cookie_token_by_game_token(
                     "account_id": int(bbs_uid),
                     "game_token": game_token
                 }
-                async with httpx.AsyncClient() as client:
+                async with HttpClientManager.client(URL_GET_COOKIE_TOKEN_BY_GAME_TOKEN) as client:
                     res = await client.post(
                         URL_GET_COOKIE_TOKEN_BY_GAME_TOKEN,
                         headers={"x-rpc-app_id": "bll8iq97cem8"},
@@ -1871,7 +1962,7 @@ async def get_cookie_token_by_game_token(
             return BaseApiStatus(incorrect_return=True), None
         else:
             logger.exception("通过 GameToken 获取 CookieToken(get_cookie_token_by_game_token) - 请求失败")
-            return BaseApiStatus(network_error=True), None
+            return BaseApiStatus(network_error=True, circuit_open=is_circuit_open(e)), None
 
 
 
@@ -1938,7 +2029,7 @@ async def get_mys_official_message(uid: str) -> List[Dict[str, str]]:
     }
     
     try:
-        async with httpx.AsyncClient() as client:
+        async with HttpClientManager.client(url) as client:
             response = await client.get(url, headers=headers)
             response_data = response.json()
         
@@ -1,7 +1,6 @@
 from typing import List, Optional, Tuple, Literal, Set, Type
 from urllib.parse import urlencode
 
-import httpx
 import tenacity
 
 from ..api.common import ApiResultHandler, HEADERS_API_TAKUMI_MOBILE, is_incorrect_return, \
@@ -9,7 +8,7 @@ from ..api.common import ApiResultHandler, HEADERS_API_TAKUMI_MOBILE, is_incorre
 from ..model import GameRecord, BaseApiStatus, Award, GameSignInfo, GeetestResult, MmtData, plugin_config, plugin_env, \
     UserAccount
 from ..utils import logger, generate_ds, \
-    get_async_retry
+    get_async_retry, HttpClientManager, is_circuit_open
 
 __all__ = ["BaseGameSign", "GenshinImpactSign", "HonkaiImpact3Sign", "HoukaiGakuen2Sign", "TearsOfThemisSign",
            "StarRailSign", "ZenlessZoneZeroSign"]
@@ -74,7 +73,7 @@ class BaseGameSign:
         try:
             async for attempt in get_async_retry(retry):
                 with attempt:
-                    async with httpx.AsyncClient() as client:
+                    async with HttpClientManager.client(self.url_reward) as client:
                         res = await client.get(self.url_reward, headers=self.headers_reward,
                                                timeout=plugin_config.preference.timeout)
                     award_list = []
@@ -88,7 +87,7 @@ class BaseGameSign:
                 return BaseApiStatus(incorrect_return=True), None
             else:
                 logger.exception(f"获取签到奖励信息 - 请求失败")
-                return BaseApiStatus(network_error=True), None
+                return BaseApiStatus(network_error=True, circuit_open=is_circuit_open(e)), None
 
     async def get_info(
             self,
@@ -108,7 +107,7 @@ class BaseGameSign:
             async for attempt in get_async_retry(retry):
                 with attempt:
                     headers["DS"] = generate_ds() if platform == "ios" else generate_ds(platform="android")
-                    async with httpx.AsyncClient() as client:
+                    async with HttpClientManager.client(self.url_info) as client:
                         res = await client.get(self.url_info, headers=headers,
                                                cookies=self.account.cookies.dict(),
                                                timeout=plugin_config.preference.timeout)
@@ -131,7 +130,7 @@ class BaseGameSign:
                 return BaseApiStatus(incorrect_return=True), None
             else:
                 logger.exception(f"获取签到数据 - 请求失败")
-                return BaseApiStatus(network_error=True), None
+                return BaseApiStatus(network_error=True, circuit_open=is_circuit_open(e)), None
 
     async def sign(self,
                    platform: Literal["ios", "android"] = "ios",
@@ -181,7 +180,7 @@ class BaseGameSign:
                         headers["x-rpc-seccode"] = geetest_result.seccode
                         logger.info("游戏签到 - 尝试使用人机验证结果进行签到")
 
-                    async with httpx.AsyncClient() as client:
+                    async with HttpClientManager.client(self.url_sign) as client:
                         res = await client.post(
                             self.url_sign,
                             headers=headers,
@@ -218,7 +217,7 @@ class BaseGameSign:
                 return BaseApiStatus(incorrect_return=True), None
             else:
                 logger.exception(f"游戏签到 - 请求失败")
-                return BaseApiStatus(network_error=True), None
+                return BaseApiStatus(network_error=True, circuit_open=is_circuit_open(e)), None
 
 
 class GenshinImpactSign(BaseGameSign):
@@ -1,7 +1,6 @@
 import asyncio
-from typing import List, Optional, Tuple, Type, Dict
+from typing import List, Optional, Tuple, Type, Dict, Iterable
 
-import httpx
 import tenacity
 
 from ..api.common import ApiResultHandler, is_incorrect_return, create_verification, \
@@ -9,7 +8,7 @@ from ..api.common import ApiResultHandler, is_incorrect_return, create_verificat
 from ..model import BaseApiStatus, MissionStatus, MissionData, \
     MissionState, UserAccount, plugin_config, plugin_env, UserData
 from ..utils import logger, generate_ds, \
-    get_async_retry, get_validate
+    get_async_retry, get_validate, HttpClientManager, is_circuit_open, RequestCache
 
 URL_SIGN = "https://bbs-api.mihoyo.com/apihub/app/api/signIn"
 URL_GET_POST = "https://bbs-api.miyoushe.com/post/api/feeds/posts?fresh_action=1&gids={}&is_first_initialize=false" \
@@ -77,6 +76,10 @@ HEADERS_OLD = {
     "DS": None
 }
 
+post_feed_cache: RequestCache[int, Tuple[BaseApiStatus, Optional[List[str]]]] = RequestCache(
+    "PostFeed", lambda: plugin_config.preference.post_feed_cache_ttl)
+"""米游币任务文章列表缓存，同一分区的所有账户共享，分区 gids -> (请求状态, 文章ID列表)"""
+
 
 class BaseMission:
     """
@@ -126,7 +129,7 @@ class BaseMission:
                     headers = HEADERS_OLD.copy()
                     headers["x-rpc-device_id"] = self.account.device_id_android
                     headers["DS"] = generate_ds(data=content)
-                    async with httpx.AsyncClient() as client:
+                    async with HttpClientManager.client(URL_SIGN) as client:
                         res = await client.post(
                             URL_SIGN,
                             headers=headers,
@@ -174,22 +177,24 @@ class BaseMission:
                 return MissionStatus(incorrect_return=True), None
             else:
                 logger.exception("米游币任务 - 讨论区签到: 请求失败")
-                return MissionStatus(network_error=True), None
+                return MissionStatus(network_error=True, circuit_open=is_circuit_open(e)), None
 
-    async def get_posts(self, retry: bool = True) -> Tuple[BaseApiStatus, Optional[List[str]]]:
+    async def _get_post_feed(self, retry: bool = True) -> Tuple[BaseApiStatus, Optional[List[str]]]:
         """
-        获取文章ID列表，若失败返回 `None`
+        获取分区文章列表，若失败返回 `None`
+
+        该请求不带账户 Cookie，返回的点赞状态对所有账户都没有意义，因此只保留文章ID。
 
         :param retry: 是否允许重试
         :return: (BaseApiStatus, 文章ID列表)
         """
-        post_id_list = []
+        post_feed = []
         try:
             async for attempt in get_async_retry(retry):
                 with attempt:
                     headers = HEADERS_GET_POSTS.copy()
                     headers["x-rpc-device_id"] = self.account.device_id_ios
-                    async with httpx.AsyncClient() as client:
+                    async with HttpClientManager.client(URL_GET_POST) as client:
                         res = await client.get(
                             URL_GET_POST.format(self.gids),
                             headers=headers,
@@ -197,10 +202,9 @@ class BaseMission:
                         )
                     api_result = ApiResultHandler(res.json())
                     for post in api_result.data["list"]:
-                        if post["self_operation"]["attitude"] == 0:
-                            post_id_list.append(post['post']['post_id'])
+                        post_feed.append(post['post']['post_id'])
                     break
-            return BaseApiStatus(success=True), post_id_list
+            return BaseApiStatus(success=True), post_feed
         except tenacity.RetryError as e:
             if is_incorrect_return(e):
                 logger.exception(f"米游币任务 - 获取文章列表: 服务器没有正确返回")
@@ -208,7 +212,41 @@ class BaseMission:
                 return BaseApiStatus(incorrect_return=True), None
             else:
                 logger.exception(f"米游币任务 - 获取文章列表: 请求失败")
-                return BaseApiStatus(network_error=True), None
+                return BaseApiStatus(network_error=True, circuit_open=is_circuit_open(e)), None
+
+    async def get_posts(
+            self,
+            retry: bool = True,
+            exclude: Iterable[str] = ()
+    ) -> Tuple[BaseApiStatus, Optional[List[str]]]:
+        """
+        获取文章ID列表，若失败返回 `None`
+
+        同一分区的文章列表在有效期内由所有账户共享（见 ``post_feed_cache``），各账户在本地排除已处理的文章，
+        没有剩余文章时才重新获取文章列表；重新获取后仍没有未处理的文章，则返回整个列表（重复阅读、点赞已处理的文章）。
+
+        :param retry: 是否允许重试
+        :param exclude: 需要排除的文章ID（例如本次任务中已经阅读过的文章）
+        :return: (BaseApiStatus, 文章ID列表)
+        """
+        exclude = set(exclude)
+        status, post_id_list = BaseApiStatus(), None
+        for refresh in (False, True):
+            if refresh:
+                post_feed_cache.invalidate(self.gids)
+            status, post_feed = await post_feed_cache.get(
+                self.gids,
+                lambda: self._get_post_feed(retry),
+                lambda result: bool(result[0])
+            )
+            if not status:
+                return status, None
+            post_id_list = [post_id for post_id in post_feed if post_id not in exclude]
+            if post_id_list:
+                break
+        else:
+            post_id_list = post_feed
+        return status, post_id_list
 
     async def read(self, read_times: int = 5, retry: bool = True) -> MissionStatus:
         """
@@ -218,18 +256,21 @@ class BaseMission:
         :param retry: 是否允许重试
         """
         count = 0
+        handled_posts = set()
+        """本次任务中已处理的文章ID"""
         get_post_status, posts = await self.get_posts(retry)
-        if not get_post_status:
+        if not get_post_status or not posts:
             return MissionStatus(failed_getting_post=True)
         while count < read_times:
             for post_id in posts:
                 if count == read_times:
                     break
+                handled_posts.add(post_id)
                 try:
                     async for attempt in get_async_retry(retry):
                         with attempt:
                             self.headers["DS"] = generate_ds(platform="android")
-                            async with httpx.AsyncClient() as client:
+                            async with HttpClientManager.client(URL_READ) as client:
                                 res = await client.get(
                                     URL_READ.format(post_id),
                                     headers=self.headers,
@@ -260,11 +301,13 @@ class BaseMission:
                         return MissionStatus(incorrect_return=True)
                     else:
                         logger.exception(f"米游币任务 - 阅读: 请求失败")
-                        return MissionStatus(network_error=True)
+                        return MissionStatus(network_error=True, circuit_open=is_circuit_open(e))
                 if count != read_times:
                     await asyncio.sleep(plugin_config.preference.sleep_time)
-            get_post_status, posts = await self.get_posts(retry)
-            if not get_post_status:
+            if count == read_times:
+                break
+            get_post_status, posts = await self.get_posts(retry, exclude=handled_posts)
+            if not get_post_status or not posts:
                 return MissionStatus(failed_getting_post=True)
 
         return MissionStatus(success=True)
@@ -277,20 +320,23 @@ class BaseMission:
         :param retry: 是否允许重试
         """
         count = 0
+        handled_posts = set()
+        """本次任务中已处理的文章ID"""
         get_post_status, posts = await self.get_posts(retry)
-        if not get_post_status:
+        if not get_post_status or not posts:
             return MissionStatus(failed_getting_post=True)
         while count < like_times:
             for post_id in posts:
                 if count == like_times:
                     break
+                handled_posts.add(post_id)
                 try:
                     async for attempt in get_async_retry(retry):
                         with attempt:
                             headers = HEADERS_OLD.copy()
                             headers["x-rpc-device_id"] = self.account.device_id_android
                             headers["DS"] = generate_ds(platform="android")
-                            async with httpx.AsyncClient() as client:
+                            async with HttpClientManager.client(URL_LIKE) as client:
                                 res = await client.post(
                                     URL_LIKE, headers=headers,
                                     json={'is_cancel': False, 'post_id': post_id},
@@ -320,11 +366,13 @@ class BaseMission:
                         return MissionStatus(incorrect_return=True)
                     else:
                         logger.exception(f"米游币任务 - 点赞: 请求失败")
-                        return MissionStatus(network_error=True)
+                        return MissionStatus(network_error=True, circuit_open=is_circuit_open(e))
                 if count != like_times:
                     await asyncio.sleep(plugin_config.preference.sleep_time)
-            get_post_status, posts = await self.get_posts(retry)
-            if not get_post_status:
+            if count == like_times:
+                break
+            get_post_status, posts = await self.get_posts(retry, exclude=handled_posts)
+            if not get_post_status or not posts:
                 return MissionStatus(failed_getting_post=True)
 
         return MissionStatus(success=True)
@@ -344,7 +392,7 @@ class BaseMission:
                     headers = HEADERS_OLD.copy()
                     headers["x-rpc-device_id"] = self.account.device_id_android
                     headers["DS"] = generate_ds(platform="android")
-                    async with httpx.AsyncClient() as client:
+                    async with HttpClientManager.client(URL_SHARE) as client:
                         res = await client.get(
                             URL_SHARE.format(posts[0]),
                             headers=headers,
@@ -373,7 +421,7 @@ class BaseMission:
                 return MissionStatus(incorrect_return=True)
             else:
                 logger.exception(f"米游币任务 - 分享: 请求失败")
-                return MissionStatus(network_error=True)
+                return MissionStatus(network_error=True, circuit_open=is_circuit_open(e))
         return MissionStatus(success=True)
 
 
@@ -462,7 +510,7 @@ async def get_missions(account: UserAccount, retry: bool = True) -> Tuple[BaseAp
     try:
         async for attempt in get_async_retry(retry):
             with attempt:
-                async with httpx.AsyncClient() as client:
+                async with HttpClientManager.client(URL_MISSION) as client:
                     res = await client.get(URL_MISSION, headers=HEADERS_MISSION,
                                            cookies=account.cookies.dict(v2_stoken=True, cookie_type=True),
                                            timeout=plugin_config.preference.timeout)
@@ -483,7 +531,7 @@ async def get_missions(account: UserAccount, retry: bool = True) -> Tuple[BaseAp
             return BaseApiStatus(incorrect_return=True), None
         else:
             logger.exception("获取米游币任务列表: 请求失败")
-            return BaseApiStatus(network_error=True), None
+            return BaseApiStatus(network_error=True, circuit_open=is_circuit_open(e)), None
 
 
 async def get_missions_state(account: UserAccount, retry: bool = True) -> Tuple[BaseApiStatus, Optional[MissionState]]:
@@ -499,7 +547,7 @@ async def get_missions_state(account: UserAccount, retry: bool = True) -> Tuple[
     try:
         async for attempt in get_async_retry(retry):
             with attempt:
-                async with httpx.AsyncClient() as client:
+                async with HttpClientManager.client(URL_MISSION_STATE) as client:
                     res = await client.get(URL_MISSION_STATE, headers=HEADERS_MISSION,
                                            cookies=account.cookies.dict(v2_stoken=True, cookie_type=True),
                                            timeout=plugin_config.preference.timeout)
@@ -526,4 +574,4 @@ async def get_missions_state(account: UserAccount, retry: bool = True) -> Tuple[
             return BaseApiStatus(incorrect_return=True), None
         else:
             logger.exception("获取米游币任务完成情况: 请求失败")
-            return BaseApiStatus(network_error=True), None
+            return BaseApiStatus(network_error=True, circuit_open=is_circuit_open(e)), None
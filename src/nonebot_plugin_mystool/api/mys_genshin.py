@@ -1,7 +1,6 @@
 import asyncio
 from typing import List, Optional, Tuple, Type, Dict
 
-import httpx
 import tenacity
 
 from nonebot import require
@@ -16,7 +15,8 @@ from ..utils import logger, generate_ds, \
     get_async_retry, get_validate
 from ..api.common import genshin_note, get_game_record, starrail_note, get_mys_official_message, get_game_list
 from ..utils import generate_device_id, logger, generate_ds, \
-    get_async_retry, generate_seed_id, generate_fp_locally, html2img, get_local_images
+    get_async_retry, generate_seed_id, generate_fp_locally, html2img, get_local_images, HttpClientManager, \
+    is_circuit_open
 
 
 
@@ -134,7 +134,7 @@ class GenshinRequest:
         try:
             async for attempt in retrying:
                 with attempt:
-                    async with httpx.AsyncClient() as client:
+                    async with HttpClientManager.client(url) as client:
                         if method == 'GET':
                             res = await client.get(
                                 url,
@@ -180,7 +180,7 @@ class GenshinRequest:
                 return MissionStatus(incorrect_return=True), None
             else:
                 logger.exception("通用查询: 请求失败")
-                return MissionStatus(network_error=True), None
+                return MissionStatus(network_error=True, circuit_open=is_circuit_open(e)), None
 
 
 
@@ -7,9 +7,8 @@ from datetime import date
 from typing import Dict, Any
 from urllib.parse import unquote
 
-import httpx
 
-from ..utils import logger
+from ..utils import logger, HttpClientManager
 
 
 class Tool:
@@ -70,7 +69,7 @@ class WeiboCode:
         ticket_id = {}
         for key, value in self.container_id.items():
             url = self.event_url.replace('{container_id}', value)
-            async with httpx.AsyncClient() as client:
+            async with HttpClientManager.client(url) as client:
                 response = await client.get(url)
             responses = response.json()
             group = Tool.nested_lookup(responses, 'group', fetch_first=True)
@@ -95,7 +94,7 @@ class WeiboCode:
         data = {
             'ext': '', 'ticket_id': id, 'aid': self.params['aid'], 'from': self.params['from']
         }
-        async with httpx.AsyncClient() as client:
+        async with HttpClientManager.client(url) as client:
             response = await client.get(url, params=data, headers=self.headers, cookies=self.cookie)
         if response.status_code == 200:
             responses = response.json()
@@ -212,7 +211,7 @@ class WeiboSign:
                 "Host": "api.weibo.cn"
             }
             cookies = Tool.cookie_to_dict(wb_userdata['cookie'])
-            async with httpx.AsyncClient() as client:
+            async with HttpClientManager.client(url) as client:
                 res = await client.get(url, headers=headers, params=params, cookies=cookies)
             json_chdata = res.json()['cards'][0]['card_group']
             list_data = await cls.format_chaohua_data(json_chdata)
@@ -267,7 +266,7 @@ class WeiboSign:
                     params_copy['ul_ctime'] = int(time.time() * 1000)
                     pd = True
                     while pd:
-                        async with httpx.AsyncClient() as client:
+                        async with HttpClientManager.client(url) as client:
                             res = await client.get(url, headers=headers, cookies=cookie, params=params_copy, timeout=10)
                         res_data = json.loads(res.text)
                         logger.info(f'微博签到返回：{res_data}')
@@ -1,16 +1,17 @@
 import asyncio
+import functools
 import io
+import json
 import os
 import random
 import threading
 import time
 from datetime import datetime
-from multiprocessing import Manager
-from multiprocessing.pool import Pool
-from multiprocessing.synchronize import Lock
-from typing import List, Callable, Any, Tuple, Optional, Dict, Union
+from pathlib import Path
+from typing import List, Callable, Any, Tuple, Optional, Union, Set, Iterator, Dict, NamedTuple
 
-from apscheduler.events import JobExecutionEvent, EVENT_JOB_EXECUTED
+import tenacity
+from apscheduler.jobstores.base import JobLookupError
 from nonebot import on_command, get_driver
 from nonebot.adapters.onebot.v11 import MessageEvent as OneBotV11MessageEvent, MessageSegment as OneBotV11MessageSegment
 from nonebot.adapters.qq import MessageEvent as QQGuildMessageEvent, MessageSegment as QQGuildMessageSegment
@@ -18,16 +19,18 @@ from nonebot.internal.params import ArgStr
 from nonebot.matcher import Matcher
 from nonebot.params import ArgPlainText, T_State, CommandArg, Command
 from nonebot_plugin_apscheduler import scheduler
+from pydantic import ValidationError
 
-from ..api.common import get_game_record, get_good_detail, get_good_list, good_exchange_sync, \
+from ..api.common import get_game_record, get_good_detail, get_good_list, iter_good_list, \
     get_device_fp, \
-    good_exchange
+    prepare_exchange, send_exchange, PreparedExchange
 from ..command.common import CommandRegistry
 from ..model import Good, GameRecord, ExchangeStatus, PluginDataManager, plugin_config, UserAccount, \
     ExchangePlan, ExchangeResult, CommandUsage
 from ..utils import COMMAND_BEGIN, logger, get_last_command_sep, GeneralMessageEvent, \
-    send_private_msg, get_unique_users, \
-    get_all_bind, game_list_to_image
+    push_private_msg, get_unique_users, \
+    get_all_bind, game_list_to_image, good_list_fingerprint, IMAGE_SUFFIXES, ExchangeClock, ExchangeTiming, HttpClientManager, \
+    URL_EXCHANGE_HOST
 
 __all__ = [
     "myb_exchange_plan", "get_good_image", "generate_image"
@@ -150,6 +153,25 @@ async def _(
         await matcher.reject('⚠️您发送的账号不在以上账号内，请重新发送')
 
 
+async def find_good_on_sell(good_id: str) -> Optional[Good]:
+    """
+    在各分区的限时商品中查找商品，找到后立即停止获取剩余的商品列表
+
+    :param good_id: 商品ID
+    """
+    for game in "bh3", "hk4e", "bh2", "hkrpg", "nxx", "bbs", "nap":
+        goods = iter_good_list(game)
+        try:
+            async for good in goods:
+                if not good.time_end and good.time_limited and good.goods_id == good_id:
+                    return good
+        except (tenacity.RetryError, ValidationError):
+            logger.exception(f"{plugin_config.preference.log_head}获取 {game} 分区的商品列表失败")
+        finally:
+            await goods.aclose()
+    return None
+
+
 @myb_exchange_plan.got('good_id')
 async def _(
         event: Union[GeneralMessageEvent],
@@ -163,28 +185,8 @@ async def _(
     account: UserAccount = state['account']
     command_2 = state['command_2']
     if command_2 == '+':
-        good_dict = {
-            'bh3': (await get_good_list('bh3'))[1],
-            'ys': (await get_good_list('hk4e'))[1],
-            'bh2': (await get_good_list('bh2'))[1],
-            'xq': (await get_good_list('hkrpg'))[1],
-            'wd': (await get_good_list('nxx'))[1],
-            'bbs': (await get_good_list('bbs'))[1],
-            'nap': (await get_good_list('nap'))[1]
-        }
-        flag = True
-        break_flag = False
-        good = None
-        for good_list in good_dict.values():
-            goods_on_sell = filter(lambda x: not x.time_end and x.time_limited, good_list)
-            for good in goods_on_sell:
-                if good.goods_id == good_id:
-                    flag = False
-                    break_flag = True
-                    break
-            if break_flag:
-                break
-        if flag:
+        good = await find_good_on_sell(good_id)
+        if good is None:
             await matcher.finish('⚠️您发送的商品ID不在可兑换的商品列表内，程序已退出')
         state['good'] = good
         if good.time:
@@ -222,13 +224,8 @@ async def _(
             for plan in plans:
                 if plan.good.goods_id == good_id:
                     plans.discard(plan)
-                    PluginDataManager.write_plugin_data()
-                    for i in range(plugin_config.preference.exchange_thread_count):
-                        try:
-                            scheduler.remove_job(job_id=f"exchange-plan-{hash(plan)}-{i}")
-                        except scheduler.JobLookupError:
-                            # TODO: 原因不明，暂时忽略异常
-                            pass
+                    PluginDataManager.write_plugin_data(event.get_user_id())
+                    ExchangePlanRegistry.unregister(plan.plan_id)
                     await matcher.finish('兑换计划删除成功')
             await matcher.finish(f"您没有设置商品ID为 {good_id} 的兑换哦~")
         else:
@@ -274,20 +271,10 @@ async def _(
             if not fp_status:
                 await matcher.send(
                     '⚠️从服务器获取device_fp失败！兑换时将在本地生成device_fp。你也可以尝试重新添加兑换计划。')
-        PluginDataManager.write_plugin_data()
+        PluginDataManager.write_plugin_data(event.get_user_id())
 
     # 初始化兑换任务
-    finished.setdefault(plan, [])
-    for i in range(plugin_config.preference.exchange_thread_count):
-        scheduler.add_job(
-            good_exchange_sync,
-            "date",
-            id=f"exchange-plan-{hash(plan)}-{i}",
-            replace_existing=True,
-            args=(plan,),
-            run_date=datetime.fromtimestamp(good.time),
-            max_instances=plugin_config.preference.exchange_thread_count
-        )
+    schedule_exchange_plan(event.get_user_id(), plan)
 
     await matcher.finish(
         f'🎉设置兑换计划成功！将于 {plan.good.time_text} 开始兑换，到时将会私聊告知您兑换结果')
@@ -348,7 +335,8 @@ async def _(event: Union[GeneralMessageEvent], arg=ArgPlainText("content")):
         await get_good_image.reject('⚠️您的输入有误，请重新输入')
 
     img_path = time.strftime(
-        f'{plugin_config.good_list_image_config.SAVE_PATH}/%m-%d-{arg[0]}.jpg', time.localtime())
+        f'{plugin_config.good_list_image_config.SAVE_PATH}/%m-%d-{arg[0]}.'
+        f'{IMAGE_SUFFIXES[plugin_config.good_list_image_config.IMAGE_FORMAT]}', time.localtime())
     if os.path.exists(img_path):
         with open(img_path, 'rb') as f:
             image_bytes = io.BytesIO(f.read())
@@ -363,107 +351,290 @@ async def _(event: Union[GeneralMessageEvent], arg=ArgPlainText("content")):
             f'{arg[1]} 分区暂时没有可兑换的限时商品。如果这与实际不符，你可以尝试用『{COMMAND_BEGIN}商品 更新』进行更新。')
 
 
-lock = threading.Lock()
-finished: Dict[ExchangePlan, List[bool]] = {}
+class ExchangeAttempt(NamedTuple):
+    """
+    一次兑换请求的记录
+    """
+    sent_at: float
+    """请求发送时间（本地时间戳）"""
+    status: ExchangeStatus
+    """兑换状态"""
+    result: Optional[ExchangeResult]
+    """兑换结果"""
 
 
-@lambda func: scheduler.add_listener(func, EVENT_JOB_EXECUTED)
-def exchange_notice(event: JobExecutionEvent):
+class ExchangePlanEntry:
     """
-    接收兑换结果
+    兑换计划登记项，记录兑换计划所属用户以及每次兑换请求的结果
     """
-    if event.job_id.startswith("exchange-plan"):
-        loop = asyncio.get_event_loop()
 
-        thread_id = int(event.job_id.split('-')[-1]) + 1
-        result: Tuple[ExchangeStatus, Optional[ExchangeResult]] = event.retval
-        exchange_status, exchange_result = result
+    def __init__(self, user_id: str, plan: ExchangePlan):
+        """
+        :param user_id: 所属用户ID（不是绑定用户的ID）
+        :param plan: 兑换计划
+        """
+        self.plan_id = plan.plan_id
+        """兑换计划ID"""
+        self.user_id = user_id
+        """所属用户ID"""
+        self.plan = plan
+        """兑换计划"""
+        self.target: int = plan.good.time
+        """登记时的商品开售时间（商品开售后 ``Good.time`` 可能发生变化）"""
+        self.sent = 0
+        """已发送的请求数"""
+        self.ledger: List[ExchangeAttempt] = []
+        """已返回的兑换请求记录"""
+
+    @property
+    def notice_user_ids(self) -> List[str]:
+        """
+        需要通知兑换结果的用户ID（所属用户以及绑定了该用户的用户）
+        """
+        return [self.user_id] + list(get_all_bind(self.user_id))
+
+    @property
+    def outcome(self) -> Optional[ExchangeAttempt]:
+        """
+        兑换结果：成功时为成功的那次请求，否则为最后返回的请求，尚无请求返回时为 ``None``
+        """
+        for attempt in self.ledger:
+            if attempt.status and attempt.result and attempt.result.result:
+                return attempt
+        return self.ledger[-1] if self.ledger else None
+
+
+class ExchangePlanRegistry:
+    """
+    兑换计划登记表，按兑换计划ID和商品开售时间索引
+    """
+    entries: Dict[str, ExchangePlanEntry] = {}
+    """兑换计划ID -> 登记项"""
+    targets: Dict[int, Dict[str, ExchangePlanEntry]] = {}
+    """商品开售时间 -> {兑换计划ID -> 登记项}"""
+
+    @classmethod
+    def register(cls, user_id: str, plan: ExchangePlan) -> ExchangePlanEntry:
+        """
+        登记兑换计划，已登记的相同计划会被替换
+
+        :param user_id: 所属用户ID
+        :param plan: 兑换计划
+        """
+        cls.unregister(plan.plan_id)
+        # 绑定用户的数据实际保存在目标用户处
+        user_id = (PluginDataManager.plugin_data.user_bind or {}).get(user_id, user_id)
+        entry = cls.entries[plan.plan_id] = ExchangePlanEntry(user_id, plan)
+        cls.targets.setdefault(entry.target, {})[entry.plan_id] = entry
+        return entry
+
+    @classmethod
+    def unregister(cls, plan_id: str) -> Optional[ExchangePlanEntry]:
+        """
+        取消登记兑换计划，如果该开售时间已没有其他兑换计划，则一并删除定时任务
+
+        :param plan_id: 兑换计划ID
+        """
+        entry = cls.entries.pop(plan_id, None)
+        if entry is None:
+            return None
+        group = cls.targets.get(entry.target, {})
+        group.pop(plan_id, None)
+        if not group:
+            cls.targets.pop(entry.target, None)
+            try:
+                scheduler.remove_job(job_id=f"exchange-burst-{entry.target}")
+            except JobLookupError:
+                pass
+        return entry
+
+    @classmethod
+    def get(cls, plan_id: str) -> Optional[ExchangePlanEntry]:
+        """
+        获取兑换计划的登记项
+
+        :param plan_id: 兑换计划ID
+        """
+        return cls.entries.get(plan_id)
+
+    @classmethod
+    def at(cls, target: int) -> List[ExchangePlanEntry]:
+        """
+        获取开售时间为 ``target`` 的所有兑换计划的登记项
+
+        :param target: 商品开售时间（标准时间戳）
+        """
+        return list(cls.targets.get(target, {}).values())
+
+
+class ExchangeBurst:
+    """
+    兑换请求突发调度器
 
-        if not exchange_status:
-            hash_value = int(event.job_id.split('-')[-2])
-            user_id_filter = filter(lambda x: hash(x[1].exchange_plans) == hash_value, get_unique_users())
-            user_id = next(user_id_filter)
-            user_ids = [user_id] + list(get_all_bind(user_id))
-            plans = PluginDataManager.plugin_data.users[user_id].exchange_plans
+    同一开售时间的所有兑换计划共用一个调度器：开售前统一校准时间、构建请求并建立连接，
+    开售后按 ``Preference.exchange_burst_offsets`` 和 ``Preference.exchange_latency`` 分轮发送请求，
+    每轮每个计划同时发送 ``Preference.exchange_thread_count`` 个请求，全程不阻塞事件循环。
+    某个计划兑换成功、登录失效或请求数达到 ``Preference.exchange_max_attempts`` 后即停止该计划的兑换，
+    并取消其仍在进行中的请求。
+    """
 
-            with lock:
-                for plan in plans:
-                    finished[plan].append(False)
-                    for _user_id in user_ids:
-                        loop.create_task(
-                            send_private_msg(
-                                user_id=_user_id,
-                                message=f"⚠️账户 {plan.account.display_name}"
-                                        f"\n- {plan.good.general_name}"
-                                        f"\n- 线程 {thread_id}"
-                                        f"\n- 兑换请求发送失败"
-                            )
-                        )
-                    if len(finished[plan]) == plugin_config.preference.exchange_thread_count:
-                        del plan
-                        PluginDataManager.write_plugin_data()
+    def __init__(self, target: int, entries: List[ExchangePlanEntry]):
+        """
+        :param target: 商品开售时间（标准时间戳）
+        :param entries: 兑换计划登记项列表
+        """
+        self.target = target
+        self.entries = entries
+        self.timing: Optional[ExchangeTiming] = None
+        """首个兑换请求的计时报告"""
+
+    def wave_times(self, fire_at: float) -> Iterator[float]:
+        """
+        生成每轮请求的发送时间（本地时间戳）
+
+        :param fire_at: 首轮请求的发送时间
+        """
+        preference = plugin_config.preference
+        wave_at = fire_at
+        for offset in preference.exchange_burst_offsets or [0]:
+            wave_at = fire_at + offset
+            yield wave_at
+        random_x, random_y = preference.exchange_latency
+        while (wave_at := wave_at + random.uniform(random_x, random_y)) < fire_at + preference.exchange_duration:
+            yield wave_at
+
+    async def run_plan(self, entry: ExchangePlanEntry, prepared: PreparedExchange, fire_at: float):
+        """
+        执行单个兑换计划的突发请求，结果记录在登记项中
+
+        :param entry: 兑换计划登记项
+        :param prepared: 预先构建好的兑换请求
+        :param fire_at: 首轮请求的发送时间
+        """
+        budget = max(1, plugin_config.preference.exchange_max_attempts)
+        in_flight: Set[asyncio.Task] = set()
+        stopped = asyncio.Event()
+
+        def on_done(sent_at: float, task: asyncio.Task):
+            in_flight.discard(task)
+            if task.cancelled() or stopped.is_set():
+                return
+            attempt = ExchangeAttempt(sent_at, *task.result())
+            entry.ledger.append(attempt)
+            if attempt.status.login_expired or (attempt.status and attempt.result.result):
+                stopped.set()
+
+        for wave_at in self.wave_times(fire_at):
+            if stopped.is_set() or entry.sent >= budget:
+                break
+            await ExchangeClock.sleep_until(wave_at)
+            if stopped.is_set():
+                break
+            for _ in range(min(max(1, plugin_config.preference.exchange_thread_count), budget - entry.sent)):
+                task = asyncio.create_task(send_exchange(prepared))
+                task.add_done_callback(functools.partial(on_done, time.time()))
+                in_flight.add(task)
+                entry.sent += 1
+
+        # 等待仍在进行中的请求，一旦有请求成功就取消其余请求
+        while in_flight and not stopped.is_set():
+            await asyncio.wait(set(in_flight), return_when=asyncio.FIRST_COMPLETED)
+        for task in in_flight:
+            task.cancel()
+        await asyncio.gather(*in_flight, return_exceptions=True)
+
+    async def run(self):
+        """
+        校准时间后等待到开售时刻执行兑换，并通知兑换结果
+        """
+        await ExchangeClock.ensure_synced()
+        fire_at = ExchangeClock.fire_time(self.target)
+
+        # 开售前预先构建请求并建立好连接，开售时刻只需发送请求
+        await ExchangeClock.sleep_until(fire_at - plugin_config.preference.exchange_arm_lead)
+        prepared = [prepare_exchange(entry.plan) for entry in self.entries]
+        await HttpClientManager.warm_up(
+            URL_EXCHANGE_HOST,
+            len(self.entries) * max(1, plugin_config.preference.exchange_thread_count)
+        )
 
+        await ExchangeClock.sleep_until(fire_at)
+        self.timing = ExchangeClock.report(self.target, fire_at, time.time())
+        logger.info(f"{plugin_config.preference.log_head}米游币商品兑换: 开售时间 {self.target} "
+                    f"共 {len(self.entries)} 个兑换计划开始兑换 - {self.timing}")
+
+        await asyncio.gather(
+            *(self.run_plan(entry, prepared_exchange, fire_at)
+              for entry, prepared_exchange in zip(self.entries, prepared))
+        )
+        for entry in self.entries:
+            await self.notice(entry)
+            ExchangePlanRegistry.unregister(entry.plan_id)
+            if user := PluginDataManager.plugin_data.users.get(entry.user_id):
+                remove_exchange_plan(user.exchange_plans, entry.plan)
+        PluginDataManager.write_plugin_data(*{entry.user_id for entry in self.entries})
+
+    async def notice(self, entry: ExchangePlanEntry):
+        """
+        通知用户及其绑定用户兑换结果
+
+        :param entry: 兑换计划登记项
+        """
+        plan = entry.plan
+        outcome = entry.outcome
+        if outcome and outcome.status and outcome.result and outcome.result.result:
+            message = f"🎉账户 {plan.account.display_name}\n- {plan.good.general_name}\n- 兑换成功"
+        elif outcome and outcome.status.login_expired:
+            message = f"⚠️账户 {plan.account.display_name}\n- {plan.good.general_name}\n- 登录失效，请重新登录"
+        elif outcome and outcome.status:
+            message = f"💦账户 {plan.account.display_name}\n- {plan.good.general_name}\n- 兑换失败"
         else:
-            plan = exchange_result.plan
-            user_filter = filter(lambda x: plan in x[1].exchange_plans, get_unique_users())
-            user_id, user = next(user_filter)
-            user_ids = [user_id] + list(get_all_bind(user_id))
-            with lock:
-                # 如果已经有一个线程兑换成功，就不再接收结果
-                if True not in finished[plan]:
-                    if exchange_result.result:
-                        finished[plan].append(True)
-                        for _user_id in user_ids:
-                            loop.create_task(
-                                send_private_msg(
-                                    user_id=_user_id,
-                                    message=f"🎉账户 {plan.account.display_name}"
-                                            f"\n- {plan.good.general_name}"
-                                            f"\n- 线程 {thread_id}"
-                                            f"\n- 兑换成功"
-                                )
-                            )
-                    else:
-                        finished[plan].append(False)
-                        for _user_id in user_ids:
-                            loop.create_task(
-                                send_private_msg(
-                                    user_id=_user_id,
-                                    message=f"💦账户 {plan.account.display_name}"
-                                            f"\n- {plan.good.general_name}"
-                                            f"\n- 线程 {thread_id}"
-                                            f"\n- 兑换失败"
-                                )
-                            )
-
-                if len(finished[plan]) == plugin_config.preference.exchange_thread_count:
-                    try:
-                        user.exchange_plans.remove(plan)
-                    except KeyError:
-                        pass
-                    else:
-                        PluginDataManager.write_plugin_data()
+            message = f"⚠️账户 {plan.account.display_name}\n- {plan.good.general_name}\n- 兑换请求发送失败"
+        message += f"\n- 共发送 {entry.sent} 个请求"
+        if self.timing:
+            message += f"\n- {self.timing}"
+        for user_id in entry.notice_user_ids:
+            push_private_msg(user_id=user_id, message=message)
 
 
-async def exchange_begin(plan: ExchangePlan):
+def remove_exchange_plan(plans: Set[ExchangePlan], plan: ExchangePlan):
     """
-    到点后执行兑换
+    从兑换计划集合中删除兑换计划
 
-    :param plan: 兑换计划
+    商品开售后 ``Good.time`` 可能发生变化，导致兑换计划的哈希值与加入集合时不同，因此按对象本身查找。
     """
-    duration = 0
-    random_x, random_y = plugin_config.preference.exchange_latency
-    exchange_status, exchange_result = ExchangeStatus(), None
+    remaining = [item for item in plans if item is not plan]
+    plans.clear()
+    plans.update(remaining)
 
-    # 在兑换开始后的一段时间内，不断尝试兑换，直到成功（因为太早兑换可能被认定不在兑换时间）
-    while duration < plugin_config.preference.exchange_duration:
-        latency = random.uniform(random_x, random_y)
-        time.sleep(latency)
-        exchange_status, exchange_result = await good_exchange(plan)
-        if exchange_status and exchange_result.result:
-            break
-        duration += latency
-    return exchange_status, exchange_result
+
+async def exchange_begin(target: int):
+    """
+    对开售时间为 ``target`` 的所有兑换计划执行兑换
+
+    :param target: 商品开售时间（标准时间戳）
+    """
+    users = PluginDataManager.plugin_data.users
+    if entries := [entry for entry in ExchangePlanRegistry.at(target) if entry.user_id in users]:
+        await ExchangeBurst(target, entries).run()
+
+
+def schedule_exchange_plan(user_id: str, plan: ExchangePlan):
+    """
+    登记兑换计划并创建定时任务，同一开售时间的兑换计划共用一个任务，任务在开售前 ``Preference.exchange_sync_lead`` 秒启动以校准时间
+
+    :param user_id: 所属用户ID
+    :param plan: 兑换计划
+    """
+    target = ExchangePlanRegistry.register(user_id, plan).target
+    scheduler.add_job(
+        exchange_begin,
+        "date",
+        id=f"exchange-burst-{target}",
+        replace_existing=True,
+        args=(target,),
+        run_date=datetime.fromtimestamp(max(time.time(), target - plugin_config.preference.exchange_sync_lead))
+    )
 
 
 @_driver.on_startup
@@ -471,88 +642,130 @@ async def _():
     """
     启动机器人时自动初始化兑换任务
     """
-    for user_id, user in PluginDataManager.plugin_data.users.items():
-        plans = user.exchange_plans
-        for plan in plans:
+    for user_id, user in get_unique_users():
+        for plan in list(user.exchange_plans):
             good_detail_status, good = await get_good_detail(plan.good)
             if not good_detail_status or not good.time or good.time < time.time():
                 # 若商品不存在则删除
                 # 若重启时兑换超时则删除该兑换
                 user.exchange_plans.remove(plan)
-                PluginDataManager.write_plugin_data()
-                continue
+                PluginDataManager.write_plugin_data(user_id)
             else:
-                finished.setdefault(plan, [])
-                for i in range(plugin_config.preference.exchange_thread_count):
-                    scheduler.add_job(
-                        exchange_begin,
-                        "date",
-                        id=f"exchange-plan-{hash(plan)}-{i}",
-                        replace_existing=True,
-                        args=(plan,),
-                        run_date=datetime.fromtimestamp(good.time),
-                        max_instances=plugin_config.preference.exchange_thread_count
-                    )
+                schedule_exchange_plan(user_id, plan)
+
+
+def image_manifest_path(game: str) -> Path:
+    """
+    获取商品列表图片记录文件的路径，记录了图片文件名以及生成图片时商品列表的摘要
+
+    :param game: 游戏名
+    """
+    return plugin_config.good_list_image_config.SAVE_PATH / f"good-image-{game}.json"
+
+
+def read_image_manifest(game: str) -> Dict[str, Any]:
+    """
+    读取商品列表图片记录，不存在或无法读取时返回空字典。会进行文件读写，不应在事件循环中直接调用
+
+    :param game: 游戏名
+    """
+    try:
+        with open(image_manifest_path(game), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
 
 
-def image_process(game: str, _lock: Lock = None):
+def write_image_manifest(game: str, manifest: Dict[str, Any]):
     """
-    生成并保存图片的进程函数
+    写入商品列表图片记录。会进行文件读写，不应在事件循环中直接调用
+
+    :param game: 游戏名
+    :param manifest: 图片记录
+    """
+    with open(image_manifest_path(game), "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+
+
+async def image_process(game: str):
+    """
+    生成并保存某个分区的商品列表图片，商品列表摘要与上次生成时相同则沿用上次的图片
+
+    文件读写在线程池中进行，不阻塞事件循环。
 
     :param game: 游戏名
-    :param _lock: 进程锁
     :return: 生成成功或无商品返回True，否则返回False
     """
-    loop = asyncio.new_event_loop()
-    good_list_status, good_list = loop.run_until_complete(get_good_list(game))
+    good_list_status, good_list = await get_good_list(game)
     if not good_list_status:
         logger.error(f"{plugin_config.preference.log_head}获取 {game} 分区的商品列表失败，跳过该分区的商品图片生成")
         return False
     good_list = list(filter(lambda x: not x.time_end and x.time_limited, good_list))
-    if good_list:
+
+    save_path = plugin_config.good_list_image_config.SAVE_PATH
+    date = time.strftime('%m-%d', time.localtime())
+    path = save_path / f"{date}-{game}.{IMAGE_SUFFIXES[plugin_config.good_list_image_config.IMAGE_FORMAT]}"
+    fingerprint = good_list_fingerprint(good_list)
+    run_in_executor = functools.partial(asyncio.get_running_loop().run_in_executor, None)
+    manifest = await run_in_executor(read_image_manifest, game)
+    last_path = save_path / manifest["file"] if manifest.get("file") else None
+    last_exists = last_path is not None and await run_in_executor(last_path.is_file)
+
+    if manifest.get("fingerprint") == fingerprint and (not good_list or last_exists):
+        if last_path and last_path != path:
+            await run_in_executor(os.replace, last_path, path)
+            manifest["file"] = path.name
+        logger.info(f"{plugin_config.preference.log_head}{game} 分区的商品列表没有变化，沿用上次生成的图片")
+    elif good_list:
         logger.info(f"{plugin_config.preference.log_head}正在生成 {game} 分区的商品列表图片")
-        image_bytes = loop.run_until_complete(game_list_to_image(good_list, _lock))
+        image_bytes = await game_list_to_image(good_list)
         if not image_bytes:
             return False
-        date = time.strftime('%m-%d', time.localtime())
-        path = plugin_config.good_list_image_config.SAVE_PATH / f"{date}-{game}.jpg"
-        with open(path, 'wb') as f:
-            f.write(image_bytes)
+        await run_in_executor(path.write_bytes, image_bytes)
+        if last_exists and last_path != path:
+            await run_in_executor(os.remove, last_path)
+        manifest = {"fingerprint": fingerprint, "file": path.name}
         logger.info(f"{plugin_config.preference.log_head}已完成 {game} 分区的商品列表图片生成")
     else:
+        if last_exists:
+            await run_in_executor(os.remove, last_path)
+        manifest = {"fingerprint": fingerprint, "file": None}
         logger.info(f"{plugin_config.preference.log_head}{game}分区暂时没有可兑换的限时商品，跳过该分区的商品图片生成")
+    await run_in_executor(write_image_manifest, game, manifest)
     return True
 
 
 def generate_image(is_auto=True, callback: Callable[[bool], Any] = None):
     """
-    生成米游币商品信息图片。该函数会阻塞当前线程
+    生成米游币商品信息图片。该函数会阻塞当前线程，不能在事件循环所在的线程中调用
+
+    网络请求在机器人的事件循环中进行（以使用共享连接池），各分区的图片绘制在渲染进程池中并行进行。
 
     :param is_auto: True为每日自动生成，False为用户手动更新
     :param callback: 回调函数，参数为生成成功与否
     """
-    for root, _, files in os.walk(plugin_config.good_list_image_config.SAVE_PATH, topdown=False):
-        for name in files:
-            date = time.strftime('%m-%d', time.localtime())
-            # 若图片开头为当日日期，则退出函数不执行
-            if name.startswith(date):
-                if is_auto:
-                    return
-            # 删除旧图片
-            if name.endswith('.jpg'):
-                os.remove(os.path.join(root, name))
-
-    if plugin_config.good_list_image_config.MULTI_PROCESS:
-        _lock: Lock = Manager().Lock()
-        with Pool() as pool:
-            for game in "bh3", "hk4e", "bh2", "hkrpg", "nxx", "bbs", "nap":
-                pool.apply_async(image_process,
-                                 args=(game, _lock),
-                                 callback=callback)
-            pool.close()
-            pool.join()
+    date = time.strftime('%m-%d', time.localtime())
+    games = "bh3", "hk4e", "bh2", "hkrpg", "nxx", "bbs", "nap"
+    save_path = plugin_config.good_list_image_config.SAVE_PATH
+    save_path.mkdir(parents=True, exist_ok=True)
+    if is_auto and any(name.startswith(date) for name in os.listdir(save_path)):
+        # 当日已生成过图片
+        return
+    # 删除不是由当前分区记录的旧图片（各分区的图片由 image_process 按商品列表摘要决定沿用或重新生成）
+    recorded = {read_image_manifest(game).get("file") for game in games}
+    for name in os.listdir(save_path):
+        if name.rpartition('.')[2] in IMAGE_SUFFIXES.values() and name not in recorded:
+            os.remove(save_path / name)
+
+    async def process_all():
+        for result in await asyncio.gather(*map(image_process, games)):
+            if callback is not None:
+                callback(result)
+
+    loop = HttpClientManager.loop
+    if loop is not None and loop.is_running():
+        asyncio.run_coroutine_threadsafe(process_all(), loop).result()
     else:
-        for game in "bh3", "hk4e", "bh2", "hkrpg", "nxx", "bbs", "nap":
-            image_process(game)
+        asyncio.run(process_all())
 
     logger.info(f"{plugin_config.preference.log_head}已完成所有分区的商品列表图片生成")
@@ -14,9 +14,9 @@ from nonebot.params import T_State
 
 from ..api.common import get_ltoken_by_stoken, get_cookie_token_by_stoken, get_device_fp, fetch_game_token_qrcode, \
     query_game_token_qrcode, \
-    get_token_by_game_token, get_cookie_token_by_game_token
+    get_token_by_game_token, get_cookie_token_by_game_token, invalidate_game_record
 from ..command.common import CommandRegistry
-from ..model import PluginDataManager, plugin_config, UserAccount, UserData, CommandUsage, BBSCookies, \
+from ..model import PluginDataManager, plugin_config, UserAccount, CommandUsage, BBSCookies, \
     QueryGameTokenQrCodeStatus, GetCookieStatus
 from ..utils import logger, COMMAND_BEGIN, GeneralMessageEvent, GeneralPrivateMessageEvent, \
     GeneralGroupMessageEvent, \
@@ -47,8 +47,7 @@ async def handle_first_receive(event: Union[GeneralMessageEvent]):
     if user_num <= plugin_config.preference.max_user or plugin_config.preference.max_user in [-1, 0]:
         # 获取用户数据对象
         user_id = event.get_user_id()
-        PluginDataManager.plugin_data.users.setdefault(user_id, UserData())
-        user = PluginDataManager.plugin_data.users[user_id]
+        user = PluginDataManager.plugin_data.add_user(user_id)
         # 如果是QQ频道，需要记录频道ID
         if isinstance(event, DirectMessageCreateEvent):
             user.qq_guild[user_id] = event.channel_id
@@ -114,10 +113,11 @@ async def handle_first_receive(event: Union[GeneralMessageEvent]):
                     account = user.accounts[bbs_uid]
                 else:
                     account.cookies.update(cookies)
+                invalidate_game_record(bbs_uid)
                 fp_status, account.device_fp = await get_device_fp(device_id)
                 if fp_status:
                     logger.success(f"用户 {bbs_uid} 成功获取 device_fp: {account.device_fp}")
-                PluginDataManager.write_plugin_data()
+                PluginDataManager.write_plugin_data(user_id)
 
                 if login_status:
                     # 3. 通过 GameToken 获取 stoken_v2
@@ -125,7 +125,7 @@ async def handle_first_receive(event: Union[GeneralMessageEvent]):
                     if login_status:
                         logger.success(f"用户 {bbs_uid} 成功获取 stoken_v2: {cookies.stoken_v2}")
                         account.cookies.update(cookies)
-                        PluginDataManager.write_plugin_data()
+                        PluginDataManager.write_plugin_data(user_id)
 
                         if account.cookies.stoken_v2:
                             # 5. 通过 stoken_v2 获取 ltoken
@@ -133,14 +133,14 @@ async def handle_first_receive(event: Union[GeneralMessageEvent]):
                             if login_status:
                                 logger.success(f"用户 {bbs_uid} 成功获取 ltoken: {cookies.ltoken}")
                                 account.cookies.update(cookies)
-                                PluginDataManager.write_plugin_data()
+                                PluginDataManager.write_plugin_data(user_id)
 
                             # 6.1. 通过 stoken_v2 获取 cookie_token
                             login_status, cookies = await get_cookie_token_by_stoken(account.cookies, device_id)
                             if login_status:
                                 logger.success(f"用户 {bbs_uid} 成功获取 cookie_token: {cookies.cookie_token}")
                                 account.cookies.update(cookies)
-                                PluginDataManager.write_plugin_data()
+                                PluginDataManager.write_plugin_data(user_id)
 
                                 logger.success(
                                     f"{plugin_config.preference.log_head}米游社账户 {bbs_uid} 绑定成功")
@@ -151,7 +151,7 @@ async def handle_first_receive(event: Union[GeneralMessageEvent]):
                             if login_status:
                                 logger.success(f"用户 {bbs_uid} 成功获取 cookie_token: {cookies.cookie_token}")
                                 account.cookies.update(cookies)
-                                PluginDataManager.write_plugin_data()
+                                PluginDataManager.write_plugin_data(user_id)
             else:
                 get_cookie.finish("⚠️获取二维码扫描状态超时，请尝试重新登录")
 
@@ -179,6 +179,8 @@ async def handle_first_receive(event: Union[GeneralMessageEvent]):
                 notice_text += "登录失效！"
             elif login_status.incorrect_return:
                 notice_text += "服务器返回错误！"
+            elif login_status.circuit_open:
+                notice_text += "米游社接口暂时不可用，请稍后再试！"
             elif login_status.network_error:
                 notice_text += "网络连接失败！"
             else:
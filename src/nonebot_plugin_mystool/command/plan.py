@@ -2,9 +2,10 @@ import asyncio
 import threading
 import random
 import traceback
-from typing import Union, Optional, Iterable, Dict, Set, Type
+from datetime import date
+from typing import Union, Optional, Iterable, Dict, Set, Type, List
 
-from nonebot import on_command, get_adapters
+from nonebot import on_command, get_adapters, get_driver
 from nonebot.adapters.onebot.v11 import MessageSegment as OneBotV11MessageSegment, Adapter as OneBotV11Adapter, \
     MessageEvent as OneBotV11MessageEvent
 from nonebot.adapters.qq import MessageSegment as QQGuildMessageSegment, Adapter as QQGuildAdapter, \
@@ -25,16 +26,24 @@ from ..api.weibo import WeiboCode, WeiboSign
 from ..command.common import CommandRegistry
 from ..command.exchange import generate_image
 from ..model import (MissionStatus, PluginDataManager, plugin_config, UserData, CommandUsage, GenshinNoteNotice,
-                     StarRailNoteNotice)
+                     StarRailNoteNotice, UserAccount)
 from ..utils import get_file, logger, COMMAND_BEGIN, GeneralMessageEvent, GeneralGroupMessageEvent, \
-    send_private_msg, get_all_bind, send_group_msg, wrap_and_forward_message, \
-    get_unique_users, get_validate, read_admin_list
+    push_private_msg, get_all_bind, push_group_msg, wrap_and_forward_message, \
+    get_unique_users, get_validate, read_admin_list, TaskQueue, QueuedTask, NoteScheduler, GENSHIN_NOTE, \
+    STARRAIL_NOTE, genshin_next_check, starrail_next_check
 
 __all__ = [
     "manually_game_sign", "manually_bbs_sign", "manually_genshin_note_check",
     "manually_starrail_note_check", "manually_weibo_code_check", "manually_weibo_sign_check"
 ]
 
+_driver = get_driver()
+
+GAME_SIGN_TASK = "game_sign"
+"""任务队列中游戏签到任务的类型名"""
+BBS_SIGN_TASK = "bbs_sign"
+"""任务队列中米游币任务的类型名"""
+
 manually_game_sign = on_command(plugin_config.preference.command_start + '签到', priority=5, block=True)
 
 CommandRegistry.set_usage(
@@ -209,13 +218,28 @@ async def _(event: Union[GeneralMessageEvent], matcher: Matcher):
     await starrail_note_check(user=user, user_ids=[user_id], matcher=matcher)
 
 
+def disable_notice_if_expired(user: UserData, failed_accounts: Set[str]):
+    """
+    如果用户的全部账户都已登录失效，则关闭通知
+
+    :param user: 用户数据
+    :param failed_accounts: 登录失效的账户的米游社UID
+    """
+    if failed_accounts.issuperset(user.accounts):
+        user.enable_notice = False
+        PluginDataManager.write_plugin_data()
+
+
 async def perform_game_sign(
         user: UserData,
         user_ids: Iterable[str],
         matcher: Matcher = None,
         event: Union[GeneralMessageEvent] = None,
         need_sign_games: Set[Type["BaseGameSign"]] = BaseGameSign.available_game_signs,
-        retry_times: int = 0
+        retry_times: int = 0,
+        user_id: Optional[str] = None,
+        accounts: Optional[Iterable[UserAccount]] = None,
+        run_id: Optional[str] = None
 ):
     """
     执行游戏签到函数，并发送给用户签到消息。
@@ -224,9 +248,15 @@ async def perform_game_sign(
     :param user_ids: 发送通知的所有用户ID，qq号list
     :param matcher: 事件响应器
     :param event: 事件
+    :param need_sign_games: 需要签到的游戏
+    :param retry_times: 当前已重试次数
+    :param user_id: 用户ID，签到失败时据此将重签任务加入任务队列，为空则不自动重签（只有定时任务会传入）
+    :param accounts: 只对这些账户进行签到，为空则为用户的所有账户
+    :param run_id: 重签任务所属的任务队列批次，为空则为当天日期
+    :return: 登录失效的账户的米游社UID
     """
-    failed_accounts = []
-    for account in user.accounts.values():
+    failed_accounts = set()
+    for account in (user.accounts.values() if accounts is None else accounts):
         # account：绑定信息的米游社账户
         # 自动签到时，要求用户打开了签到功能；手动签到时都可以调用执行。
         if not matcher and not account.enable_game_sign:
@@ -238,9 +268,9 @@ async def perform_game_sign(
             if matcher:
                 await matcher.send(f"⚠️账户 {account.display_name} 获取游戏账号信息失败，请重新尝试")
             else:
-                for user_id in user_ids:
-                    await send_private_msg(
-                        user_id=user_id,
+                for notice_user_id in user_ids:
+                    push_private_msg(
+                        user_id=notice_user_id,
                         message=f"⚠️账户 {account.display_name} 获取游戏账号信息失败，请重新尝试"
                     )
             continue
@@ -263,9 +293,9 @@ async def perform_game_sign(
                 if matcher:
                     await matcher.send(f"⚠️账户 {account.display_name} 获取签到记录失败")
                 else:
-                    for user_id in user_ids:
-                        await send_private_msg(
-                            user_id=user_id,
+                    for notice_user_id in user_ids:
+                        push_private_msg(
+                            user_id=notice_user_id,
                             message=f"⚠️账户 {account.display_name} 获取签到记录失败"
                         )
             else:
@@ -283,6 +313,7 @@ async def perform_game_sign(
 
                 if not sign_status and (user.enable_notice or matcher):
                     if sign_status.login_expired:
+                        failed_accounts.add(account.bbs_uid)
                         message = f"⚠️账户 {account.display_name} 🎮『{signer.name}』签到时服务器返回登录失效，请尝试重新登录绑定账户"
                     elif sign_status.need_verify:
                         message = (f"⚠️账户 {account.display_name} 🎮『{signer.name}』签到时可能遇到验证码拦截，"
@@ -293,8 +324,8 @@ async def perform_game_sign(
                     if matcher:
                         await matcher.send(message)
                     elif user.enable_notice:
-                        for user_id in user_ids:
-                            await send_private_msg(user_id=user_id, message=message)
+                        for notice_user_id in user_ids:
+                            push_private_msg(user_id=notice_user_id, message=message)
                     await asyncio.sleep(plugin_config.preference.sleep_time)
                     continue
 
@@ -337,27 +368,27 @@ async def perform_game_sign(
                 else:
                     for adapter in get_adapters().values():
                         if isinstance(adapter, OneBotV11Adapter):
-                            for user_id in user_ids:
-                                await send_private_msg(use=adapter, user_id=user_id, message=msg + saa_img)
+                            for notice_user_id in user_ids:
+                                push_private_msg(use=adapter, user_id=notice_user_id, message=msg + saa_img)
                         elif isinstance(adapter, QQGuildAdapter):
-                            for user_id in user_ids:
-                                await send_private_msg(use=adapter, user_id=user_id, message=msg)
-                                await send_private_msg(use=adapter, user_id=user_id, message=qq_guild_img_msg)
+                            for notice_user_id in user_ids:
+                                push_private_msg(use=adapter, user_id=notice_user_id, message=msg)
+                                push_private_msg(use=adapter, user_id=notice_user_id, message=qq_guild_img_msg)
             await asyncio.sleep(plugin_config.preference.sleep_time)
 
         if not games_has_record:
             if matcher:
                 await matcher.send(f"⚠️您的米游社账户 {account.display_name} 下不存在任何游戏账号，已跳过签到")
             else:
-                for user_id in user_ids:
-                    await send_private_msg(
-                        user_id=user_id,
+                for notice_user_id in user_ids:
+                    push_private_msg(
+                        user_id=notice_user_id,
                         message=f"⚠️您的米游社账户 {account.display_name} 下不存在任何游戏账号，已跳过签到"
                     )
 
-        # 增加签到失败后自动重试
+        # 增加签到失败后自动重试（作为延时任务加入任务队列）
         try:
-            if failed_games and (retry_times < plugin_config.preference.sign_retry_times):
+            if failed_games and user_id and (retry_times < plugin_config.preference.sign_retry_times):
                 random_relay = random.randint(5 * 60, 30 * 60)
                 
                 need_resign_games = ''
@@ -371,30 +402,48 @@ async def perform_game_sign(
                 if matcher:
                     await matcher.send(message)
                 elif user.enable_notice:
-                    for user_id in user_ids:
-                        await send_private_msg(user_id=user_id, message=message)
-                await asyncio.sleep(random_relay)
-                await perform_game_sign(user = user, user_ids= [user_id], matcher= matcher, event= event, need_sign_games= failed_games, retry_times= retry_times + 1)
+                    for notice_user_id in user_ids:
+                        push_private_msg(user_id=notice_user_id, message=message)
+                await TaskQueue.enqueue(
+                    run_id or date.today().isoformat(),
+                    [(user_id, account.bbs_uid, GAME_SIGN_TASK)],
+                    attempt=retry_times + 1,
+                    delay=random_relay,
+                    payload={"games": [game.en_name for game in failed_games]}
+                )
         except :
             logger.info(f"{plugin_config.preference.log_head}重签失败")
             logger.info(traceback.format_exc())
-    # 如果全部登录失效，则关闭通知
-    if len(failed_accounts) == len(user.accounts):
-        user.enable_notice = False
-        PluginDataManager.write_plugin_data()
+    # 如果全部登录失效，则关闭通知（只对部分账户执行时，由调用方在执行完该用户的所有账户后判断）
+    if accounts is None:
+        disable_notice_if_expired(user, failed_accounts)
+    return failed_accounts
     
  
 
-async def perform_bbs_sign(user: UserData, user_ids: Iterable[str], matcher: Matcher = None):
+async def perform_bbs_sign(
+        user: UserData,
+        user_ids: Iterable[str],
+        matcher: Matcher = None,
+        retry_times: int = 0,
+        user_id: Optional[str] = None,
+        accounts: Optional[Iterable[UserAccount]] = None,
+        run_id: Optional[str] = None
+):
     """
     执行米游币任务函数，并发送给用户任务执行消息。
 
     :param user: 用户数据
     :param user_ids: 发送通知的所有用户ID
     :param matcher: 事件响应器
+    :param retry_times: 当前已重新执行次数
+    :param user_id: 用户ID，任务未全部完成时据此将重新执行的任务加入任务队列，为空则不自动重新执行（只有定时任务会传入）
+    :param accounts: 只对这些账户执行任务，为空则为用户的所有账户
+    :param run_id: 重新执行的任务所属的任务队列批次，为空则为当天日期
+    :return: 登录失效的账户的米游社UID
     """
-    failed_accounts = []
-    for account in user.accounts.values():
+    failed_accounts = set()
+    for account in (user.accounts.values() if accounts is None else accounts):
         # 自动执行米游币任务时，要求用户打开了米游币任务功能；手动执行米游币任务时都可以调用执行。
         if not matcher and not account.enable_mission:
             continue
@@ -402,20 +451,21 @@ async def perform_bbs_sign(user: UserData, user_ids: Iterable[str], matcher: Mat
         missions_state_status, missions_state = await get_missions_state(account)
         if not missions_state_status:
             if missions_state_status.login_expired:
+                failed_accounts.add(account.bbs_uid)
                 if matcher:
                     await matcher.send(f'⚠️账户 {account.display_name} 登录失效，请重新登录')
                 else:
-                    for user_id in user_ids:
-                        await send_private_msg(
-                            user_id=user_id,
+                    for notice_user_id in user_ids:
+                        push_private_msg(
+                            user_id=notice_user_id,
                             message=f'⚠️账户 {account.display_name} 登录失效，请重新登录'
                         )
             if matcher:
                 await matcher.send(f'⚠️账户 {account.display_name} 获取任务完成情况请求失败，你可以手动前往App查看')
             else:
-                for user_id in user_ids:
-                    await send_private_msg(
-                        user_id=user_id,
+                for notice_user_id in user_ids:
+                    push_private_msg(
+                        user_id=notice_user_id,
                         message=f'⚠️账户 {account.display_name} 获取任务完成情况请求失败，你可以手动前往App查看'
                     )
             continue
@@ -474,12 +524,13 @@ async def perform_bbs_sign(user: UserData, user_ids: Iterable[str], matcher: Mat
             missions_state_status, missions_state = await get_missions_state(account)
             if not missions_state_status:
                 if missions_state_status.login_expired:
+                    failed_accounts.add(account.bbs_uid)
                     if matcher:
                         await matcher.send(f'⚠️账户 {account.display_name} 登录失效，请重新登录')
                     else:
-                        for user_id in user_ids:
-                            await send_private_msg(
-                                user_id=user_id,
+                        for notice_user_id in user_ids:
+                            push_private_msg(
+                                user_id=notice_user_id,
                                 message=f'⚠️账户 {account.display_name} 登录失效，请重新登录'
                             )
                     continue
@@ -487,9 +538,9 @@ async def perform_bbs_sign(user: UserData, user_ids: Iterable[str], matcher: Mat
                     await matcher.send(
                         f'⚠️账户 {account.display_name} 获取任务完成情况请求失败，你可以手动前往App查看')
                 else:
-                    for user_id in user_ids:
-                        await send_private_msg(
-                            user_id=user_id,
+                    for notice_user_id in user_ids:
+                        push_private_msg(
+                            user_id=notice_user_id,
                             message=f'⚠️账户 {account.display_name} 获取任务完成情况请求失败，你可以手动前往App查看'
                         )
                 continue
@@ -503,6 +554,7 @@ async def perform_bbs_sign(user: UserData, user_ids: Iterable[str], matcher: Mat
             
             # 是否重新执行标记
             repeat_flag = False
+            can_repeat = user_id and retry_times < plugin_config.preference.sign_retry_times
             for key_name, (mission, current) in missions_state.state_dict.items():
                 if key_name == BaseMission.SIGN:
                     mission_name = "📅签到"
@@ -522,37 +574,50 @@ async def perform_bbs_sign(user: UserData, user_ids: Iterable[str], matcher: Mat
             msg += f"\n🪙获得米游币: {missions_state.current_myb - myb_before_mission}" \
                    f"\n💰当前米游币: {missions_state.current_myb}"
 
-            if repeat_flag:
+            if repeat_flag and can_repeat:
                 random_relay = random.randint(3 * 60, 15 * 60)
                 msg += f"\n本次未全部签到成功，将于{random_relay // 60}分{random_relay % 60}秒后重新进行自动签到"
             if matcher:
                 await matcher.send(msg)
             else:
-                for user_id in user_ids:
-                    await send_private_msg(user_id=user_id, message=msg)
+                for notice_user_id in user_ids:
+                    push_private_msg(user_id=notice_user_id, message=msg)
             
-            if repeat_flag:
-                await asyncio.sleep(random_relay)
-                await perform_bbs_sign(user, user_ids, matcher)
+            if repeat_flag and can_repeat:
+                await TaskQueue.enqueue(
+                    run_id or date.today().isoformat(),
+                    [(user_id, account.bbs_uid, BBS_SIGN_TASK)],
+                    attempt=retry_times + 1,
+                    delay=random_relay
+                )
 
-    # 如果全部登录失效，则关闭通知
-    if len(failed_accounts) == len(user.accounts):
-        user.enable_notice = False
-        PluginDataManager.write_plugin_data()
+    # 如果全部登录失效，则关闭通知（只对部分账户执行时，由调用方在执行完该用户的所有账户后判断）
+    if accounts is None:
+        disable_notice_if_expired(user, failed_accounts)
+    return failed_accounts
 
 
-async def genshin_note_check(user: UserData, user_ids: Iterable[str], matcher: Matcher = None):
+async def genshin_note_check(
+        user: UserData,
+        user_ids: Iterable[str],
+        matcher: Matcher = None,
+        accounts: Iterable[UserAccount] = None
+):
     """
     查看原神实时便笺函数，并发送给用户任务执行消息。
 
     :param user: 用户对象
     :param user_ids: 发送通知的所有用户ID
     :param matcher: 事件响应器
+    :param accounts: 需要检查的账户，默认为用户的所有账户
     """
-    for account in user.accounts.values():
+    for account in (user.accounts.values() if accounts is None else accounts):
         note_notice_status.setdefault(account.bbs_uid, NoteNoticeStatus())
         genshin_notice = note_notice_status[account.bbs_uid].genshin
         if account.enable_resin or matcher:
+            if not matcher:
+                # 请求失败时按 resin_interval 重新检查
+                NoteScheduler.schedule(account.bbs_uid, GENSHIN_NOTE, plugin_config.preference.resin_interval * 60)
             genshin_board_status, note = await genshin_note(account)
             if not genshin_board_status:
                 if matcher:
@@ -563,6 +628,10 @@ async def genshin_note_check(user: UserData, user_ids: Iterable[str], matcher: M
                     elif genshin_board_status.need_verify:
                         await matcher.send(f'⚠️账户 {account.display_name} 获取实时便笺时被人机验证阻拦')
                     await matcher.send(f'⚠️账户 {account.display_name} 获取实时便笺请求失败，你可以手动前往App查看')
+                elif genshin_board_status.no_genshin_account:
+                    NoteScheduler.schedule(
+                        account.bbs_uid, GENSHIN_NOTE, plugin_config.preference.note_max_interval * 60
+                    )
                 continue
 
             msg = ''
@@ -610,9 +679,14 @@ async def genshin_note_check(user: UserData, user_ids: Iterable[str], matcher: M
                 else:
                     genshin_notice.transformer = True
 
+                NoteScheduler.schedule(
+                    account.bbs_uid,
+                    GENSHIN_NOTE,
+                    genshin_next_check(note, genshin_notice, account.user_resin_threshold)
+                )
                 if not do_notice:
                     logger.info(f"原神实时便笺：账户 {account.display_name} 树脂:{note.current_resin},未满足推送条件")
-                    return
+                    continue
 
             msg += "❖原神·实时便笺❖" \
                    f"\n🆔账户 {account.display_name}" \
@@ -626,21 +700,30 @@ async def genshin_note_check(user: UserData, user_ids: Iterable[str], matcher: M
                 await matcher.send(msg)
             else:
                 for user_id in user_ids:
-                    await send_private_msg(user_id=user_id, message=msg)
+                    push_private_msg(user_id=user_id, message=msg)
 
 
-async def starrail_note_check(user: UserData, user_ids: Iterable[str], matcher: Matcher = None):
+async def starrail_note_check(
+        user: UserData,
+        user_ids: Iterable[str],
+        matcher: Matcher = None,
+        accounts: Iterable[UserAccount] = None
+):
     """
     查看星铁实时便笺函数，并发送给用户任务执行消息。
 
     :param user: 用户对象
     :param user_ids: 发送通知的所有用户ID
     :param matcher: 事件响应器
+    :param accounts: 需要检查的账户，默认为用户的所有账户
     """
-    for account in user.accounts.values():
+    for account in (user.accounts.values() if accounts is None else accounts):
         note_notice_status.setdefault(account.bbs_uid, NoteNoticeStatus())
         starrail_notice = note_notice_status[account.bbs_uid].starrail
         if account.enable_resin or matcher:
+            if not matcher:
+                # 请求失败时按 resin_interval 重新检查
+                NoteScheduler.schedule(account.bbs_uid, STARRAIL_NOTE, plugin_config.preference.resin_interval * 60)
             starrail_board_status, note = await starrail_note(account)
             if not starrail_board_status:
                 if matcher:
@@ -651,6 +734,10 @@ async def starrail_note_check(user: UserData, user_ids: Iterable[str], matcher:
                     elif starrail_board_status.need_verify:
                         await matcher.send(f'⚠️账户 {account.display_name} 获取实时便笺时被人机验证阻拦')
                     await matcher.send(f'⚠️账户 {account.display_name} 获取实时便笺请求失败，你可以手动前往App查看')
+                elif starrail_board_status.no_starrail_account:
+                    NoteScheduler.schedule(
+                        account.bbs_uid, STARRAIL_NOTE, plugin_config.preference.note_max_interval * 60
+                    )
                 continue
 
             msg = ''
@@ -685,10 +772,15 @@ async def starrail_note_check(user: UserData, user_ids: Iterable[str], matcher:
                         msg += '❕您的模拟宇宙积分还没打满\n\n'
                         do_notice = True
 
+                NoteScheduler.schedule(
+                    account.bbs_uid,
+                    STARRAIL_NOTE,
+                    starrail_next_check(note, starrail_notice, account.user_stamina_threshold)
+                )
                 if not do_notice:
                     logger.info(
                         f"崩铁实时便笺：账户 {account.display_name} 开拓力:{note.current_stamina},未满足推送条件")
-                    return
+                    continue
 
             msg += "❖星穹铁道·实时便笺❖" \
                    f"\n🆔账户 {account.display_name}" \
@@ -702,7 +794,7 @@ async def starrail_note_check(user: UserData, user_ids: Iterable[str], matcher:
                 await matcher.send(msg)
             else:
                 for user_id in user_ids:
-                    await send_private_msg(user_id=user_id, message=msg)
+                    push_private_msg(user_id=user_id, message=msg)
 
 
 manually_weibo_code_check = on_command(plugin_config.preference.command_start + 'wb兑换', priority=5, block=True)
@@ -741,7 +833,7 @@ async def weibo_sign_check(user: UserData, user_ids: Iterable[str], matcher: Mat
                 await matcher.send(message=msg)
             else:
                 for user_id in user_ids:
-                    await send_private_msg(user_id=user_id, message=msg)
+                    push_private_msg(user_id=user_id, message=msg)
     else:
         message = "未开启微博自动签到功能"
         if matcher:
@@ -791,7 +883,7 @@ async def weibo_code_check(user: UserData, user_ids: Iterable[str], mode=0, matc
                                 messages = msg + saa_img
                                 for user_id in user_ids:
                                     logger.info(f"检测到当前超话有兑换码，正在给{user_id}推送信息中")
-                                    await send_private_msg(user_id=user_id, message=messages)
+                                    push_private_msg(user_id=user_id, message=messages)
                 except Exception:
                     pass
     else:
@@ -809,6 +901,37 @@ def daily_update():
     threading.Thread(target=generate_image).start()
 
 
+async def run_queued_tasks(tasks: List[QueuedTask]):
+    """
+    执行从任务队列中取出的一批任务
+
+    不同用户之间并发执行，并发数上限为 ``Preference.daily_concurrency``；
+    同一用户的任务按加入队列的顺序依次执行（因此同一账户的游戏签到和米游币任务保持先后顺序）。
+    """
+    semaphore = asyncio.Semaphore(max(1, plugin_config.preference.daily_concurrency))
+    user_tasks: Dict[str, List[QueuedTask]] = {}
+    for task in tasks:
+        user_tasks.setdefault(task.user_id, []).append(task)
+
+    async def run(user_id: str, queued_tasks: List[QueuedTask]):
+        """
+        执行单个用户的任务，同一用户下先完成游戏签到，再执行米游币任务
+        """
+        async with semaphore:
+            failed_accounts = set()
+            """登录失效的账户的米游社UID"""
+            try:
+                for queued_task in queued_tasks:
+                    failed_accounts.update(await TaskQueue.run(queued_task) or ())
+            except Exception:
+                logger.exception(f"{plugin_config.preference.log_head}用户 {user_id} 每日自动任务执行出错")
+            # 如果全部登录失效，则关闭通知
+            if failed_accounts and (user := PluginDataManager.plugin_data.users.get(user_id)):
+                disable_notice_if_expired(user, failed_accounts)
+
+    await asyncio.gather(*(run(user_id, queued_tasks) for user_id, queued_tasks in user_tasks.items()))
+
+
 @scheduler.scheduled_job("cron",
                          hour=plugin_config.preference.plan_time.split(':')[0],
                          minute=plugin_config.preference.plan_time.split(':')[1],
@@ -818,29 +941,117 @@ async def daily_schedule():
     自动米游币任务、游戏签到函数
     """
     logger.info(f"{plugin_config.preference.log_head}开始执行每日自动任务")
+    # 每个账户的游戏签到和米游币任务各对应任务队列中的一条记录，同一用户下先加入的任务先执行
+    # 实际上，get_unique_users返回已绑定信息的键值对，{QQ号：对应绑定信息及设置}
+    items = []
     for user_id, user in get_unique_users():
-        # 这里的get_all_bind一直返回空，没啥作用
-        # 实际上，get_unique_users返回已绑定信息的键值对，{QQ号：对应绑定信息及设置}
-        # 具体参数可以看dataV2.json里的users参数，与get_unique_users返回是一样的
-        # user_id:qq号list   user:对应qq号绑定信息list
-        user_ids = [user_id] + list(get_all_bind(user_id))
-        await perform_game_sign(user=user, user_ids=user_ids)
-        await perform_bbs_sign(user=user, user_ids=user_ids)
+        items += [(user_id, account.bbs_uid, GAME_SIGN_TASK) for account in user.accounts.values()
+                  if account.enable_game_sign]
+        items += [(user_id, account.bbs_uid, BBS_SIGN_TASK) for account in user.accounts.values()
+                  if account.enable_mission]
+    count = await TaskQueue.enqueue(date.today().isoformat(), items)
+    logger.info(f"{plugin_config.preference.log_head}已将 {count} 个每日任务加入任务队列")
+    await TaskQueue.drain(run_queued_tasks)
     logger.info(f"{plugin_config.preference.log_head}每日自动任务执行完成")
 
 
+@TaskQueue.register(GAME_SIGN_TASK)
+async def game_sign_task(task: QueuedTask):
+    """
+    任务队列中的游戏签到任务
+
+    :return: 登录失效的账户的米游社UID
+    """
+    user = PluginDataManager.plugin_data.users.get(task.user_id)
+    account = user.accounts.get(task.bbs_uid) if user else None
+    if not account:
+        return
+    games = task.payload.get("games")
+    return await perform_game_sign(
+        user=user,
+        user_ids=[task.user_id] + list(get_all_bind(task.user_id)),
+        need_sign_games={game for game in BaseGameSign.available_game_signs if game.en_name in games}
+        if games else BaseGameSign.available_game_signs,
+        retry_times=task.attempt,
+        user_id=task.user_id,
+        accounts=[account],
+        run_id=task.run_id
+    )
+
+
+@TaskQueue.register(BBS_SIGN_TASK)
+async def bbs_sign_task(task: QueuedTask):
+    """
+    任务队列中的米游币任务
+
+    :return: 登录失效的账户的米游社UID
+    """
+    user = PluginDataManager.plugin_data.users.get(task.user_id)
+    account = user.accounts.get(task.bbs_uid) if user else None
+    if not account:
+        return
+    return await perform_bbs_sign(
+        user=user,
+        user_ids=[task.user_id] + list(get_all_bind(task.user_id)),
+        retry_times=task.attempt,
+        user_id=task.user_id,
+        accounts=[account],
+        run_id=task.run_id
+    )
+
+
 @scheduler.scheduled_job("interval",
-                         minutes=plugin_config.preference.resin_interval,
+                         seconds=plugin_config.preference.task_queue_interval,
+                         id="task_queue_drain")
+async def task_queue_drain():
+    """
+    执行任务队列中已到执行时间的任务（包括机器人重启前未完成的任务和延时重试的任务）
+    """
+    await TaskQueue.drain(run_queued_tasks)
+
+
+_driver.on_startup(TaskQueue.resume)
+_driver.on_shutdown(TaskQueue.close)
+
+
+@scheduler.scheduled_job("interval",
+                         seconds=plugin_config.preference.note_poll_interval,
                          id="resin_check")
 async def auto_note_check():
     """
-    自动查看实时便笺
+    自动查看实时便笺，只检查已到达计划检查时间的账户（见 ``NoteScheduler``）
+
+    每个账户的每项便笺检查都作为单独的任务并发执行，并发数上限为 ``Preference.note_concurrency``，
+    单个任务超过 ``Preference.note_check_timeout`` 秒未完成则放弃，不影响其他账户。
     """
-    logger.info(f"{plugin_config.preference.log_head}开始执行自动便笺检查")
+    NoteScheduler.release_due()
+    checks = []
     for user_id, user in get_unique_users():
-        user_ids = [user_id] + list(get_all_bind(user_id))
-        await genshin_note_check(user=user, user_ids=user_ids)
-        await starrail_note_check(user=user, user_ids=user_ids)
+        user_ids = None
+        for note_type, note_check in ((GENSHIN_NOTE, genshin_note_check), (STARRAIL_NOTE, starrail_note_check)):
+            for account in user.accounts.values():
+                if account.enable_resin and NoteScheduler.is_due(account.bbs_uid, note_type):
+                    if user_ids is None:
+                        user_ids = [user_id] + list(get_all_bind(user_id))
+                    checks.append((user, user_ids, account, note_type, note_check))
+    if not checks:
+        return
+    logger.info(f"{plugin_config.preference.log_head}开始执行自动便笺检查，共 {len(checks)} 项到期")
+    semaphore = asyncio.Semaphore(max(1, plugin_config.preference.note_concurrency))
+
+    async def run_check(user: UserData, user_ids: List[str], account: UserAccount, note_type: str, note_check):
+        async with semaphore:
+            try:
+                await asyncio.wait_for(
+                    note_check(user=user, user_ids=user_ids, accounts=[account]),
+                    timeout=plugin_config.preference.note_check_timeout
+                )
+            except asyncio.TimeoutError:
+                logger.warning(f"{plugin_config.preference.log_head}账户 {account.display_name} 的便笺检查({note_type})超时")
+            except Exception:
+                logger.exception(f"{plugin_config.preference.log_head}账户 {account.display_name} 的便笺检查({note_type})出错")
+
+    await asyncio.gather(*(run_check(*check) for check in checks))
     logger.info(f"{plugin_config.preference.log_head}自动便笺检查执行完成")
 
 
@@ -897,9 +1108,9 @@ async def auto_check_mys_official_message():
 
         # 对群发和私聊
         for usr in plugin_config.preference.mys_official_message['qq_group_list']:
-            await send_group_msg(group_id = usr, message = msg)
+            push_group_msg(group_id = usr, message = msg)
         for usr in plugin_config.preference.mys_official_message['qq_user']:
-            await send_private_msg(user_id=usr, message=msg)
+            push_private_msg(user_id=usr, message=msg)
 
     logger.info(f"{plugin_config.preference.log_head}米游社官号消息检查完成")
 
@@ -6,6 +6,7 @@ from nonebot.matcher import Matcher
 from nonebot.params import T_State
 
 from ..api import BaseMission, BaseGameSign
+from ..api.common import invalidate_game_record
 from ..api.weibo import Tool
 from ..command.common import CommandRegistry
 from ..model import PluginDataManager, plugin_config, UserAccount, CommandUsage, UserData
@@ -126,11 +127,11 @@ async def _(event: Union[GeneralMessageEvent], state: T_State, setting_id=ArgStr
         await account_setting.finish('🚪已成功退出')
     elif setting_id == '1':
         account.enable_mission = not account.enable_mission
-        PluginDataManager.write_plugin_data()
+        PluginDataManager.write_plugin_data(event.get_user_id())
         await account_setting.finish(f"📅米游币任务自动执行已 {'✅开启' if account.enable_mission else '❌关闭'}")
     elif setting_id == '2':
         account.enable_game_sign = not account.enable_game_sign
-        PluginDataManager.write_plugin_data()
+        PluginDataManager.write_plugin_data(event.get_user_id())
         await account_setting.finish(f"📅米哈游游戏自动签到已 {'✅开启' if account.enable_game_sign else '❌关闭'}")
     elif setting_id == '3':
         signable_games = "、".join(f"『{game.name}』" for game in BaseGameSign.available_game_signs)
@@ -149,7 +150,7 @@ async def _(event: Union[GeneralMessageEvent], state: T_State, setting_id=ArgStr
         else:
             account.platform = "ios"
             platform_show = "iOS"
-        PluginDataManager.write_plugin_data()
+        PluginDataManager.write_plugin_data(event.get_user_id())
         await account_setting.finish(f"📲设备平台已更改为 {platform_show}")
     elif setting_id == '5':
         games_show = "、".join(map(lambda x: f"『{x.name}』", BaseMission.available_games.values()))
@@ -163,7 +164,7 @@ async def _(event: Union[GeneralMessageEvent], state: T_State, setting_id=ArgStr
         state["setting_item"] = "mission_games"
     elif setting_id == '6':
         account.enable_resin = not account.enable_resin
-        PluginDataManager.write_plugin_data()
+        PluginDataManager.write_plugin_data(event.get_user_id())
         await account_setting.finish(f"📅原神、星穹铁道便笺提醒已 {'✅开启' if account.enable_resin else '❌关闭'}")
     elif setting_id == '7':
         await account_setting.send(
@@ -198,7 +199,8 @@ async def _(event: Union[GeneralMessageEvent], state: T_State, setting_id=ArgStr
         await account_setting.reject(f"⚠️确认删除账号 {account.display_name} ？发送 \"确认删除\" 以确定。")
     elif setting_id == '确认删除' and state["prepare_to_delete"]:
         user_account.pop(account.bbs_uid)
-        PluginDataManager.write_plugin_data()
+        invalidate_game_record(account.bbs_uid)
+        PluginDataManager.write_plugin_data(event.get_user_id())
         await account_setting.finish(f"已删除账号 {account.display_name} 的数据")
     else:
         await account_setting.reject("⚠️您的输入有误，请重新输入")
@@ -407,7 +409,7 @@ async def _(event: Union[GeneralMessageEvent], matcher: Matcher, choice=ArgStr()
         await matcher.finish("🚪已成功退出")
     elif choice == '是':
         user.enable_notice = not user.enable_notice
-        PluginDataManager.write_plugin_data()
+        PluginDataManager.write_plugin_data(event.get_user_id())
         await matcher.finish(f"自动通知每日计划任务结果 已 {'🔔开启' if user.enable_notice else '🔕关闭'}")
     elif choice == '否':
         await matcher.finish("没有做修改哦~")
@@ -113,12 +113,10 @@ async def _(
                     f"{PluginDataManager.plugin_data.user_bind[user_id]}\n"
                     "您的任何操作都将会影响到目标用户的数据"
                 )
-            elif user_id in PluginDataManager.plugin_data.user_bind.values():
-                user_filter = filter(lambda x: PluginDataManager.plugin_data.user_bind[x] == user_id,
-                                     PluginDataManager.plugin_data.user_bind)
+            elif bind_users := PluginDataManager.plugin_data.get_all_bind(user_id):
                 await matcher.send(
-                    "🖇️目前有以下用户绑定了您的数据：\n"
-                    "\n".join(user_filter)
+                    "🖇️目前有以下用户绑定了您的数据：\n" +
+                    "\n".join(bind_users)
                 )
             else:
                 await matcher.send("⚠️您当前没有绑定任何用户数据，也没有任何用户绑定您的数据")
@@ -127,8 +125,7 @@ async def _(
             if user_id not in PluginDataManager.plugin_data.user_bind:
                 await matcher.finish("⚠️您当前没有绑定任何用户数据")
             else:
-                del PluginDataManager.plugin_data.user_bind[user_id]
-                del PluginDataManager.plugin_data.users[user_id]
+                PluginDataManager.plugin_data.do_user_unbind(user_id)
                 PluginDataManager.write_plugin_data()
                 await matcher.send("✔已清除当前用户的绑定关系，当前用户数据已是空白数据")
 
@@ -143,11 +140,8 @@ async def _(
                 target_id = user_id
                 be_bind = True
 
-            src_users = list(filter(lambda x: PluginDataManager.plugin_data.user_bind[x] == target_id,
-                                    PluginDataManager.plugin_data.user_bind))
-            for key in src_users:
-                del PluginDataManager.plugin_data.user_bind[key]
-                del PluginDataManager.plugin_data.users[key]
+            for key in list(PluginDataManager.plugin_data.get_all_bind(target_id)):
+                PluginDataManager.plugin_data.do_user_unbind(key)
             PluginDataManager.plugin_data.users[target_id].uuid = str(uuid4())
             PluginDataManager.write_plugin_data()
 
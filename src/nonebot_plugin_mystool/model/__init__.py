@@ -1,3 +1,4 @@
 from .common import *
 from .config import *
+from .storage import *
 from .data import *
@@ -378,6 +378,8 @@ class GenshinNote(BaseModel):
     """洞天财瓮 未收取的宝钱数"""
     max_home_coin: Optional[int]
     """洞天财瓮 最多可容纳宝钱数"""
+    home_coin_recovery_time: Optional[int]
+    """洞天财瓮 剩余存满时间（单位：秒）"""
     transformer: Optional[Dict[str, Any]]
     """参量质变仪相关数据"""
     resin_recovery_time: Optional[int]
@@ -491,6 +493,8 @@ class BaseApiStatus(BaseModel):
     """
     success = False
     """成功"""
+    circuit_open = False
+    """上游接口熔断中，请求未发送（同时也会设置 ``network_error``）"""
     network_error = False
     """连接失败"""
     incorrect_return = False
@@ -510,8 +514,8 @@ class BaseApiStatus(BaseModel):
         """
         返回错误类型
         """
-        for key, field in self.__fields__.items():
-            if field and key != "success":
+        for key in self.__fields__:
+            if getattr(self, key) is True and key != "success":
                 return key
         return None
 
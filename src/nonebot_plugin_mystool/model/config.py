@@ -2,7 +2,7 @@ import os
 import sys
 from datetime import time, timedelta, datetime
 from pathlib import Path
-from typing import Union, Optional, Tuple, Any, Dict, TYPE_CHECKING, List
+from typing import Union, Optional, Tuple, Any, Dict, TYPE_CHECKING, List, Literal
 
 import nonebot
 from nonebot.log import logger
@@ -13,7 +13,7 @@ from ..model.common import data_path
 if TYPE_CHECKING:
     IntStr = Union[int, str]
 
-__all__ = ["plugin_config_path", "Preference",
+__all__ = ["plugin_config_path", "RetryPolicy", "Preference",
            "GoodListImageConfig", "SaltConfig", "DeviceConfig", "PluginConfig", "PluginEnv", "plugin_config",
            "plugin_env"]
 
@@ -22,6 +22,18 @@ plugin_config_path = data_path / "configV2.json"
 _driver = nonebot.get_driver()
 
 
+class RetryPolicy(BaseModel):
+    """
+    网络请求重试策略
+    """
+    max_retry_times: Optional[int] = None
+    """最大重试次数（为 None 则使用 ``Preference.max_retry_times``）"""
+    backoff_base: Optional[float] = None
+    """首次重试前等待时间的上限（单位：秒），之后每次重试翻倍，实际等待时间在 0 到上限之间随机（为 None 则使用 ``Preference.retry_interval``）"""
+    backoff_cap: Optional[float] = None
+    """重试等待时间上限的最大值（单位：秒）（为 None 则使用 ``Preference.retry_backoff_cap``）"""
+
+
 class Preference(BaseModel):
     """
     偏好设置
@@ -37,15 +49,77 @@ class Preference(BaseModel):
     max_retry_times: Optional[int] = 3
     """最大网络请求重试次数"""
     retry_interval: float = 2
-    """网络请求重试间隔（单位：秒）（除兑换请求外）"""
+    """网络请求首次重试前等待时间的上限（单位：秒），之后按指数增长并随机抖动（除兑换请求外）"""
+    retry_backoff_cap: float = 30
+    """网络请求重试等待时间上限的最大值（单位：秒）"""
+    retry_policies: Dict[str, RetryPolicy] = {}
+    """按接口设置的重试策略，键为 ``主机名`` 或 ``主机名/路径前缀``（按最长前缀匹配）"""
+    retry_budget: Optional[Tuple[float, int]] = (1, 20)
+    """全局重试预算 (每秒允许的重试次数, 允许积累的重试次数)，预算用尽时不再重试（为 None 则不限制）"""
+    http_max_connections: Optional[int] = 100
+    """每个上游主机的 HTTP 连接池最大连接数（为 None 则不限制）"""
+    http_max_keepalive_connections: Optional[int] = 20
+    """每个上游主机的 HTTP 连接池最大保持活动（Keep-Alive）连接数（为 None 则不限制）"""
+    http_keepalive_expiry: Optional[float] = 30
+    """HTTP 保持活动连接的空闲过期时间（单位：秒）"""
+    http_max_concurrency_per_host: Optional[int] = 16
+    """同一上游主机同时进行中的最大请求数（为 None 则不限制）"""
+    rate_limit: Optional[Tuple[float, int]] = (10, 20)
+    """每个上游主机默认的请求速率限制 (每秒请求数, 突发请求数)（为 None 则不限制）"""
+    rate_limits: Dict[str, Optional[Tuple[float, int]]] = {
+        "bbs-api.miyoushe.com/post/api/getPostFull": (10, 20),
+        "bbs-api.miyoushe.com/apihub/sapi/upvotePost": (10, 20),
+        "bbs-api.miyoushe.com/apihub/api/getShareConf": (5, 10),
+        "bbs-api.mihoyo.com/apihub/app/api/signIn": (5, 10),
+        "api-takumi.mihoyo.com/event/luna": (5, 10),
+        "act-nap-api.mihoyo.com/event/luna": (5, 10),
+    }
+    """
+    按接口设置的请求速率限制，键为 ``主机名`` 或 ``主机名/路径前缀``（按最长前缀匹配），
+    值为 (每秒请求数, 突发请求数)（为 None 则不限制），未匹配的接口按主机名使用 ``rate_limit``
+
+    限制对所有账户共同生效，每日任务的总耗时随账户数线性增长：按默认值，每 1000 个账户的米游币任务
+    （每个账户阅读 3 篇、点赞 5 篇）约需 10 分钟。调低可以降低触发米游社风控的风险，但会相应延长每日任务耗时；
+    账户较少时可以适当调低，账户较多时可以调高或改用 ``sleep_time`` 控制单个账户的请求间隔
+    """
+    circuit_breaker: bool = True
+    """是否启用上游接口熔断，某个接口失败率过高时暂停向其发送请求"""
+    circuit_breaker_window: int = 20
+    """熔断统计的最近请求数"""
+    circuit_breaker_min_requests: int = 10
+    """统计的请求数达到该值后才会判断是否熔断"""
+    circuit_breaker_failure_rate: float = 0.5
+    """触发熔断的失败比例（网络错误或服务器返回 5xx / 429）"""
+    circuit_breaker_cooldown: float = 30
+    """熔断持续时间（单位：秒），之后放行一个试探请求，成功则恢复，失败则继续熔断"""
+    game_list_cache_ttl: float = 86400
+    """游戏信息的缓存有效期（单位：秒）"""
+    game_record_cache_ttl: float = 3600
+    """用户游戏数据（绑定的游戏账号）的缓存有效期（单位：秒）"""
+    good_detail_cache_ttl: float = 10
+    """商品详细信息的缓存有效期（单位：秒）"""
+    post_feed_cache_ttl: float = 300
+    """米游币任务文章列表的缓存有效期（单位：秒），同一分区的所有账户共享"""
+    good_list_concurrency: int = 4
+    """获取商品列表时同时获取的最大页数"""
     timezone: Optional[str] = "Asia/Shanghai"
     """兑换时所用的时区"""
     exchange_thread_count: int = 2
-    """兑换线程数"""
+    """兑换时每轮对每个兑换计划同时发送的请求数"""
+    exchange_burst_offsets: List[float] = [0, 0.05, 0.1, 0.2]
+    """开售后前几轮兑换请求相对开售时刻的发送时间（单位：秒）"""
     exchange_latency: Tuple[float, float] = (0, 0.5)
-    """同一线程下，每个兑换请求之间的间隔时间"""
+    """在 ``exchange_burst_offsets`` 之后，每轮兑换请求之间的间隔时间随机范围（单位：秒）"""
     exchange_duration: float = 5
-    """兑换持续时间随机范围（单位：秒）"""
+    """兑换持续时间（单位：秒）"""
+    exchange_max_attempts: int = 20
+    """每个兑换计划最多发送的兑换请求数"""
+    ntp_server: Optional[str] = "ntp.aliyun.com"
+    """兑换前用于校准本地时钟的 NTP 服务器（为空则不校准）"""
+    exchange_sync_lead: float = 30
+    """在商品开售前多久开始校准时间和测量网络时延（单位：秒）"""
+    exchange_arm_lead: float = 10
+    """在商品开售前多久预先构建兑换请求并建立连接（单位：秒，应小于 ``http_keepalive_expiry``）"""
     enable_log_output: bool = True
     """是否保存日志"""
     log_head: str = ""
@@ -58,6 +132,10 @@ class Preference(BaseModel):
     '''插件名(为模块名字，或于plugins目录手动加载时的目录名)'''
     encoding: str = "utf-8"
     '''文件读写编码'''
+    data_write_delay: float = 1
+    '''插件数据写入的合并等待时间（单位：秒），在此时间内的多次写入会合并为一次并在后台线程中完成，为0则每次都立即写入'''
+    data_storage: Literal["json", "sqlite"] = "json"
+    '''插件数据存储后端，"json" 为 dataV2.json 文件，"sqlite" 为 dataV2.db 数据库（首次启用时会自动导入 dataV2.json 中的数据）'''
     max_user: int = 0
     '''支持最多用户数'''
     add_friend_accept: bool = True
@@ -66,12 +144,42 @@ class Preference(BaseModel):
     '''用户添加机器人为好友以后，是否发送使用指引信息'''
     command_start: str = ""
     '''插件内部命令头(若为""空字符串则不启用)'''
-    sleep_time: float = 2
-    '''任务操作冷却时间(如米游币任务)'''
+    sleep_time: float = 0
+    '''任务操作额外的冷却时间(如米游币任务)，请求频率已由 rate_limits 控制，一般无需设置'''
     plan_time: str = "00:30"
     '''每日自动签到和米游社任务的定时任务执行时间，格式为HH:MM'''
+    daily_concurrency: int = 8
+    '''每日自动任务同时执行的最大用户数（为1时即逐个用户执行），同一用户下各账户的游戏签到和米游币任务仍按顺序执行'''
     resin_interval: int = 60
-    '''每次检查原神便笺间隔，单位为分钟'''
+    '''每次检查原神便笺间隔，单位为分钟（开启 note_adaptive 时为同一账户两次检查的最短间隔）'''
+    note_adaptive: bool = True
+    '''是否根据树脂和开拓力的恢复时间预测下次需要检查便笺的时间，只在可能需要提醒时才检查'''
+    note_max_interval: int = 720
+    '''开启 note_adaptive 时同一账户两次便笺检查的最长间隔，单位为分钟'''
+    note_poll_interval: float = 60
+    '''检查是否有账户到达便笺检查时间的间隔，单位为秒'''
+    note_concurrency: int = 16
+    '''自动便笺检查同时进行的最大检查数（每个账户的原神和星铁便笺各算一项）'''
+    note_check_timeout: float = 60
+    '''自动便笺检查中单项检查的超时时间，单位为秒'''
+    message_rate: Optional[Tuple[float, int]] = (1, 5)
+    '''每个 Bot 主动发送通知消息的速率限制 (每秒消息数, 突发消息数)（为 None 则不限制）'''
+    message_merge_window: float = 3
+    '''通知消息加入发送队列后等待合并的时间（单位：秒），期间发给同一用户的多条消息会合并为一条合并转发消息'''
+    message_retry_times: int = 3
+    '''通知消息发送失败（ActionFailed）时的最大重试次数'''
+    message_retry_interval: float = 2
+    '''通知消息首次重试前的等待时间（单位：秒），之后每次重试翻倍'''
+    file_cache_ttl: float = 86400
+    '''下载文件（如签到奖励图标、微博和米游社官号消息图片）的缓存有效期（单位：秒），为0则不缓存'''
+    file_cache_memory_size: int = 32 * 1024 * 1024
+    '''下载文件内存缓存的最大总大小（单位：字节）'''
+    file_cache_disk_size: int = 256 * 1024 * 1024
+    '''下载文件磁盘缓存的最大总大小（单位：字节）'''
+    icon_cache_ttl: float = 30 * 86400
+    '''商品预览图缓存在多久未被使用后删除（单位：秒）'''
+    icon_cache_disk_size: int = 128 * 1024 * 1024
+    '''商品预览图磁盘缓存的最大总大小（单位：字节），超出时删除最久未使用的预览图'''
     global_geetest: bool = True
     '''是否开启使用全局极验Geetest，默认开启'''
     geetest_url: Optional[str]
@@ -118,6 +226,10 @@ class Preference(BaseModel):
     """
     sign_retry_times: int = 5
     """签到失败默认重试次数"""
+    task_queue_interval: float = 60
+    """检查任务队列中到期任务（如签到失败后的重签）的间隔（单位：秒）"""
+    task_record_retention: float = 7
+    """任务队列中已完成或失败的任务记录保留天数"""
 
     @validator("log_path", allow_reuse=True)
     def _(cls, v: Optional[Path]):
@@ -169,7 +281,15 @@ class GoodListImageConfig(BaseModel):
     SAVE_PATH: Path = data_path
     '''商品列表图片缓存目录'''
     MULTI_PROCESS: bool = sys.platform != "win32"
-    '''是否使用多进程生成图片（如果生成图片时崩溃，可尝试关闭此选项）'''
+    '''是否使用常驻的渲染进程池生成图片（如果生成图片时崩溃，可尝试关闭此选项，关闭后在线程中生成）'''
+    IMAGE_FORMAT: Literal["JPEG", "WEBP", "PNG"] = "JPEG"
+    '''商品列表图片格式'''
+    IMAGE_QUALITY: int = 85
+    '''商品列表图片质量（JPEG 和 WEBP 格式有效，范围 1-100）'''
+    RENDER_PROCESSES: Optional[int] = None
+    '''渲染图片的进程数（为 None 则与 CPU 核心数相同）'''
+    ICON_CONCURRENCY: int = 8
+    '''同时下载商品预览图的最大数量'''
 
 
 class SaltConfig(BaseModel):
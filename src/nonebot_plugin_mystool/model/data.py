@@ -1,15 +1,20 @@
-import json
+import asyncio
+import hashlib
 from json import JSONDecodeError
+from pathlib import Path
 from typing import Union, Optional, Any, Dict, TYPE_CHECKING, AbstractSet, \
-    Mapping, Set, Literal, List
+    Mapping, Set, Literal, List, Iterable, Tuple
 from uuid import UUID, uuid4
 
+import nonebot
 from httpx import Cookies
 from nonebot.log import logger
-from pydantic import BaseModel, ValidationError, validator, Field
+from pydantic import BaseModel, ValidationError, validator, Field, PrivateAttr
 
 from .._version import __version__
 from ..model.common import data_path, BaseModelWithSetter, Address, BaseModelWithUpdate, Good, GameRecord
+from ..model.config import plugin_config
+from ..model.storage import PluginDataStorage, JsonPluginDataStorage, SqlitePluginDataStorage
 
 if TYPE_CHECKING:
     IntStr = Union[int, str]
@@ -313,6 +318,23 @@ class ExchangePlan(BaseModel):
             )
         )
 
+    @property
+    def plan_id(self) -> str:
+        """
+        兑换计划ID
+
+        与 ``hash()`` 不同，在不同进程中保持一致，且不受商品开售后兑换时间变化的影响，可用于定时任务ID等需要持久化的场合
+        """
+        key = "-".join(
+            (
+                self.good.goods_id,
+                str(self.address.id) if self.address else "",
+                self.account.bbs_uid,
+                self.game_record.game_role_id if self.game_record else ""
+            )
+        )
+        return hashlib.md5(key.encode()).hexdigest()
+
     class CustomDict(dict):
         _hash: int
 
@@ -439,6 +461,20 @@ class PluginData(BaseModel):
     users: Dict[str, UserData] = {}
     '''所有用户数据'''
 
+    _bind_index: Dict[str, Set[str]] = PrivateAttr(default_factory=dict)
+    """用户数据绑定关系的反向索引 (被绑定用户数据:所有绑定它的空用户数据)"""
+    _unique_users: Optional[List[Tuple[str, UserData]]] = PrivateAttr(default=None)
+    """缓存的不包含绑定用户数据的所有用户数据，通过 add_user、do_user_bind、do_user_unbind 增删用户时清空"""
+
+    def _rebuild_bind_index(self):
+        """
+        根据 self.user_bind 重建反向索引
+        """
+        self._bind_index = {}
+        for src, dst in (self.user_bind or {}).items():
+            self._bind_index.setdefault(dst, set()).add(src)
+        self._unique_users = None
+
     def do_user_bind(self, src: str = None, dst: str = None, write: bool = False):
         """
         执行用户数据绑定同步，将src指向dst的用户数据，即src处的数据将会被dst处的数据对象替换
@@ -453,18 +489,69 @@ class PluginData(BaseModel):
                     self.users[x] = self.users[y]
                 except KeyError:
                     logger.error(f"用户数据绑定失败，目标用户 {y} 不存在")
+            self._rebuild_bind_index()
         else:
             try:
-                self.user_bind[src] = dst
                 self.users[src] = self.users[dst]
             except KeyError:
                 logger.error(f"用户数据绑定失败，目标用户 {dst} 不存在")
             else:
+                if (old_dst := self.user_bind.get(src)) is not None:
+                    self._bind_index.get(old_dst, set()).discard(src)
+                self.user_bind[src] = dst
+                self._bind_index.setdefault(dst, set()).add(src)
+                self._unique_users = None
                 if write:
                     PluginDataManager.write_plugin_data()
 
+    def do_user_unbind(self, src: str):
+        """
+        解除用户数据绑定，并删除src处的用户数据（即src恢复为空白用户数据）
+
+        :param src: 源用户数据
+        """
+        dst = self.user_bind.pop(src, None)
+        if dst is not None:
+            bind_set = self._bind_index.get(dst)
+            if bind_set is not None:
+                bind_set.discard(src)
+                if not bind_set:
+                    del self._bind_index[dst]
+        self.users.pop(src, None)
+        self._unique_users = None
+
+    def add_user(self, user_id: str) -> UserData:
+        """
+        获取用户数据，不存在则创建空白用户数据
+
+        :param user_id: 用户ID
+        """
+        user = self.users.get(user_id)
+        if user is None:
+            user = self.users[user_id] = UserData()
+            self._unique_users = None
+        return user
+
+    def get_all_bind(self, user_id: str) -> Set[str]:
+        """
+        获取绑定该用户的所有用户ID
+
+        :param user_id: 被绑定的用户ID
+        """
+        return self._bind_index.get(user_id, set())
+
+    def get_unique_users(self) -> List[Tuple[str, UserData]]:
+        """
+        获取 不包含绑定用户数据 的所有用户数据以及对应的ID，即不会出现值重复项（结果会被缓存）
+        """
+        if self._unique_users is None:
+            self._unique_users = [x for x in self.users.items() if x[0] not in self.user_bind]
+        return self._unique_users
+
     def __init__(self, **data: Any):
         super().__init__(**data)
+        if self.user_bind is None:
+            self.user_bind = {}
         self.do_user_bind(write=True)
 
     class Config:
@@ -474,54 +561,170 @@ class PluginData(BaseModel):
 class PluginDataManager:
     plugin_data: Optional[PluginData] = None
     """加载出的插件数据对象"""
+    storage: Optional[PluginDataStorage] = None
+    """插件数据存储后端"""
+    dirty: bool = False
+    """是否有尚未写入的数据变更"""
+    dirty_users: Optional[Set[str]] = set()
+    """尚未写入的数据变更所涉及的用户ID，为 None 则需要检查全部数据"""
+    _flush_handle: Optional[asyncio.TimerHandle] = None
+    _flush_lock: Optional[asyncio.Lock] = None
+
+    @classmethod
+    def create_storage(cls) -> PluginDataStorage:
+        """
+        根据 ``Preference.data_storage`` 创建插件数据存储后端
+        """
+        if plugin_config.preference.data_storage == SqlitePluginDataStorage.name:
+            return SqlitePluginDataStorage()
+        else:
+            return JsonPluginDataStorage(plugin_data_path)
 
     @classmethod
     def load_plugin_data(cls):
         """
         加载插件数据文件
         """
-        if plugin_data_path.exists() and plugin_data_path.is_file():
-            try:
-                with open(plugin_data_path, "r") as f:
-                    plugin_data_dict = json.load(f)
+        cls.storage = cls.create_storage()
+        imported = False
+        """是否从插件数据文件导入了数据"""
+        try:
+            plugin_data_dict = cls.storage.load()
+            # 首次启用数据库存储时，导入原有的插件数据文件
+            if plugin_data_dict is None and not isinstance(cls.storage, JsonPluginDataStorage):
+                plugin_data_dict = JsonPluginDataStorage(plugin_data_path).load()
+                imported = plugin_data_dict is not None
+            if plugin_data_dict is not None:
                 # 读取完整的插件数据
                 cls.plugin_data = PluginData.parse_obj(plugin_data_dict)
-            except (ValidationError, JSONDecodeError):
-                logger.exception(f"读取插件数据文件失败，请检查插件数据文件 {plugin_data_path} 格式是否正确")
-                raise
-            except Exception:
-                logger.exception(
-                    f"读取插件数据文件失败，请检查插件数据文件 {plugin_data_path} 是否存在且有权限读取和写入")
-                raise
-        else:
+        except (ValidationError, JSONDecodeError):
+            logger.exception(f"读取插件数据失败，请检查插件数据文件 {plugin_data_path} 格式是否正确")
+            raise
+        except Exception:
+            logger.exception(
+                f"读取插件数据失败，请检查插件数据文件 {plugin_data_path} 是否存在且有权限读取和写入")
+            raise
+        if plugin_data_dict is None:
             cls.plugin_data = PluginData()
-            try:
-                str_data = cls.plugin_data.json(indent=4)
-                plugin_data_path.parent.mkdir(parents=True, exist_ok=True)
-                with open(plugin_data_path, "w", encoding="utf-8") as f:
-                    f.write(str_data)
-            except (AttributeError, TypeError, ValueError, PermissionError):
-                logger.exception(f"创建插件数据文件失败，请检查是否有权限读取和写入 {plugin_data_path}")
-                raise
-            else:
-                logger.info(f"插件数据文件 {plugin_data_path} 不存在，已创建默认插件数据文件。")
+            if not cls.storage.save(cls.plugin_data):
+                logger.error(f"创建插件数据失败，请检查是否有权限读取和写入 {data_path}")
+                raise PermissionError(data_path)
+            logger.info("插件数据不存在，已创建默认插件数据。")
+        elif imported and cls.storage.save(cls.plugin_data):
+            logger.info(f"已从插件数据文件 {plugin_data_path} 导入插件数据")
 
     @classmethod
-    def write_plugin_data(cls):
+    def write_plugin_data(cls, *user_ids: str):
         """
         写入插件数据文件
 
-        :return: 是否成功
+        在事件循环中调用时，只标记数据已变更，``Preference.data_write_delay`` 时间内的多次写入会合并为一次，
+        并在后台线程中完成写入。
+
+        :param user_ids: 发生了变更的用户ID，为空则检查全部数据（存储后端支持时只写入这些用户的数据）
+        :return: 是否成功（合并写入时总是返回 True）
         """
+        delay = plugin_config.preference.data_write_delay
         try:
-            str_data = cls.plugin_data.json(indent=4)
-        except (AttributeError, TypeError, ValueError):
-            logger.exception("数据对象序列化失败，可能是数据类型错误")
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        if not delay or loop is None:
+            return cls.storage.save(cls.plugin_data, user_ids or None)
+        cls._mark_dirty(user_ids)
+        cls._schedule_flush(loop, delay)
+        return True
+
+    @classmethod
+    def _schedule_flush(cls, loop: asyncio.AbstractEventLoop, delay: float):
+        if cls._flush_handle is None:
+            cls._flush_handle = loop.call_later(delay, lambda: asyncio.ensure_future(cls.flush()))
+
+    @classmethod
+    def _mark_dirty(cls, user_ids: Iterable[str]):
+        user_ids = set(user_ids)
+        if not user_ids:
+            cls.dirty_users = None
+        elif cls.dirty_users is not None:
+            cls.dirty_users.update(user_ids)
+        cls.dirty = True
+
+    @classmethod
+    def _snapshot(cls, user_ids: Optional[Set[str]]) -> PluginData:
+        """
+        复制需要写入的插件数据，使后台线程写入时不受事件循环中的数据修改影响
+
+        :param user_ids: 发生了变更的用户ID，为 None 时复制全部数据
+        """
+        plugin_data = cls.plugin_data
+        if user_ids is None:
+            return plugin_data.copy(deep=True)
+        user_bind = dict(plugin_data.user_bind or {})
+        users = {}
+        for user_id in user_ids:
+            user_id = user_bind.get(user_id, user_id)
+            if (user := plugin_data.users.get(user_id)) is not None:
+                users[user_id] = user.copy(deep=True)
+        return plugin_data.copy(update={"users": users, "user_bind": user_bind})
+
+    @classmethod
+    async def flush(cls):
+        """
+        立即写入所有尚未写入的数据变更（例如在机器人关闭时）
+
+        :return: 是否成功
+        """
+        if cls._flush_handle is not None:
+            cls._flush_handle.cancel()
+            cls._flush_handle = None
+        if cls._flush_lock is None:
+            cls._flush_lock = asyncio.Lock()
+        async with cls._flush_lock:
+            if not cls.dirty:
+                return True
+            loop = asyncio.get_running_loop()
+            user_ids = cls.dirty_users
+            cls.dirty, cls.dirty_users = False, set()
+            try:
+                if isinstance(cls.storage, JsonPluginDataStorage):
+                    # 每次都写入完整数据，直接在事件循环中序列化（无需先复制全部数据），只在线程中写入文件
+                    str_data = cls.storage.serialize(cls.plugin_data)
+                    result = str_data is not None and await loop.run_in_executor(None, cls.storage.write, str_data)
+                else:
+                    snapshot = cls._snapshot(user_ids)
+                    result = await loop.run_in_executor(None, cls.storage.save, snapshot, user_ids)
+            except Exception:
+                logger.exception("插件数据写入失败")
+                result = False
+            if not result:
+                # 恢复未写入的变更，稍后重新写入
+                cls._mark_dirty(user_ids or ())
+                cls._schedule_flush(loop, max(plugin_config.preference.data_write_delay, 1))
+            return result
+
+    @classmethod
+    def export_json(cls, path: Path = plugin_data_path):
+        """
+        将插件数据导出为 JSON 文件（可用于在不同存储后端之间迁移）
+
+        :param path: 导出路径
+        :return: 是否成功
+        """
+        return JsonPluginDataStorage(path).save(cls.plugin_data)
+
+    @classmethod
+    def import_json(cls, path: Path = plugin_data_path):
+        """
+        从 JSON 文件导入插件数据，替换当前的插件数据并写入存储后端
+
+        :param path: JSON 文件路径
+        :return: 是否成功
+        """
+        plugin_data_dict = JsonPluginDataStorage(path).load()
+        if plugin_data_dict is None:
             return False
-        else:
-            with open(plugin_data_path, "w", encoding="utf-8") as f:
-                f.write(str_data)
-            return True
+        cls.plugin_data = PluginData.parse_obj(plugin_data_dict)
+        return cls.storage.save(cls.plugin_data)
 
 
 PluginDataManager.load_plugin_data()
@@ -529,3 +732,5 @@ PluginDataManager.load_plugin_data()
 # 如果插件数据文件加载后，发现有用户没有UUID密钥，进行了生成，则需要保存写入
 if _new_uuid_in_init:
     PluginDataManager.write_plugin_data()
+
+nonebot.get_driver().on_shutdown(PluginDataManager.flush)
@@ -0,0 +1,237 @@
+import hashlib
+import json
+import os
+import sqlite3
+from pathlib import Path
+from typing import Optional, Dict, Any, Iterable, Tuple, TYPE_CHECKING
+
+from nonebot.log import logger
+
+from ..model.common import data_path
+
+if TYPE_CHECKING:
+    from ..model.data import PluginData, UserData
+
+__all__ = ["plugin_data_db_path", "PluginDataStorage", "JsonPluginDataStorage", "SqlitePluginDataStorage"]
+
+plugin_data_db_path = data_path / "dataV2.db"
+"""SQLite 插件数据库默认路径"""
+
+
+class PluginDataStorage:
+    """
+    插件数据存储后端
+    """
+    name: str = ""
+    """存储后端名称，与 ``Preference.data_storage`` 对应"""
+    partial: bool = False
+    """是否支持只写入发生了变更的用户的数据"""
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        """
+        读取插件数据
+
+        :return: 与 ``dataV2.json`` 结构相同的插件数据字典，如果尚未保存过数据则返回 ``None``
+        """
+        raise NotImplementedError
+
+    def save(self, plugin_data: "PluginData", user_ids: Optional[Iterable[str]] = None) -> bool:
+        """
+        保存插件数据
+
+        :param plugin_data: 插件数据
+        :param user_ids: 发生了变更的用户ID，为空则检查全部数据
+        :return: 是否成功
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """
+        关闭存储后端
+        """
+        pass
+
+
+class JsonPluginDataStorage(PluginDataStorage):
+    """
+    JSON 文件存储后端（每次保存都会写入完整的插件数据）
+
+    先写入同目录下的临时文件并同步到磁盘，再替换原文件，避免写入过程中意外退出导致文件损坏。
+    """
+    name = "json"
+
+    def __init__(self, path: Path):
+        self.path = path
+
+    def load(self):
+        if not (self.path.exists() and self.path.is_file()):
+            return None
+        with open(self.path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def save(self, plugin_data, user_ids=None):
+        str_data = self.serialize(plugin_data)
+        return str_data is not None and self.write(str_data)
+
+    @staticmethod
+    def serialize(plugin_data: "PluginData") -> Optional[str]:
+        """
+        将插件数据序列化为 JSON
+
+        :param plugin_data: 插件数据
+        :return: JSON 字符串，序列化失败则返回 ``None``
+        """
+        try:
+            return plugin_data.json(indent=4)
+        except (AttributeError, TypeError, ValueError):
+            logger.exception("数据对象序列化失败，可能是数据类型错误")
+            return None
+
+    def write(self, str_data: str) -> bool:
+        """
+        写入序列化后的插件数据
+
+        :param str_data: JSON 字符串
+        :return: 是否成功
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.path.with_name(f".{self.path.name}.tmp")
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(str_data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+        return True
+
+
+class SqlitePluginDataStorage(PluginDataStorage):
+    """
+    SQLite 存储后端
+
+    用户、账户、兑换计划、用户绑定关系分别按行保存，每次保存只写入内容发生变化的行。
+    """
+    name = "sqlite"
+    partial = True
+
+    def __init__(self, path: Path = plugin_data_db_path):
+        self.path = path
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        with self.connection:
+            self.connection.executescript(
+                "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);"
+                "CREATE TABLE IF NOT EXISTS user (user_id TEXT PRIMARY KEY, data TEXT NOT NULL);"
+                "CREATE TABLE IF NOT EXISTS account ("
+                "user_id TEXT NOT NULL, bbs_uid TEXT NOT NULL, data TEXT NOT NULL, PRIMARY KEY (user_id, bbs_uid));"
+                "CREATE TABLE IF NOT EXISTS exchange_plan ("
+                "user_id TEXT NOT NULL, plan_id TEXT NOT NULL, data TEXT NOT NULL, PRIMARY KEY (user_id, plan_id));"
+                "CREATE TABLE IF NOT EXISTS user_bind (src TEXT PRIMARY KEY, dst TEXT NOT NULL);"
+            )
+        self._digests: Dict[str, Dict[Tuple[str, str], str]] = {}
+        """用户ID -> {(表名, 行主键) -> 已保存的行内容摘要}"""
+        self._user_bind: Dict[str, str] = {}
+        """已保存的用户绑定关系"""
+
+    @staticmethod
+    def _digest(data: str) -> str:
+        return hashlib.md5(data.encode()).hexdigest()
+
+    def load(self):
+        connection = self.connection
+        version = connection.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        if version is None:
+            return None
+        self._digests.clear()
+        users: Dict[str, Dict[str, Any]] = {}
+        for user_id, data in connection.execute("SELECT user_id, data FROM user"):
+            self._digests[user_id] = {("user", ""): self._digest(data)}
+            users[user_id] = json.loads(data)
+            users[user_id]["accounts"] = {}
+            users[user_id]["exchange_plans"] = []
+        for user_id, bbs_uid, data in connection.execute("SELECT user_id, bbs_uid, data FROM account"):
+            if user_id in users:
+                self._digests[user_id]["account", bbs_uid] = self._digest(data)
+                users[user_id]["accounts"][bbs_uid] = json.loads(data)
+        for user_id, plan_id, data in connection.execute("SELECT user_id, plan_id, data FROM exchange_plan"):
+            if user_id in users:
+                self._digests[user_id]["exchange_plan", plan_id] = self._digest(data)
+                users[user_id]["exchange_plans"].append(json.loads(data))
+        self._user_bind = dict(connection.execute("SELECT src, dst FROM user_bind").fetchall())
+        return {"version": version[0], "user_bind": dict(self._user_bind), "users": users}
+
+    def _upsert(self, table: str, columns: Tuple[str, ...], user_id: str, key: str, values: Tuple[str, ...],
+                data: str):
+        digest = self._digest(data)
+        digests = self._digests.setdefault(user_id, {})
+        if digests.get((table, key)) != digest:
+            self.connection.execute(
+                f"INSERT OR REPLACE INTO {table} ({', '.join(columns)}, data) "
+                f"VALUES ({', '.join('?' * (len(columns) + 1))})",
+                (*values, data)
+            )
+            digests[table, key] = digest
+
+    def _delete_missing(self, table: str, key_column: str, user_id: str, keys: Iterable[str]):
+        keys = set(keys)
+        digests = self._digests.get(user_id, {})
+        for cached_table, cached_key in list(digests):
+            if cached_table == table and cached_key not in keys:
+                self.connection.execute(
+                    f"DELETE FROM {table} WHERE user_id = ? AND {key_column} = ?",
+                    (user_id, cached_key)
+                )
+                del digests[cached_table, cached_key]
+
+    def _save_user(self, user_id: str, user: Optional["UserData"]):
+        if user is None:
+            if self._digests.pop(user_id, None) is not None:
+                self.connection.execute("DELETE FROM user WHERE user_id = ?", (user_id,))
+                self.connection.execute("DELETE FROM account WHERE user_id = ?", (user_id,))
+                self.connection.execute("DELETE FROM exchange_plan WHERE user_id = ?", (user_id,))
+            return
+        self._upsert("user", ("user_id",), user_id, "", (user_id,),
+                     user.json(exclude={"accounts", "exchange_plans"}))
+        for bbs_uid, account in user.accounts.items():
+            self._upsert("account", ("user_id", "bbs_uid"), user_id, bbs_uid, (user_id, bbs_uid), account.json())
+        self._delete_missing("account", "bbs_uid", user_id, user.accounts.keys())
+        plan_ids = []
+        for plan in user.exchange_plans:
+            # 以兑换计划ID作为行的键，商品兑换时间等内容变化时只更新该行，而不是删除后重新插入
+            plan_id = plan.plan_id
+            plan_ids.append(plan_id)
+            self._upsert("exchange_plan", ("user_id", "plan_id"), user_id, plan_id, (user_id, plan_id), plan.json())
+        self._delete_missing("exchange_plan", "plan_id", user_id, plan_ids)
+
+    def save(self, plugin_data, user_ids=None):
+        user_bind = plugin_data.user_bind or {}
+        try:
+            with self.connection:
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('version', ?)", (plugin_data.version,)
+                )
+                if user_ids is None:
+                    # 全量检查：同步用户绑定关系，删除已不存在的用户
+                    if user_bind != self._user_bind:
+                        self.connection.execute("DELETE FROM user_bind")
+                        self.connection.executemany(
+                            "INSERT INTO user_bind (src, dst) VALUES (?, ?)", list(user_bind.items())
+                        )
+                        self._user_bind = dict(user_bind)
+                    targets = {user_id for user_id in plugin_data.users if user_id not in user_bind}
+                    targets.update(self._digests)
+                else:
+                    # 被绑定的用户数据实际保存在目标用户处
+                    targets = {user_bind.get(user_id, user_id) for user_id in user_ids}
+                for user_id in targets:
+                    user = None if user_id in user_bind else plugin_data.users.get(user_id)
+                    self._save_user(user_id, user)
+        except (AttributeError, TypeError, ValueError, sqlite3.Error):
+            logger.exception(f"插件数据写入数据库 {self.path} 失败")
+            # 事务已回滚，重新读取已保存的行内容摘要
+            self.load()
+            return False
+        return True
+
+    def close(self):
+        self.connection.close()
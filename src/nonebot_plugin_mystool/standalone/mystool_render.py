@@ -0,0 +1,133 @@
+"""
+商品列表图片绘制
+
+该模块只依赖 Pillow 和标准库，不导入 NoneBot 和插件包，渲染进程可以直接导入而无需加载整个插件
+（所在目录会被加入 ``sys.path``，见 ``nonebot_plugin_mystool.utils.good_image``）。
+"""
+import functools
+import io
+from typing import List, Tuple, NamedTuple
+
+from PIL import Image, ImageDraw, ImageFont
+
+__all__ = ["RenderOptions", "load_font", "GoodListRenderer", "get_renderer", "render_good_list", "init_render_worker"]
+
+_RESAMPLE = getattr(Image, "Resampling", Image).LANCZOS
+
+
+class RenderOptions(NamedTuple):
+    """
+    商品列表图片绘制参数（由 ``GoodListImageConfig`` 生成）
+    """
+    font_path: str
+    """字体文件路径或字体名称"""
+    font_size: int
+    """字体大小"""
+    encoding: str
+    """字体编码"""
+    width: int
+    """图片宽度"""
+    icon_size: Tuple[int, int]
+    """预览图大小"""
+    row_height: int
+    """每行高度"""
+    text_offset: Tuple[int, int]
+    """文字相对每行左上角的位置"""
+    image_format: str
+    """图片格式"""
+    image_quality: int
+    """图片质量（JPEG、WEBP）"""
+
+
+@functools.lru_cache(maxsize=None)
+def load_font(font_path: str, size: int, encoding: str) -> ImageFont.FreeTypeFont:
+    """
+    加载字体，每个进程中同一字体只会加载一次
+
+    :param font_path: 字体文件路径或字体名称
+    :param size: 字体大小
+    :param encoding: 字体编码
+    """
+    return ImageFont.truetype(font_path, size, encoding=encoding)
+
+
+class GoodListRenderer:
+    """
+    商品列表图片绘制器
+
+    字体和排版在创建时计算一次，之后每次绘制只需在预先分配好大小的画布上逐行粘贴预览图并写入文字。
+    """
+
+    def __init__(self, options: RenderOptions):
+        """
+        :param options: 绘制参数
+        """
+        self.options = options
+        self.font = load_font(options.font_path, options.font_size, options.encoding)
+        self.save_options = {
+            "JPEG": {"quality": options.image_quality, "optimize": True},
+            "WEBP": {"quality": options.image_quality, "method": 4},
+            "PNG": {"optimize": True}
+        }[options.image_format]
+        """导出图片时的参数"""
+
+    def load_icon(self, icon: bytes) -> Image.Image:
+        """
+        读取并缩放预览图
+
+        :param icon: 预览图数据
+        """
+        img = Image.open(io.BytesIO(icon))
+        # JPEG 图片可在解码时直接缩小，减少解码和缩放的开销
+        img.draft("RGB", self.options.icon_size)
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGBA")
+        return img.resize(self.options.icon_size, _RESAMPLE)
+
+    def render(self, rows: List[Tuple[str, bytes]]) -> bytes:
+        """
+        绘制商品列表图片
+
+        :param rows: (商品文字, 商品预览图数据) 列表
+        :return: 图片数据
+        """
+        options = self.options
+        canvas = Image.new("RGB", (options.width, options.row_height * len(rows)), (255, 255, 255))
+        draw = ImageDraw.Draw(canvas)
+        text_x, text_y = options.text_offset
+        for i, (text, icon) in enumerate(rows):
+            top = i * options.row_height
+            img = self.load_icon(icon)
+            canvas.paste(img, (0, top), img if img.mode == "RGBA" else None)
+            draw.multiline_text((text_x, top + text_y), text, (0, 0, 0), self.font)
+        image_bytes = io.BytesIO()
+        canvas.save(image_bytes, format=options.image_format, **self.save_options)
+        return image_bytes.getvalue()
+
+
+@functools.lru_cache(maxsize=None)
+def get_renderer(options: RenderOptions) -> GoodListRenderer:
+    """
+    获取商品列表图片绘制器，每个进程中同一绘制参数只会创建一次
+
+    :param options: 绘制参数
+    """
+    return GoodListRenderer(options)
+
+
+def render_good_list(options: RenderOptions, rows: List[Tuple[str, bytes]]) -> bytes:
+    """
+    绘制商品列表图片，只进行图片处理，不进行任何网络请求，可以在渲染进程中执行
+
+    :param options: 绘制参数
+    :param rows: (商品文字, 商品预览图数据) 列表
+    :return: 图片数据
+    """
+    return get_renderer(options).render(rows)
+
+
+def init_render_worker(options: RenderOptions):
+    """
+    渲染进程初始化，预先加载字体和排版
+    """
+    get_renderer(options)
@@ -1,2 +1,11 @@
+from .rate_limit import *
+from .circuit_breaker import *
+from .file_cache import *
+from .http_client import *
 from .common import *
+from .message_queue import *
+from .task_queue import *
+from .note_scheduler import *
+from .request_cache import *
+from .time_sync import *
 from .good_image import *
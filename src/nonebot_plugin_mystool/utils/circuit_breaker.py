@@ -0,0 +1,158 @@
+import time
+from collections import deque
+from enum import Enum
+from typing import Deque, Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+from nonebot.log import logger
+
+from ..model import plugin_config
+
+__all__ = ["is_upstream_failure", "CircuitOpenError", "CircuitState", "CircuitBreaker"]
+
+
+def is_upstream_failure(exception: BaseException) -> bool:
+    """
+    判断请求异常是否属于上游接口故障：网络传输错误，或服务器返回 5xx / 429
+    """
+    if isinstance(exception, httpx.TransportError):
+        return True
+    if isinstance(exception, httpx.HTTPStatusError):
+        status_code = exception.response.status_code
+        return status_code == 429 or status_code >= 500
+    return False
+
+
+class CircuitOpenError(Exception):
+    """
+    上游接口处于熔断状态，请求未发送
+    """
+
+    def __init__(self, endpoint: str, retry_in: float):
+        """
+        :param endpoint: 熔断的接口（``主机名/路径``）
+        :param retry_in: 距离允许试探请求的剩余时间（单位：秒）
+        """
+        super().__init__(f"上游接口 {endpoint} 熔断中，{retry_in:.0f} 秒后重新尝试")
+        self.endpoint = endpoint
+        self.retry_in = retry_in
+
+
+class CircuitState(str, Enum):
+    """
+    熔断器状态
+    """
+    CLOSED = "closed"
+    """正常放行请求"""
+    OPEN = "open"
+    """熔断中，直接拒绝请求"""
+    HALF_OPEN = "half_open"
+    """冷却结束，仅放行一个试探请求"""
+
+
+class CircuitBreaker:
+    """
+    上游接口熔断器
+
+    每个接口（``主机名/路径``）对应一个熔断器，记录最近 ``Preference.circuit_breaker_window`` 次请求的结果，
+    失败比例达到 ``Preference.circuit_breaker_failure_rate`` 后进入熔断状态，之后的请求直接失败而不发送；
+    冷却 ``Preference.circuit_breaker_cooldown`` 秒后放行一个试探请求，成功则恢复，失败则继续熔断。
+    """
+    breakers: Dict[str, "CircuitBreaker"] = {}
+    """接口 -> 熔断器"""
+
+    def __init__(self, endpoint: str):
+        """
+        :param endpoint: 接口（``主机名/路径``）
+        """
+        self.endpoint = endpoint
+        self.state = CircuitState.CLOSED
+        self.outcomes: Deque[bool] = deque()
+        """最近的请求结果（是否失败）"""
+        self.opened_at: Optional[float] = None
+        """进入熔断状态的时间戳"""
+        self.probing = False
+        """是否有进行中的试探请求"""
+
+    @staticmethod
+    def endpoint_of(url: str) -> str:
+        """
+        获取 URL 对应的接口名称（``主机名/路径``，不含查询参数）
+
+        :param url: 请求的 URL（也可以是带有格式化占位符的 URL 模板）
+        """
+        split = urlsplit(url)
+        return f"{split.hostname or ''}{split.path}"
+
+    @classmethod
+    def get(cls, url: str) -> Optional["CircuitBreaker"]:
+        """
+        获取 URL 对应的熔断器，未启用熔断时返回 ``None``
+
+        :param url: 请求的 URL
+        """
+        if not plugin_config.preference.circuit_breaker:
+            return None
+        endpoint = cls.endpoint_of(url)
+        breaker = cls.breakers.get(endpoint)
+        if breaker is None:
+            breaker = cls.breakers[endpoint] = cls(endpoint)
+        return breaker
+
+    def before_request(self):
+        """
+        发送请求前调用，熔断中或已有试探请求时抛出 ``CircuitOpenError``
+        """
+        if self.state == CircuitState.OPEN:
+            retry_in = self.opened_at + plugin_config.preference.circuit_breaker_cooldown - time.monotonic()
+            if retry_in > 0:
+                raise CircuitOpenError(self.endpoint, retry_in)
+            self.state = CircuitState.HALF_OPEN
+        if self.state == CircuitState.HALF_OPEN:
+            if self.probing:
+                raise CircuitOpenError(self.endpoint, 0)
+            self.probing = True
+            logger.info(f"{plugin_config.preference.log_head}上游接口 {self.endpoint} 熔断冷却结束，发送试探请求")
+
+    def record(self, failed: bool):
+        """
+        记录一次请求结果
+
+        :param failed: 是否因上游接口故障而失败
+        """
+        preference = plugin_config.preference
+        if self.state == CircuitState.HALF_OPEN:
+            self.probing = False
+            if failed:
+                self._open()
+            else:
+                self.state = CircuitState.CLOSED
+                self.outcomes.clear()
+                logger.info(f"{preference.log_head}上游接口 {self.endpoint} 已恢复，结束熔断")
+            return
+        if self.state == CircuitState.OPEN:
+            return
+        self.outcomes.append(failed)
+        while len(self.outcomes) > max(1, preference.circuit_breaker_window):
+            self.outcomes.popleft()
+        if len(self.outcomes) >= preference.circuit_breaker_min_requests and \
+                sum(self.outcomes) / len(self.outcomes) >= preference.circuit_breaker_failure_rate:
+            self._open()
+
+    def release(self):
+        """
+        请求被取消或因其他原因未得到结果时调用，释放试探请求名额
+        """
+        if self.state == CircuitState.HALF_OPEN:
+            self.probing = False
+
+    def _open(self):
+        """
+        进入熔断状态
+        """
+        self.state = CircuitState.OPEN
+        self.opened_at = time.monotonic()
+        self.outcomes.clear()
+        logger.warning(f"{plugin_config.preference.log_head}上游接口 {self.endpoint} 失败率过高，"
+                       f"熔断 {plugin_config.preference.circuit_breaker_cooldown:.0f} 秒")
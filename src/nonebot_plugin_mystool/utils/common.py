@@ -7,6 +7,7 @@ import string
 import time
 import uuid
 from copy import deepcopy
+from email.utils import parsedate_to_datetime
 from pathlib import Path
 from typing import (Dict, Literal,
                     Union, Optional, Tuple, Iterable, List)
@@ -26,7 +27,7 @@ except ImportError:
 from nonebot import Adapter, Bot
 
 from nonebot_plugin_saa import MessageSegmentFactory, Text, AggregatedMessageFactory, TargetQQPrivate, \
-    TargetQQGuildDirect, enable_auto_select_bot, TargetQQGroup
+    TargetQQGuildDirect, enable_auto_select_bot, TargetQQGroup, PlatformTarget
 
 from nonebot.adapters.onebot.v11 import MessageEvent as OneBotV11MessageEvent, PrivateMessageEvent, GroupMessageEvent, \
     Adapter as OneBotV11Adapter, Bot as OneBotV11Bot
@@ -36,13 +37,20 @@ from nonebot.log import logger
 from nonebot.log import logger
 from qrcode import QRCode
 
-from ..model import GeetestResult, PluginDataManager, Preference, plugin_config, plugin_env, UserData
+from ..model import GeetestResult, PluginDataManager, Preference, plugin_config, plugin_env, UserData, RetryPolicy
+from ..utils.circuit_breaker import CircuitOpenError, is_upstream_failure
+from ..utils.file_cache import FileCache
+from ..utils.http_client import HttpClientManager
+from ..utils.rate_limit import TokenBucket
+from ..utils.request_cache import RequestCache
 
 __all__ = ["GeneralMessageEvent", "GeneralPrivateMessageEvent", "GeneralGroupMessageEvent", "CommandBegin",
            "get_last_command_sep", "COMMAND_BEGIN", "set_logger", "logger", "PLUGIN", "custom_attempt_times",
+           "is_circuit_open", "get_retry_policy", "get_retry_after", "RetryBudget",
            "get_async_retry", "generate_device_id", "cookie_str_to_dict", "cookie_dict_to_str", "generate_ds",
            "get_validate", "generate_seed_id", "generate_fp_locally", "get_file", "blur_phone", "generate_qr_img",
-           "send_private_msg", "send_group_msg", "wrap_and_forward_message", "get_unique_users", "get_all_bind", "read_blacklist", "read_whitelist",
+           "resolve_bots", "get_private_target", "get_group_target", "send_private_msg", "send_group_msg",
+           "wrap_and_forward_message", "get_unique_users", "get_all_bind", "read_blacklist", "read_whitelist",
            "read_admin_list", "html2img", "get_local_images"]
 
 # 启用 nonebot-plugin-send-anything-anywhere 的自动选择 Bot 功能
@@ -135,16 +143,117 @@ def custom_attempt_times(retry: bool):
         return tenacity.stop_after_attempt(1)
 
 
+def is_circuit_open(exception: BaseException) -> bool:
+    """
+    判断请求是否因上游接口熔断而未发送
+
+    :param exception: 请求异常（可以是 ``tenacity.RetryError``）
+    """
+    if isinstance(exception, tenacity.RetryError):
+        exception = exception.last_attempt.exception()
+    return isinstance(exception, CircuitOpenError)
+
+
+def get_retry_policy(exception: BaseException) -> RetryPolicy:
+    """
+    根据出错请求的 URL 获取重试策略，未设置的项使用全局设置
+
+    :param exception: 请求异常
+    """
+    preference = plugin_config.preference
+    policy = None
+    try:
+        url = exception.request.url if isinstance(exception, (httpx.RequestError, httpx.HTTPStatusError)) else None
+    except RuntimeError:
+        url = None
+    if url is not None and preference.retry_policies:
+        target = f"{url.host}{url.path}"
+        matched = max((rule for rule in preference.retry_policies if target.startswith(rule)), key=len, default=None)
+        policy = preference.retry_policies.get(matched)
+    policy = policy or RetryPolicy()
+    return RetryPolicy(
+        max_retry_times=preference.max_retry_times if policy.max_retry_times is None else policy.max_retry_times,
+        backoff_base=preference.retry_interval if policy.backoff_base is None else policy.backoff_base,
+        backoff_cap=preference.retry_backoff_cap if policy.backoff_cap is None else policy.backoff_cap
+    )
+
+
+def get_retry_after(exception: BaseException) -> Optional[float]:
+    """
+    读取服务器返回的 ``Retry-After``（单位：秒）
+    """
+    if not isinstance(exception, httpx.HTTPStatusError):
+        return None
+    value = exception.response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryBudget:
+    """
+    全局重试预算，避免上游故障时所有请求同时重试而成倍放大请求量
+    """
+    bucket: Optional[TokenBucket] = None
+
+    @classmethod
+    def try_acquire(cls) -> bool:
+        """
+        尝试消耗一次重试机会
+
+        :return: 是否允许重试
+        """
+        budget = plugin_config.preference.retry_budget
+        if not budget:
+            return True
+        rate, burst = budget
+        if cls.bucket is None or (cls.bucket.rate, cls.bucket.burst) != (rate, max(1, burst)):
+            cls.bucket = TokenBucket(rate, burst)
+        return cls.bucket.try_take()
+
+
 def get_async_retry(retry: bool):
     """
     获取异步重试装饰器
 
-    :param retry: True - 重试次数达到偏好设置中 max_retry_times 时停止; False - 执行次数达到1时停止，即不进行重试
-    """
+    只在网络传输错误或服务器返回 5xx / 429 时重试，其他异常会立即停止并以 ``tenacity.RetryError`` 抛出。
+    重试等待时间按指数退避并完全随机抖动（Full Jitter），服务器返回 ``Retry-After`` 时至少等待该时间。
+    重试次数和等待时间按 ``Preference.retry_policies`` 中对应接口的策略决定，并受全局重试预算 ``Preference.retry_budget`` 限制。
+
+    :param retry: True - 按重试策略重试; False - 执行次数达到1时停止，即不进行重试
+    """
+
+    def stop(retry_state: tenacity.RetryCallState) -> bool:
+        exception = retry_state.outcome.exception()
+        if not retry or not is_upstream_failure(exception):
+            return True
+        max_retry_times = get_retry_policy(exception).max_retry_times
+        if max_retry_times is not None and retry_state.attempt_number > max_retry_times:
+            return True
+        if not RetryBudget.try_acquire():
+            logger.warning(f"{plugin_config.preference.log_head}网络请求重试预算已用尽，不再重试")
+            return True
+        return False
+
+    def wait(retry_state: tenacity.RetryCallState) -> float:
+        exception = retry_state.outcome.exception()
+        policy = get_retry_policy(exception)
+        delay = random.uniform(0, min(policy.backoff_cap, policy.backoff_base * 2 ** (retry_state.attempt_number - 1)))
+        if (retry_after := get_retry_after(exception)) is not None:
+            delay = max(delay, min(retry_after, policy.backoff_cap))
+        return delay
+
     return tenacity.AsyncRetrying(
-        stop=custom_attempt_times(retry),
-        retry=tenacity.retry_if_exception_type(BaseException),
-        wait=tenacity.wait_fixed(plugin_config.preference.retry_interval),
+        stop=stop,
+        retry=tenacity.retry_if_exception_type(Exception),
+        wait=wait,
     )
 
 
@@ -263,7 +372,7 @@ async def get_validate(user: UserData, gt: str = None, challenge: str = None, re
     try:
         async for attempt in get_async_retry(retry):
             with attempt:
-                async with httpx.AsyncClient() as client:
+                async with HttpClientManager.client(geetest_url) as client:
                     res = await client.post(
                         geetest_url,
                         params=params,
@@ -299,7 +408,11 @@ def generate_fp_locally(length: int = 13):
     return ''.join(random.choices(characters, k=length))
 
 
-async def get_file(url: str, retry: bool = True):
+file_downloads: RequestCache[Tuple[str, bool], Optional[bytes]] = RequestCache("文件下载", lambda: 0)
+"""进行中的文件下载，同一 URL 同时只会下载一次（结果由 ``FileCache`` 缓存，因此这里不缓存）"""
+
+
+async def _download_file(url: str, retry: bool) -> Optional[bytes]:
     """
     下载文件
 
@@ -310,14 +423,32 @@ async def get_file(url: str, retry: bool = True):
     try:
         async for attempt in get_async_retry(retry):
             with attempt:
-                async with httpx.AsyncClient() as client:
+                async with HttpClientManager.client(url) as client:
                     res = await client.get(url, timeout=plugin_config.preference.timeout, follow_redirects=True)
+                    res.raise_for_status()
                 return res.content
     except tenacity.RetryError:
         logger.exception(f"{plugin_config.preference.log_head}下载文件 - {url} 失败")
         return None
 
 
+async def get_file(url: str, retry: bool = True, cache: bool = True):
+    """
+    下载文件，优先使用缓存（见 ``FileCache``），同一 URL 的并发下载会合并为一次
+
+    :param url: 文件URL
+    :param retry: 是否允许重试
+    :param cache: 是否使用缓存（较大且只需下载一次的文件可不缓存）
+    :return: 文件数据，若下载失败则返回 ``None``
+    """
+    if cache and (content := FileCache.get(url)) is not None:
+        return content
+    content = await file_downloads.get((url, retry), lambda: _download_file(url, retry))
+    if cache and content is not None:
+        FileCache.put(url, content)
+    return content
+
+
 def blur_phone(phone: Union[str, int]) -> str:
     """
     模糊手机号
@@ -348,6 +479,64 @@ def generate_qr_img(data: str):
     return image_bytes.getvalue()
 
 
+def resolve_bots(use: Union[Bot, Adapter] = None) -> List[Bot]:
+    """
+    获取发送消息可使用的 Bot 对象
+
+    :param use: 使用的Bot或Adapter，为None则使用所有Bot
+    """
+    if isinstance(use, (OneBotV11Bot, QQGuildBot)):
+        return [use]
+    elif isinstance(use, (OneBotV11Adapter, QQGuildAdapter)):
+        return list(use.bots.values())
+    else:
+        return list(nonebot.get_bots().values())
+
+
+def get_private_target(bot: Bot, user_id: str, guild_id: int = None) -> Optional[PlatformTarget]:
+    """
+    获取私信消息的发送目标
+
+    :param bot: 使用的Bot
+    :param user_id: 目标用户ID
+    :param guild_id: 用户所在频道ID，为None则从用户数据中获取
+    :return: 发送目标，无法获取频道ID时返回 ``None``
+    """
+    user_id_int = int(user_id)
+    if isinstance(bot, OneBotV11Bot):
+        logger.info(
+            f"{plugin_config.preference.log_head}向用户 {user_id} 发送 QQ 聊天私信 user_id: {user_id_int}")
+        return TargetQQPrivate(user_id=user_id_int)
+    if guild_id is None:
+        if user := PluginDataManager.plugin_data.users.get(user_id):
+            if not (guild_id := user.qq_guild.get(user_id)):
+                logger.error(f"{plugin_config.preference.log_head}用户 {user_id} 数据中没有任何频道ID")
+                return None
+        else:
+            logger.error(
+                f"{plugin_config.preference.log_head}用户数据中不存在用户 {user_id}，无法获取频道ID")
+            return None
+    logger.info(f"{plugin_config.preference.log_head}向用户 {user_id} 发送 QQ 频道私信"
+                f" recipient_id: {user_id_int}, source_guild_id: {guild_id}")
+    return TargetQQGuildDirect(recipient_id=user_id_int, source_guild_id=guild_id)
+
+
+def get_group_target(bot: Bot, group_id: str) -> Optional[PlatformTarget]:
+    """
+    获取QQ群消息的发送目标，暂不考虑 QQ 群以外的情况
+
+    :param bot: 使用的Bot
+    :param group_id: QQ群ID
+    :return: 发送目标，Bot 不支持时返回 ``None``
+    """
+    group_id_int = int(group_id)
+    if isinstance(bot, OneBotV11Bot):
+        logger.info(
+            f"{plugin_config.preference.log_head}向群 {group_id} 发送 QQ 群消息 group_id: {group_id_int}")
+        return TargetQQGroup(group_id=group_id_int)
+    return None
+
+
 async def send_private_msg(
         user_id: str,
         message: Union[str, MessageSegmentFactory, AggregatedMessageFactory],
@@ -355,7 +544,7 @@ async def send_private_msg(
         guild_id: int = None
 ) -> Tuple[bool, Optional[Exception]]:
     """
-    主动发送私信消息
+    主动发送私信消息（等待发送完成，不需要发送结果时可使用 ``push_private_msg`` 加入发送队列）
 
     :param user_id: 目标用户ID
     :param message: 消息内容
@@ -363,39 +552,14 @@ async def send_private_msg(
     :param guild_id: 用户所在频道ID，为None则从用户数据中获取
     :return: (是否发送成功, ActionFailed Exception)
     """
-    user_id_int = int(user_id)
     if isinstance(message, str):
         message = Text(message)
 
-    # 整合符合条件的 Bot 对象
-    if isinstance(use, (OneBotV11Bot, QQGuildBot)):
-        bots = [use]
-    elif isinstance(use, (OneBotV11Adapter, QQGuildAdapter)):
-        bots = use.bots.values()
-    else:
-        bots = nonebot.get_bots().values()
-
-    for bot in bots:
+    for bot in resolve_bots(use):
         try:
             # 获取 PlatformTarget 对象
-            if isinstance(bot, OneBotV11Bot):
-                target = TargetQQPrivate(user_id=user_id_int)
-                logger.info(
-                    f"{plugin_config.preference.log_head}向用户 {user_id} 发送 QQ 聊天私信 user_id: {user_id_int}")
-            else:
-                if guild_id is None:
-                    if user := PluginDataManager.plugin_data.users.get(user_id):
-                        if not (guild_id := user.qq_guild.get(user_id)):
-                            logger.error(f"{plugin_config.preference.log_head}用户 {user_id} 数据中没有任何频道ID")
-                            return False, None
-                    else:
-                        logger.error(
-                            f"{plugin_config.preference.log_head}用户数据中不存在用户 {user_id}，无法获取频道ID")
-                        return False, None
-                target = TargetQQGuildDirect(recipient_id=user_id_int, source_guild_id=guild_id)
-                logger.info(f"{plugin_config.preference.log_head}向用户 {user_id} 发送 QQ 频道私信"
-                            f" recipient_id: {user_id_int}, source_guild_id: {guild_id}")
-
+            if (target := get_private_target(bot, user_id, guild_id)) is None:
+                return False, None
             await message.send_to(target=target, bot=bot)
         except Exception as e:
             return False, e
@@ -410,7 +574,7 @@ async def send_group_msg(
         guild_id: int = None
 ) -> Tuple[bool, Optional[Exception]]:
     """
-    主动发送QQ群消息
+    主动发送QQ群消息（等待发送完成，不需要发送结果时可使用 ``push_group_msg`` 加入发送队列）
 
     :param group_id: QQ群ID
     :param message: 消息内容
@@ -418,26 +582,13 @@ async def send_group_msg(
     :param guild_id: 用户所在频道ID，为None则从用户数据中获取
     :return: (是否发送成功, ActionFailed Exception)
     """
-    group_id_int = int(group_id)
     if isinstance(message, str):
         message = Text(message)
 
-    # 整合符合条件的 Bot 对象
-    if isinstance(use, (OneBotV11Bot, QQGuildBot)):
-        bots = [use]
-    elif isinstance(use, (OneBotV11Adapter, QQGuildAdapter)):
-        bots = use.bots.values()
-    else:
-        bots = nonebot.get_bots().values()
-
-    for bot in bots:
+    for bot in resolve_bots(use):
         try:
             # 获取 PlatformTarget 对象, 暂不考虑其他情况
-            if isinstance(bot, OneBotV11Bot):
-                target = TargetQQGroup(group_id=group_id_int)
-                logger.info(
-                    f"{plugin_config.preference.log_head}向群 {group_id} 发送 QQ 群消息 group_id: {group_id_int}")
-
+            target = get_group_target(bot, group_id)
             await message.send_to(target=target, bot=bot)
         except Exception as e:
             return False, e
@@ -460,10 +611,9 @@ def get_unique_users() -> Iterable[Tuple[str, UserData]]:
     """
     获取 不包含绑定用户数据 的所有用户数据以及对应的ID，即不会出现值重复项
 
-    :return: dict_items[用户ID, 用户数据]
+    :return: [(用户ID, 用户数据)]
     """
-    return filter(lambda x: x[0] not in PluginDataManager.plugin_data.user_bind,
-                  PluginDataManager.plugin_data.users.items())
+    return list(PluginDataManager.plugin_data.get_unique_users())
 
 
 def get_all_bind(user_id: str) -> Iterable[str]:
@@ -472,9 +622,7 @@ def get_all_bind(user_id: str) -> Iterable[str]:
 
     :return: 绑定该用户的所有用户ID
     """
-    user_id_filter = filter(lambda x: PluginDataManager.plugin_data.user_bind.get(x) == user_id,
-                            PluginDataManager.plugin_data.user_bind)
-    return user_id_filter
+    return set(PluginDataManager.plugin_data.get_all_bind(user_id))
 
 
 def _read_user_list(path: Path) -> List[str]:
@@ -550,7 +698,7 @@ async def get_local_images(image_urls:list[str], save_dir:Path):
             local_links.append(local_path)
         else:
             try:
-                async with httpx.AsyncClient() as client:
+                async with HttpClientManager.client(url) as client:
                     res = await client.get(url)
 
                 with open(local_path, 'wb') as f:
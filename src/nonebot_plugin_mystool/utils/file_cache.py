@@ -0,0 +1,133 @@
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from nonebot.log import logger
+
+from ..model import data_path, plugin_config
+
+__all__ = ["FILE_CACHE_PATH", "FileCache"]
+
+FILE_CACHE_PATH = data_path / "file_cache"
+"""下载文件磁盘缓存目录"""
+
+
+class FileCache:
+    """
+    下载文件缓存（用于 ``get_file``）
+
+    分为两级：按总字节数限制大小的内存 LRU 缓存，以及按有效期和总大小淘汰的磁盘缓存。
+    """
+    memory: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+    """URL -> (写入时间戳, 文件数据)，最近使用的在末尾"""
+    memory_size: int = 0
+    """内存缓存的总字节数"""
+
+    @staticmethod
+    def _path(url: str) -> str:
+        """
+        获取 URL 对应的磁盘缓存文件路径
+        """
+        return str(FILE_CACHE_PATH / hashlib.sha256(url.encode()).hexdigest())
+
+    @classmethod
+    def _remember(cls, url: str, content: bytes, saved_at: float):
+        """
+        写入内存缓存，超出 ``Preference.file_cache_memory_size`` 时淘汰最久未使用的文件（单个文件超过上限的 1/4 时不缓存）
+        """
+        limit = plugin_config.preference.file_cache_memory_size
+        if len(content) > limit // 4:
+            return
+        if (old := cls.memory.pop(url, None)) is not None:
+            cls.memory_size -= len(old[1])
+        cls.memory[url] = saved_at, content
+        cls.memory_size += len(content)
+        while cls.memory_size > limit and cls.memory:
+            _, (_, evicted) = cls.memory.popitem(last=False)
+            cls.memory_size -= len(evicted)
+
+    @classmethod
+    def get(cls, url: str) -> Optional[bytes]:
+        """
+        读取缓存，内存中没有时读取未过期的磁盘缓存，没有则返回 ``None``
+
+        :param url: 文件URL
+        """
+        ttl = plugin_config.preference.file_cache_ttl
+        if (entry := cls.memory.get(url)) is not None:
+            saved_at, content = entry
+            if time.time() - saved_at <= ttl:
+                cls.memory.move_to_end(url)
+                return content
+            del cls.memory[url]
+            cls.memory_size -= len(content)
+        path = cls._path(url)
+        try:
+            if time.time() - (saved_at := os.path.getmtime(path)) > ttl:
+                return None
+            with open(path, "rb") as f:
+                content = f.read()
+        except OSError:
+            return None
+        cls._remember(url, content, saved_at)
+        return content
+
+    @classmethod
+    def put(cls, url: str, content: bytes):
+        """
+        写入内存缓存，并在后台线程中写入磁盘缓存（见 ``save``），缓存有效期为0时不缓存
+
+        :param url: 文件URL
+        :param content: 文件数据
+        """
+        if plugin_config.preference.file_cache_ttl <= 0:
+            return
+        cls._remember(url, content, time.time())
+        asyncio.get_running_loop().run_in_executor(None, cls.save, url, content)
+
+    @classmethod
+    def save(cls, url: str, content: bytes):
+        """
+        写入磁盘缓存，并淘汰过期的文件；总大小超出 ``Preference.file_cache_disk_size`` 时淘汰最早写入的文件。
+        会进行文件读写，应在线程中调用。
+
+        :param url: 文件URL
+        :param content: 文件数据
+        """
+        path = cls._path(url)
+        try:
+            FILE_CACHE_PATH.mkdir(parents=True, exist_ok=True)
+            temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temp_path, "wb") as f:
+                f.write(content)
+            os.replace(temp_path, path)
+            cls.evict()
+        except OSError:
+            logger.exception(f"{plugin_config.preference.log_head}写入文件缓存 {path} 失败")
+
+    @classmethod
+    def evict(cls):
+        """
+        淘汰磁盘缓存中过期的文件，总大小超出限制时再按写入时间从早到晚淘汰
+        """
+        preference = plugin_config.preference
+        now = time.time()
+        entries = []
+        for entry in os.scandir(FILE_CACHE_PATH):
+            if not entry.is_file() or entry.name.endswith(".tmp"):
+                continue
+            stat = entry.stat()
+            if now - stat.st_mtime > preference.file_cache_ttl:
+                os.remove(entry.path)
+            else:
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= preference.file_cache_disk_size:
+                break
+            os.remove(path)
+            total -= size
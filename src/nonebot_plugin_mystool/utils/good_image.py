@@ -1,127 +1,379 @@
-import io
+import asyncio
+import hashlib
+import json
 import os
+import sys
+import time
 import zipfile
-from multiprocessing import Lock
-from typing import List, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import List, Tuple, Optional, Dict
 
-import httpx
-from PIL import Image, ImageDraw, ImageFont
+import nonebot
 
 from ..api.common import get_good_detail
 from ..model import Good, data_path, plugin_config
 from ..utils.common import get_file, logger, get_async_retry
+from ..utils.http_client import HttpClientManager
 
-__all__ = ["game_list_to_image"]
+STANDALONE_PATH = str(Path(__file__).parent.parent / "standalone")
+"""不依赖 NoneBot 和插件包的独立模块所在目录，加入 ``sys.path`` 后渲染进程可以直接以顶层模块导入"""
+if STANDALONE_PATH not in sys.path:
+    sys.path.append(STANDALONE_PATH)
+
+from mystool_render import (RenderOptions, load_font, GoodListRenderer, get_renderer,  # noqa: E402
+                            render_good_list, init_render_worker)
+
+__all__ = ["ICON_CACHE_PATH", "IconCache", "good_list_fingerprint", "prepare_font", "load_font", "IMAGE_SUFFIXES",
+           "RenderOptions", "get_render_options", "GoodListRenderer", "get_renderer", "render_good_list",
+           "ImageRenderPool", "game_list_to_image"]
 
 FONT_URL = os.path.join(
     plugin_config.preference.github_proxy,
     "https://github.com/adobe-fonts/source-han-sans/releases/download/2.004R/SourceHanSansHWSC.zip")
 TEMP_FONT_PATH = data_path / "temp" / "font.zip"
 FONT_SAVE_PATH = data_path / "SourceHanSansHWSC-Regular.otf"
+ICON_CACHE_PATH = data_path / "icon_cache"
+"""商品预览图缓存目录"""
+
+
+class IconCache:
+    """
+    商品预览图磁盘缓存
+
+    以 URL 的摘要作为文件名保存图片，并记录响应的 ``ETag`` 和 ``Last-Modified``，
+    再次获取时发送条件请求，服务器返回 304 时直接使用缓存，无需重新下载。
+    超过 ``Preference.icon_cache_ttl`` 未被使用的预览图会被删除，总大小超出 ``Preference.icon_cache_disk_size`` 时
+    按最近使用时间从早到晚删除。
+    """
+    EVICT_INTERVAL = 600
+    """两次淘汰检查的最短间隔（单位：秒）"""
+    last_evicted: float = 0
+    """上次淘汰检查的时间戳"""
+
+    @staticmethod
+    def _paths(url: str) -> Tuple[str, str]:
+        """
+        获取 URL 对应的图片文件和元数据文件路径
+        """
+        digest = hashlib.sha256(url.encode()).hexdigest()
+        return str(ICON_CACHE_PATH / f"{digest}.bin"), str(ICON_CACHE_PATH / f"{digest}.json")
+
+    @staticmethod
+    def _write(path: str, data: bytes):
+        """
+        先写入临时文件再替换，避免多个进程同时写入同一缓存文件时读到不完整的数据
+        """
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, url: str) -> Tuple[Optional[bytes], Dict[str, str]]:
+        """
+        读取缓存，会进行文件读写，应在线程中调用
+
+        :param url: 图片 URL
+        :return: (图片数据, 元数据)，没有缓存时图片数据为 ``None``
+        """
+        content_path, meta_path = cls._paths(url)
+        try:
+            with open(content_path, "rb") as f:
+                content = f.read()
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None, {}
+        try:
+            # 以图片文件的修改时间记录最近使用时间
+            os.utime(content_path)
+        except OSError:
+            pass
+        return content, meta
+
+    @classmethod
+    def save(cls, url: str, content: bytes, meta: Dict[str, str]):
+        """
+        写入缓存，会进行文件读写，应在线程中调用
+
+        :param url: 图片 URL
+        :param content: 图片数据
+        :param meta: 元数据（``etag`` 和 ``last_modified``）
+        """
+        content_path, meta_path = cls._paths(url)
+        try:
+            ICON_CACHE_PATH.mkdir(parents=True, exist_ok=True)
+            cls._write(content_path, content)
+            cls._write(meta_path, json.dumps(meta).encode())
+        except OSError:
+            logger.exception(f"{plugin_config.preference.log_head}商品列表图片生成 - 无法写入商品预览图缓存 {url}")
+
+    @classmethod
+    def evict(cls):
+        """
+        删除超过有效期未被使用的预览图，总大小超出限制时再按最近使用时间从早到晚删除。
+        会进行文件读写，应在线程中调用。
+        """
+        preference = plugin_config.preference
+        now = time.time()
+        entries = []
+        try:
+            for entry in os.scandir(ICON_CACHE_PATH):
+                if not entry.is_file() or not entry.name.endswith(".bin"):
+                    continue
+                stat = entry.stat()
+                meta_path = f"{entry.path[:-len('.bin')]}.json"
+                if now - stat.st_mtime > preference.icon_cache_ttl:
+                    cls._remove(entry.path, meta_path)
+                else:
+                    entries.append((stat.st_mtime, stat.st_size, entry.path, meta_path))
+            total = sum(size for _, size, _, _ in entries)
+            for _, size, content_path, meta_path in sorted(entries):
+                if total <= preference.icon_cache_disk_size:
+                    break
+                cls._remove(content_path, meta_path)
+                total -= size
+        except OSError:
+            logger.exception(f"{plugin_config.preference.log_head}商品列表图片生成 - 清理商品预览图缓存失败")
+
+    @staticmethod
+    def _remove(*paths: str):
+        """
+        删除缓存文件，文件已不存在时忽略
+        """
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    @classmethod
+    async def get(cls, url: str, retry: bool = True) -> bytes:
+        """
+        获取图片数据，有缓存时向服务器确认缓存是否仍然有效
+
+        :param url: 图片 URL
+        :param retry: 是否允许重试
+        :raise tenacity.RetryError: 下载失败且没有缓存
+        """
+        loop = asyncio.get_running_loop()
+        cached, meta = await loop.run_in_executor(None, cls.load, url)
+        headers = {}
+        if cached is not None:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+        try:
+            async for attempt in get_async_retry(retry):
+                with attempt:
+                    async with HttpClientManager.client(url) as client:
+                        res = await client.get(url, headers=headers, timeout=plugin_config.preference.timeout,
+                                               follow_redirects=True)
+                    if res.status_code != 304:
+                        res.raise_for_status()
+        except Exception:
+            if cached is None:
+                raise
+            logger.warning(f"{plugin_config.preference.log_head}商品列表图片生成 - 无法确认商品预览图缓存是否有效，"
+                           f"将使用缓存 {url}")
+            return cached
+        if res.status_code == 304 and cached is not None:
+            return cached
+        await loop.run_in_executor(None, cls.save, url, res.content, {
+            "etag": res.headers.get("ETag", ""),
+            "last_modified": res.headers.get("Last-Modified", "")
+        })
+        if time.time() - cls.last_evicted >= cls.EVICT_INTERVAL:
+            cls.last_evicted = time.time()
+            loop.run_in_executor(None, cls.evict)
+        return res.content
+
+
+def good_list_fingerprint(good_list: List[Good]) -> str:
+    """
+    计算商品列表中会显示在图片上的内容（商品ID、名称、价格、兑换时间）以及图片样式设置的摘要，摘要不变则无需重新生成图片
+
+    :param good_list: 商品列表数据
+    """
+    content = [(good.goods_id, good.general_name, good.price, good.time) for good in good_list]
+    style = plugin_config.good_list_image_config.json(exclude={"FONT_PATH", "SAVE_PATH", "MULTI_PROCESS",
+                                                                "RENDER_PROCESSES", "ICON_CONCURRENCY"})
+    return hashlib.sha256(json.dumps([content, style], ensure_ascii=False).encode()).hexdigest()
+
+
+def _extract_font(content: bytes):
+    """
+    保存下载的字体压缩包并解压出字体文件，会进行文件读写，应在线程中调用
+
+    :param content: 字体压缩包数据
+    """
+    os.makedirs(os.path.dirname(TEMP_FONT_PATH), exist_ok=True)
+    with open(TEMP_FONT_PATH, "wb") as f:
+        f.write(content)
+    with open(TEMP_FONT_PATH, "rb") as f:
+        with zipfile.ZipFile(f) as z:
+            with z.open("OTF/SimplifiedChineseHW/SourceHanSansHWSC-Regular.otf") as zip_font:
+                with open(FONT_SAVE_PATH, "wb") as fp_font:
+                    fp_font.write(zip_font.read())
+    try:
+        os.remove(TEMP_FONT_PATH)
+    except Exception:
+        logger.exception(
+            f"{plugin_config.preference.log_head}商品列表图片生成 - 无法清理下载的字体压缩包临时文件")
+
 
+_font_lock: Optional[asyncio.Lock] = None
+"""防止同时下载字体"""
 
-async def game_list_to_image(good_list: List[Good], lock: Lock = None, retry: bool = True):
+
+async def prepare_font() -> Optional[str]:
+    """
+    获取字体文件路径，缺少字体时自动下载（同一时间只会下载一次）
+
+    :return: 字体文件路径，下载失败则返回 ``None``
+    """
+    global _font_lock
+    if _font_lock is None:
+        _font_lock = asyncio.Lock()
+    async with _font_lock:
+        font_path = plugin_config.good_list_image_config.FONT_PATH
+        if font_path is not None and os.path.isfile(font_path):
+            return str(font_path)
+        if os.path.isfile(FONT_SAVE_PATH):
+            return str(FONT_SAVE_PATH)
+        logger.warning(
+            f"{plugin_config.preference.log_head}商品列表图片生成 - 缺少字体，正在从 "
+            "https://github.com/adobe-fonts/source-han-sans/tree/release "
+            f"下载字体...")
+        content = await get_file(FONT_URL, cache=False)
+        if content is None:
+            logger.error(
+                f"{plugin_config.preference.log_head}商品列表图片生成 - 字体下载失败，无法继续生成图片")
+            return None
+        await asyncio.get_running_loop().run_in_executor(None, _extract_font, content)
+        logger.info(
+            f"{plugin_config.preference.log_head}商品列表图片生成 - 已完成字体下载 -> {FONT_SAVE_PATH}")
+        return str(FONT_SAVE_PATH)
+
+
+IMAGE_SUFFIXES = {"JPEG": "jpg", "WEBP": "webp", "PNG": "png"}
+"""图片格式 -> 文件扩展名"""
+
+
+def get_render_options(font_path: str) -> RenderOptions:
+    """
+    根据 ``GoodListImageConfig`` 生成商品列表图片绘制参数
+
+    :param font_path: 字体文件路径或字体名称
+    """
+    image_config = plugin_config.good_list_image_config
+    return RenderOptions(
+        font_path=font_path,
+        font_size=image_config.FONT_SIZE,
+        encoding=plugin_config.preference.encoding,
+        width=image_config.WIDTH,
+        icon_size=tuple(image_config.ICON_SIZE),
+        row_height=image_config.ICON_SIZE[1] + image_config.PADDING_ICON,
+        text_offset=(image_config.ICON_SIZE[0] + image_config.PADDING_TEXT_AND_ICON_X,
+                     image_config.PADDING_TEXT_AND_ICON_Y),
+        image_format=image_config.IMAGE_FORMAT,
+        image_quality=image_config.IMAGE_QUALITY
+    )
+
+
+class ImageRenderPool:
+    """
+    商品列表图片渲染进程池
+
+    首次使用时才启动，之后一直保留到机器人关闭，避免每次生成图片都重新创建进程。
+    渲染进程只接收绘制参数、商品文字和预览图数据，不进行网络请求。
+    绘制函数位于独立模块 ``mystool_render`` 中，渲染进程导入时不会加载 NoneBot 和插件本身。
+    """
+    executor: Optional[ProcessPoolExecutor] = None
+    """进程池"""
+    options: Optional[RenderOptions] = None
+    """进程池中已加载的绘制参数"""
+
+    @classmethod
+    def get_executor(cls, options: RenderOptions) -> ProcessPoolExecutor:
+        """
+        获取进程池，不存在或绘制参数发生变化时重新创建
+
+        :param options: 绘制参数
+        """
+        if cls.executor is None or cls.options != options:
+            cls.shutdown()
+            cls.executor = ProcessPoolExecutor(
+                max_workers=plugin_config.good_list_image_config.RENDER_PROCESSES,
+                initializer=init_render_worker,
+                initargs=(options,)
+            )
+            cls.options = options
+        return cls.executor
+
+    @classmethod
+    async def render(cls, options: RenderOptions, rows: List[Tuple[str, bytes]]) -> bytes:
+        """
+        在进程池中绘制商品列表图片，进程池不可用时改为在线程中绘制
+
+        :param options: 绘制参数
+        :param rows: (商品文字, 商品预览图数据) 列表
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(cls.get_executor(options), render_good_list, options, rows)
+        except BrokenProcessPool:
+            # 渲染进程意外退出，下次使用时重新创建进程池
+            cls.shutdown()
+            logger.warning(f"{plugin_config.preference.log_head}商品列表图片生成 - 渲染进程池不可用，将在线程中绘制图片")
+            return await loop.run_in_executor(None, render_good_list, options, rows)
+
+    @classmethod
+    def shutdown(cls):
+        """
+        关闭进程池
+        """
+        if cls.executor is not None:
+            cls.executor.shutdown(wait=False)
+            cls.executor = None
+            cls.options = None
+
+
+async def game_list_to_image(good_list: List[Good], retry: bool = True):
     """
     将商品信息列表转换为图片数据，若返回`None`说明生成失败
 
+    网络请求在当前事件循环中完成，图片绘制在渲染进程池（``GoodListImageConfig.MULTI_PROCESS``）或线程中完成，不会阻塞事件循环。
+
     :param good_list: 商品列表数据
-    :param lock: 进程同步锁，防止多进程同时在下载字体
     :param retry: 是否允许重试
     """
-    # TODO: 暂时会阻塞，目前还找不到更好的解决方案
-    #   回调函数是否适用于 NoneBot Matcher 暂不清楚，
-    #   若适用则可以传入回调函数而不阻塞主进程
     try:
-        if lock is not None:
-            lock.acquire()
+        font_path = await prepare_font()
+        if font_path is None:
+            return None
 
-        font_path = plugin_config.good_list_image_config.FONT_PATH
-        if font_path is None or not os.path.isfile(font_path):
-            if os.path.isfile(FONT_SAVE_PATH):
-                font_path = FONT_SAVE_PATH
-            else:
-                logger.warning(
-                    f"{plugin_config.preference.log_head}商品列表图片生成 - 缺少字体，正在从 "
-                    "https://github.com/adobe-fonts/source-han-sans/tree/release "
-                    f"下载字体...")
-                try:
-                    os.makedirs(os.path.dirname(TEMP_FONT_PATH))
-                except FileExistsError:
-                    pass
-                with open(TEMP_FONT_PATH, "wb") as f:
-                    content = await get_file(FONT_URL)
-                    if content is None:
-                        logger.error(
-                            f"{plugin_config.preference.log_head}商品列表图片生成 - 字体下载失败，无法继续生成图片")
-                        return None
-                    f.write(content)
-                with open(TEMP_FONT_PATH, "rb") as f:
-                    with zipfile.ZipFile(f) as z:
-                        with z.open("OTF/SimplifiedChineseHW/SourceHanSansHWSC-Regular.otf") as zip_font:
-                            with open(FONT_SAVE_PATH, "wb") as fp_font:
-                                fp_font.write(zip_font.read())
-                logger.info(
-                    f"{plugin_config.preference.log_head}商品列表图片生成 - 已完成字体下载 -> {FONT_SAVE_PATH}")
-                try:
-                    os.remove(TEMP_FONT_PATH)
-                except Exception:
-                    logger.exception(
-                        f"{plugin_config.preference.log_head}商品列表图片生成 - 无法清理下载的字体压缩包临时文件")
-                font_path = FONT_SAVE_PATH
-
-        if lock is not None:
-            lock.release()
-
-        font = ImageFont.truetype(
-            str(font_path), plugin_config.good_list_image_config.FONT_SIZE, encoding=plugin_config.preference.encoding)
-
-        size_y = 0
-        '''起始粘贴位置 高'''
-        position: List[Tuple[int, int]] = []
-        '''预览图粘贴的位置'''
-        imgs: List[Image.Image] = []
-        '''商品预览图'''
-
-        for good in good_list:
-            await get_good_detail(good)
-            async for attempt in get_async_retry(retry):
-                with attempt:
-                    async with httpx.AsyncClient() as client:
-                        icon = await client.get(good.icon, timeout=plugin_config.preference.timeout)
-            img = Image.open(io.BytesIO(icon.content))
-            # 调整预览图大小
-            img = img.resize(plugin_config.good_list_image_config.ICON_SIZE)
-            # 记录预览图粘贴位置
-            position.append((0, size_y))
-            # 调整下一个粘贴的位置
-            size_y += plugin_config.good_list_image_config.ICON_SIZE[1] + \
-                      plugin_config.good_list_image_config.PADDING_ICON
-            imgs.append(img)
-
-        preview = Image.new(
-            'RGB', (plugin_config.good_list_image_config.WIDTH, size_y), (255, 255, 255))
-
-        i = 0
-        for img in imgs:
-            preview.paste(img, position[i])
-            i += 1
-
-        draw_y = plugin_config.good_list_image_config.PADDING_TEXT_AND_ICON_Y
-        '''写入文字的起始位置 高'''
-        for good in good_list:
-            draw = ImageDraw.Draw(preview)
-            # 根据预览图高度来确定写入文字的位置，并调整空间
-            draw.text((plugin_config.good_list_image_config.ICON_SIZE[
-                           0] + plugin_config.good_list_image_config.PADDING_TEXT_AND_ICON_X,
-                       draw_y),
-                      f"{good.general_name}\n商品ID: {good.goods_id}\n兑换时间: {good.time_text}\n价格: {good.price} 米游币",
-                      (0, 0, 0), font)
-            draw_y += (plugin_config.good_list_image_config.ICON_SIZE[1] +
-                       plugin_config.good_list_image_config.PADDING_ICON)
-
-        # 导出
-        image_bytes = io.BytesIO()
-        preview.save(image_bytes, format="JPEG")
-        return image_bytes.getvalue()
+        semaphore = asyncio.Semaphore(max(1, plugin_config.good_list_image_config.ICON_CONCURRENCY))
+
+        async def fetch_row(good: Good) -> Tuple[str, bytes]:
+            async with semaphore:
+                await get_good_detail(good)
+                icon = await IconCache.get(good.icon, retry)
+            text = f"{good.general_name}\n商品ID: {good.goods_id}\n兑换时间: {good.time_text}\n价格: {good.price} 米游币"
+            return text, icon
+
+        rows = await asyncio.gather(*map(fetch_row, good_list))
+
+        options = get_render_options(font_path)
+        if plugin_config.good_list_image_config.MULTI_PROCESS:
+            return await ImageRenderPool.render(options, rows)
+        else:
+            return await asyncio.get_running_loop().run_in_executor(None, render_good_list, options, rows)
     except Exception:
         logger.exception(f"{plugin_config.preference.log_head}商品列表图片生成 - 无法完成图片生成")
+
+
+nonebot.get_driver().on_shutdown(ImageRenderPool.shutdown)
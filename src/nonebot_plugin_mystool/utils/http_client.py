@@ -0,0 +1,210 @@
+import asyncio
+from contextlib import asynccontextmanager
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+from typing import Dict, Optional, AsyncIterator
+from urllib.parse import urlsplit
+
+import httpx
+import nonebot
+from nonebot.log import logger
+
+from ..model import plugin_config
+from ..utils.circuit_breaker import CircuitBreaker, is_upstream_failure
+from ..utils.rate_limit import RateLimiter
+
+__all__ = ["KNOWN_HOSTS", "RETRYABLE_STATUS_DOMAINS", "HttpClientManager"]
+
+_driver = nonebot.get_driver()
+
+KNOWN_HOSTS = (
+    "api-takumi.mihoyo.com",
+    "api-takumi.miyoushe.com",
+    "api-takumi-record.mihoyo.com",
+    "bbs-api.mihoyo.com",
+    "bbs-api.miyoushe.com",
+    "passport-api.mihoyo.com",
+    "api.weibo.cn",
+    "m.weibo.cn",
+    "games.weibo.cn",
+)
+"""启动时预先创建连接池的上游主机"""
+
+RETRYABLE_STATUS_DOMAINS = ("mihoyo.com", "miyoushe.com")
+"""这些域名下的主机返回 5xx 或 429 时抛出异常以便重试，其他主机（如微博）由调用方自行处理响应状态码"""
+
+
+class HttpClientManager:
+    """
+    插件全局 HTTP 连接池管理
+
+    每个上游主机对应一个保持活动（Keep-Alive）的 ``httpx.AsyncClient``，避免每次请求都重新进行 TCP 和 TLS 握手。
+    """
+    clients: Dict[str, httpx.AsyncClient] = {}
+    """主机名 -> 共享的 AsyncClient"""
+    loop: Optional[asyncio.AbstractEventLoop] = None
+    """共享连接池所属的事件循环"""
+    semaphores: Dict[str, asyncio.Semaphore] = {}
+    """主机名 -> 限制同时进行中请求数的信号量"""
+
+    @classmethod
+    def _new_client(cls, host: str) -> httpx.AsyncClient:
+        """
+        创建一个新的 AsyncClient
+
+        客户端自身的 Cookie Jar 不保存任何 Cookie，避免不同账户之间通过共享连接池串用 Cookie，
+        每次请求传入的 ``cookies`` 参数以及响应的 ``res.cookies`` 不受影响。
+        主机属于 ``RETRYABLE_STATUS_DOMAINS`` 时，服务器返回 5xx 或 429 会抛出 ``httpx.HTTPStatusError``。
+
+        :param host: 主机名
+        """
+        preference = plugin_config.preference
+        retryable = any(host == domain or host.endswith(f".{domain}") for domain in RETRYABLE_STATUS_DOMAINS)
+        return httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=preference.http_max_connections,
+                max_keepalive_connections=preference.http_max_keepalive_connections,
+                keepalive_expiry=preference.http_keepalive_expiry
+            ),
+            cookies=CookieJar(policy=DefaultCookiePolicy(allowed_domains=[])),
+            event_hooks={"response": [cls._raise_for_retryable_status] if retryable else []}
+        )
+
+    @staticmethod
+    async def _raise_for_retryable_status(response: httpx.Response):
+        """
+        服务器返回 5xx 或 429 时抛出 ``httpx.HTTPStatusError``，使其可以按重试策略重试（见 ``get_async_retry``）
+        """
+        if response.status_code == 429 or response.status_code >= 500:
+            response.raise_for_status()
+
+    @classmethod
+    def get_client(cls, host: str) -> httpx.AsyncClient:
+        """
+        获取某个主机对应的共享 AsyncClient，不存在则创建
+
+        :param host: 主机名
+        """
+        client = cls.clients.get(host)
+        if client is None or client.is_closed:
+            client = cls.clients[host] = cls._new_client(host)
+        return client
+
+    @classmethod
+    def get_semaphore(cls, host: str) -> Optional[asyncio.Semaphore]:
+        """
+        获取某个主机对应的并发请求信号量，未设置并发上限时返回 ``None``
+
+        :param host: 主机名
+        """
+        limit = plugin_config.preference.http_max_concurrency_per_host
+        if not limit:
+            return None
+        semaphore = cls.semaphores.get(host)
+        if semaphore is None:
+            semaphore = cls.semaphores[host] = asyncio.Semaphore(limit)
+        return semaphore
+
+    @classmethod
+    @asynccontextmanager
+    async def client(
+            cls,
+            url: str,
+            limited: bool = True,
+            session: Optional[httpx.AsyncClient] = None
+    ) -> AsyncIterator[httpx.AsyncClient]:
+        """
+        获取用于请求某个 URL 的 AsyncClient，用法与 ``async with httpx.AsyncClient() as client`` 相同，
+        但退出上下文时不会关闭共享的连接池。
+        在上下文内会占用该主机的一个并发请求名额（见 ``Preference.http_max_concurrency_per_host``），
+        进入上下文前会按 ``Preference.rate_limits`` 等待速率限制。
+        接口处于熔断状态时（见 ``CircuitBreaker``）直接抛出 ``CircuitOpenError`` 而不发送请求，
+        上下文内抛出的异常会被记录为该接口的请求结果。
+
+        如果当前不在共享连接池所属的事件循环中（例如在线程或子进程中新建的事件循环），则使用一个临时的 AsyncClient。
+
+        :param url: 请求的 URL（也可以是带有格式化占位符的 URL 模板）
+        :param limited: 是否占用主机并发请求名额、遵守速率限制和熔断（对时间敏感的请求如商品兑换可不遵守）
+        :param session: 使用调用方自己的 AsyncClient 而不是共享连接池（例如需要在多次请求之间保留 Cookie 的登录流程），
+            同样会遵守并发上限、速率限制和熔断，退出上下文时不会关闭
+        """
+        host = urlsplit(url).hostname or ""
+        breaker = CircuitBreaker.get(url) if limited else None
+        if breaker is not None:
+            breaker.before_request()
+        try:
+            if limited:
+                await RateLimiter.acquire(url)
+            try:
+                running_loop = asyncio.get_running_loop()
+            except RuntimeError:
+                running_loop = None
+            if cls.loop is None or running_loop is not cls.loop:
+                if session is not None:
+                    yield session
+                else:
+                    async with cls._new_client(host) as client:
+                        yield client
+            elif not limited or (semaphore := cls.get_semaphore(host)) is None:
+                yield cls.get_client(host) if session is None else session
+            else:
+                async with semaphore:
+                    yield cls.get_client(host) if session is None else session
+        except Exception as e:
+            if breaker is not None:
+                breaker.record(is_upstream_failure(e))
+            raise
+        except BaseException:
+            if breaker is not None:
+                breaker.release()
+            raise
+        else:
+            if breaker is not None:
+                breaker.record(False)
+
+    @classmethod
+    async def warm_up(cls, url: str, count: int = 1):
+        """
+        预先建立到某个主机的多个保持活动连接（例如在商品兑换开始之前），使之后的请求无需再进行握手
+
+        :param url: 请求的 URL
+        :param count: 需要建立的连接数，超出 ``Preference.http_max_keepalive_connections`` 的部分不会保留，因此不会建立
+        """
+        count = min(count, plugin_config.preference.http_max_keepalive_connections)
+
+        async def request():
+            try:
+                async with cls.client(url, limited=False) as client:
+                    await client.head(url, timeout=plugin_config.preference.timeout)
+            except httpx.HTTPError:
+                logger.exception(f"{plugin_config.preference.log_head}预先建立到 {url} 的连接失败")
+
+        await asyncio.gather(*(request() for _ in range(count)))
+
+    @classmethod
+    async def open(cls):
+        """
+        机器人启动时为已知主机创建连接池
+        """
+        cls.loop = asyncio.get_running_loop()
+        for host in KNOWN_HOSTS:
+            cls.get_client(host)
+        logger.info(f"{plugin_config.preference.log_head}已为 {len(KNOWN_HOSTS)} 个上游主机创建 HTTP 连接池")
+
+    @classmethod
+    async def close(cls):
+        """
+        机器人关闭时关闭所有连接池
+        """
+        clients = list(cls.clients.values())
+        cls.clients.clear()
+        cls.semaphores.clear()
+        cls.loop = None
+        for client in clients:
+            try:
+                await client.aclose()
+            except Exception:
+                logger.exception(f"{plugin_config.preference.log_head}关闭 HTTP 连接池时出错")
+
+
+_driver.on_startup(HttpClientManager.open)
+_driver.on_shutdown(HttpClientManager.close)
@@ -0,0 +1,284 @@
+import asyncio
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple, Union, Deque
+
+import nonebot
+from nonebot import Adapter, Bot
+from nonebot.adapters.onebot.v11 import Bot as OneBotV11Bot
+from nonebot.exception import ActionFailed
+from nonebot.log import logger
+from nonebot_plugin_saa import MessageSegmentFactory, MessageFactory, AggregatedMessageFactory, Text
+
+from ..model import plugin_config
+from ..utils.common import resolve_bots, get_private_target, get_group_target
+from ..utils.rate_limit import TokenBucket
+
+__all__ = ["OutboundMessage", "MessageRoute", "MessageQueue", "push_private_msg", "push_group_msg"]
+
+_driver = nonebot.get_driver()
+
+PRIVATE = "private"
+"""私信消息"""
+GROUP = "group"
+"""QQ群消息"""
+
+
+class OutboundMessage:
+    """
+    发送队列中等待发送给同一目标的消息
+    """
+
+    def __init__(self, kind: str, target_id: str, guild_id: Optional[int], fallback_bots: List[Bot]):
+        """
+        :param kind: 消息类型（私信或QQ群消息）
+        :param target_id: 用户ID或QQ群ID
+        :param guild_id: 用户所在频道ID
+        :param fallback_bots: 当前 Bot 发送失败时依次改用的其他 Bot
+        """
+        self.key = kind, target_id, guild_id
+        """(消息类型, 目标ID, 频道ID)"""
+        self.kind = kind
+        self.target_id = target_id
+        self.guild_id = guild_id
+        self.fallback_bots = fallback_bots
+        """当前 Bot 发送失败时依次改用的其他 Bot"""
+        self.messages: List[Union[MessageSegmentFactory, MessageFactory, AggregatedMessageFactory]] = []
+        """等待发送的消息，发送时合并为一条合并转发消息"""
+        self.created = time.monotonic()
+        """第一条消息加入队列的时间"""
+
+    @property
+    def mergeable(self) -> bool:
+        """
+        是否还可以合并更多消息（合并转发消息不能再嵌套）
+        """
+        return not any(isinstance(message, AggregatedMessageFactory) for message in self.messages)
+
+
+class MessageRoute:
+    """
+    某个 Bot 的消息发送队列
+
+    每个 Bot 对应一个后台发送任务，按 ``Preference.message_rate`` 限制发送速率。
+    消息加入队列后会等待 ``Preference.message_merge_window`` 秒，期间发给同一目标的消息会合并为一条合并转发消息。
+    """
+
+    def __init__(self, bot: Bot):
+        """
+        :param bot: 发送消息使用的 Bot
+        """
+        self.bot = bot
+        self.pending: Deque[OutboundMessage] = deque()
+        """等待发送的消息，按加入队列的顺序排列"""
+        self.merging: Dict[Tuple[str, str, Optional[int]], OutboundMessage] = {}
+        """(消息类型, 目标ID, 频道ID) -> 还可以合并新消息的等待发送的消息"""
+        self.bucket = TokenBucket(*plugin_config.preference.message_rate) \
+            if plugin_config.preference.message_rate else None
+        self.wakeup = asyncio.Event()
+        self.worker = asyncio.create_task(self._work())
+
+    def push(self, kind: str, target_id: str, message, guild_id: int = None, fallback_bots: List[Bot] = None):
+        """
+        将消息加入队列
+
+        :param kind: 消息类型（私信或QQ群消息）
+        :param target_id: 用户ID或QQ群ID
+        :param message: 消息内容
+        :param guild_id: 用户所在频道ID
+        :param fallback_bots: 当前 Bot 发送失败时依次改用的其他 Bot
+        """
+        if isinstance(message, str):
+            message = Text(message)
+        key = kind, target_id, guild_id
+        outbound = self.merging.get(key)
+        if outbound is None or not outbound.mergeable or isinstance(message, AggregatedMessageFactory):
+            outbound = self.merging[key] = OutboundMessage(kind, target_id, guild_id, list(fallback_bots or []))
+            self.pending.append(outbound)
+        outbound.messages.append(message)
+        self.wakeup.set()
+
+    def hand_over(self, outbound: OutboundMessage):
+        """
+        接收其他 Bot 发送失败的消息，不再等待合并直接发送
+
+        :param outbound: 等待发送的消息
+        """
+        self.pending.append(outbound)
+        self.wakeup.set()
+
+    async def _work(self):
+        """
+        后台发送任务
+        """
+        while True:
+            if not self.pending:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+                continue
+            outbound = self.pending[0]
+            if (delay := outbound.created + plugin_config.preference.message_merge_window - time.monotonic()) > 0:
+                await asyncio.sleep(delay)
+                continue
+            self.pending.popleft()
+            if self.merging.get(outbound.key) is outbound:
+                del self.merging[outbound.key]
+            try:
+                await self._deliver(outbound)
+            except Exception:
+                logger.exception(f"{plugin_config.preference.log_head}发送队列中的消息发送失败")
+
+    async def _deliver(self, outbound: OutboundMessage):
+        """
+        发送消息，支持合并转发的 Bot 将多条消息合并为一条发送，其余 Bot 逐条发送。
+        无法发送给目标或发送失败时，将尚未发送的消息交给下一个可用的 Bot。
+
+        :param outbound: 等待发送的消息
+        """
+        if outbound.kind == PRIVATE:
+            target = get_private_target(self.bot, outbound.target_id, outbound.guild_id)
+        else:
+            target = get_group_target(self.bot, outbound.target_id)
+        if target is None:
+            MessageQueue.hand_over(outbound)
+            return
+        aggregated = len(outbound.messages) > 1 and isinstance(self.bot, OneBotV11Bot)
+        messages = [AggregatedMessageFactory(outbound.messages)] if aggregated else list(outbound.messages)
+        for index, message in enumerate(messages):
+            try:
+                await self._send(message, target)
+            except Exception:
+                if not outbound.fallback_bots:
+                    raise
+                logger.exception(f"{plugin_config.preference.log_head}Bot {self.bot.self_id} 发送消息失败，改用其他 Bot 发送")
+                if not aggregated:
+                    outbound.messages = outbound.messages[index:]
+                MessageQueue.hand_over(outbound)
+                return
+
+    async def _send(self, message, target):
+        """
+        发送一条消息，平台返回 ActionFailed 时按指数退避重试
+
+        :param message: 消息内容
+        :param target: 发送目标
+        """
+        preference = plugin_config.preference
+        for attempt in range(preference.message_retry_times + 1):
+            if self.bucket is not None:
+                await self.bucket.acquire()
+            try:
+                await message.send_to(target=target, bot=self.bot)
+            except ActionFailed as e:
+                if attempt >= preference.message_retry_times:
+                    raise
+                delay = preference.message_retry_interval * 2 ** attempt
+                logger.warning(f"{preference.log_head}消息发送失败，将在 {delay:.0f} 秒后重试: {e!r}")
+                await asyncio.sleep(delay)
+            else:
+                return
+
+
+class MessageQueue:
+    """
+    主动消息发送队列
+
+    签到、米游币任务、便笺提醒等后台任务的通知消息加入队列后立即返回，由每个 Bot 各自的后台任务按速率限制发送，
+    发送缓慢或被平台限流时不会阻塞业务逻辑。
+    """
+    routes: Dict[str, MessageRoute] = {}
+    """Bot ID -> 发送队列"""
+
+    @classmethod
+    def get_route(cls, bot: Bot) -> MessageRoute:
+        """
+        获取 Bot 对应的发送队列，不存在则创建
+
+        :param bot: 发送消息使用的 Bot
+        """
+        route = cls.routes.get(bot.self_id)
+        if route is None or route.bot is not bot or route.worker.done():
+            route = cls.routes[bot.self_id] = MessageRoute(bot)
+        return route
+
+    @classmethod
+    def push(cls, kind: str, target_id: str, message, use: Union[Bot, Adapter] = None, guild_id: int = None):
+        """
+        将消息加入对应 Bot 的发送队列
+
+        :param kind: 消息类型（私信或QQ群消息）
+        :param target_id: 用户ID或QQ群ID
+        :param message: 消息内容
+        :param use: 使用的Bot或Adapter，为None则使用所有Bot（优先使用第一个，发送失败时依次改用其他Bot）
+        :param guild_id: 用户所在频道ID，为None则从用户数据中获取
+        """
+        bots = resolve_bots(use)
+        if not bots:
+            logger.error(f"{plugin_config.preference.log_head}没有可用的 Bot，无法向 {target_id} 发送消息")
+            return
+        cls.get_route(bots[0]).push(kind, target_id, message, guild_id, bots[1:])
+
+    @classmethod
+    def hand_over(cls, outbound: OutboundMessage):
+        """
+        将消息交给下一个可用的 Bot 的发送队列，没有可用的 Bot 时放弃发送
+
+        :param outbound: 等待发送的消息
+        """
+        connected = nonebot.get_bots()
+        while outbound.fallback_bots:
+            bot = outbound.fallback_bots.pop(0)
+            if connected.get(bot.self_id) is bot:
+                cls.get_route(bot).hand_over(outbound)
+                return
+        logger.error(f"{plugin_config.preference.log_head}没有其他可用的 Bot，无法向 {outbound.target_id} 发送消息")
+
+    @classmethod
+    async def close(cls):
+        """
+        机器人关闭时等待队列中的消息发送完成（最多等待 ``Preference.timeout`` 秒），之后停止所有发送任务
+        """
+        routes = list(cls.routes.values())
+        cls.routes.clear()
+        deadline = time.monotonic() + plugin_config.preference.timeout
+        while any(route.pending for route in routes) and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        if remaining := sum(len(route.pending) for route in routes):
+            logger.warning(f"{plugin_config.preference.log_head}机器人关闭，发送队列中仍有 {remaining} 条消息未发送")
+        for route in routes:
+            route.worker.cancel()
+
+
+def push_private_msg(
+        user_id: str,
+        message: Union[str, MessageSegmentFactory, AggregatedMessageFactory],
+        use: Union[Bot, Adapter] = None,
+        guild_id: int = None
+):
+    """
+    将私信消息加入发送队列，不等待发送完成
+
+    :param user_id: 目标用户ID
+    :param message: 消息内容
+    :param use: 使用的Bot或Adapter，为None则使用所有Bot（优先使用第一个，发送失败时依次改用其他Bot）
+    :param guild_id: 用户所在频道ID，为None则从用户数据中获取
+    """
+    MessageQueue.push(PRIVATE, user_id, message, use, guild_id)
+
+
+def push_group_msg(
+        group_id: str,
+        message: Union[str, MessageSegmentFactory, AggregatedMessageFactory],
+        use: Union[Bot, Adapter] = None
+):
+    """
+    将QQ群消息加入发送队列，不等待发送完成
+
+    :param group_id: QQ群ID
+    :param message: 消息内容
+    :param use: 使用的Bot或Adapter，为None则使用所有Bot（优先使用第一个，发送失败时依次改用其他Bot）
+    """
+    MessageQueue.push(GROUP, group_id, message, use)
+
+
+_driver.on_shutdown(MessageQueue.close)
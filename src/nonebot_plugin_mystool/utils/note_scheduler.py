@@ -0,0 +1,160 @@
+import heapq
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
+
+from ..model import plugin_config, GenshinNote, GenshinNoteNotice, StarRailNote, StarRailNoteNotice
+
+__all__ = ["GENSHIN_NOTE", "STARRAIL_NOTE", "NoteScheduler", "genshin_next_check", "starrail_next_check"]
+
+GENSHIN_NOTE = "genshin"
+"""原神便笺检查的类型名"""
+STARRAIL_NOTE = "starrail"
+"""星穹铁道便笺检查的类型名"""
+
+GENSHIN_MAX_RESIN = 200
+"""原神树脂上限"""
+GENSHIN_RESIN_RECOVERY = 8 * 60
+"""原神每恢复一点树脂所需时间（单位：秒）"""
+STARRAIL_STAMINA_RECOVERY = 6 * 60
+"""星穹铁道每恢复一点开拓力所需时间（单位：秒）"""
+CHECK_SLACK = 60
+"""预计跨过阈值后再额外等待的时间（单位：秒），避免因服务器时间误差而提前检查"""
+
+
+class NoteScheduler:
+    """
+    便笺检查计划
+
+    根据上次获取的便笺数据预测每个账户下次需要检查的时间，保存在按时间排序的堆中，
+    自动便笺检查时只检查已到期的账户。没有计划（例如新绑定的账户、机器人刚启动）的账户视为已到期。
+    """
+    heap: List[Tuple[float, Tuple[str, str]]] = []
+    """(下次检查时间戳, (米游社UID, 便笺类型)) 组成的堆，其中可能包含已被新计划替代的过期记录"""
+    due_times: Dict[Tuple[str, str], float] = {}
+    """(米游社UID, 便笺类型) -> 当前有效的下次检查时间戳"""
+
+    @classmethod
+    def schedule(cls, bbs_uid: str, note_type: str, delay: float):
+        """
+        安排某个账户的下次便笺检查，替代之前的计划
+
+        :param bbs_uid: 米游社UID
+        :param note_type: 便笺类型
+        :param delay: 距离下次检查的时间（单位：秒）
+        """
+        key = bbs_uid, note_type
+        due_time = time.time() + delay
+        cls.due_times[key] = due_time
+        heapq.heappush(cls.heap, (due_time, key))
+
+    @classmethod
+    def release_due(cls) -> int:
+        """
+        移除所有已到期的计划，使对应的账户变为待检查状态
+
+        :return: 到期的计划数
+        """
+        now = time.time()
+        count = 0
+        while cls.heap and cls.heap[0][0] <= now:
+            due_time, key = heapq.heappop(cls.heap)
+            if cls.due_times.get(key) == due_time:
+                del cls.due_times[key]
+                count += 1
+        return count
+
+    @classmethod
+    def is_due(cls, bbs_uid: str, note_type: str) -> bool:
+        """
+        判断某个账户是否需要检查便笺
+
+        :param bbs_uid: 米游社UID
+        :param note_type: 便笺类型
+        """
+        return (bbs_uid, note_type) not in cls.due_times
+
+
+def _clamp_delay(delays: List[float]) -> float:
+    """
+    从多个候选的检查时间中取最早的一个，并限制在 ``resin_interval`` 与 ``note_max_interval`` 之间
+
+    :param delays: 候选的距离下次检查的时间（单位：秒）
+    """
+    preference = plugin_config.preference
+    min_delay = preference.resin_interval * 60
+    if not preference.note_adaptive:
+        return min_delay
+    max_delay = max(min_delay, preference.note_max_interval * 60)
+    return min(max(min(delays, default=max_delay), min_delay), max_delay)
+
+
+def genshin_next_check(note: GenshinNote, notice: GenshinNoteNotice, threshold: int) -> float:
+    """
+    根据原神便笺数据和通知状态，计算距离下次需要检查的时间（单位：秒）
+
+    :param note: 本次获取的便笺数据
+    :param notice: 本次检查后的通知状态
+    :param threshold: 树脂提醒阈值
+    """
+    delays = []
+    if note.current_resin is None or note.resin_recovery_time is None:
+        delays.append(plugin_config.preference.resin_interval * 60)
+    elif note.current_resin < threshold:
+        # 树脂回满时间减去从阈值回满所需的时间，即为达到阈值的时间
+        delays.append(note.resin_recovery_time - (GENSHIN_MAX_RESIN - threshold) * GENSHIN_RESIN_RECOVERY + CHECK_SLACK)
+    elif notice.current_resin or notice.current_resin_full:
+        # 已提醒过：树脂随时可能被消耗到阈值以下再回升，无法预测，按最短间隔检查以免错过下一次提醒
+        delays.append(plugin_config.preference.resin_interval * 60)
+    elif note.current_resin < GENSHIN_MAX_RESIN:
+        delays.append(note.resin_recovery_time + CHECK_SLACK)
+
+    if not notice.current_home_coin and note.home_coin_recovery_time:
+        delays.append(note.home_coin_recovery_time + CHECK_SLACK)
+
+    try:
+        if note.transformer["obtained"] and not note.transformer["recovery_time"]["reached"]:
+            recovery_time = note.transformer["recovery_time"]
+            delays.append(timedelta(
+                days=recovery_time.get("Day", 0),
+                hours=recovery_time.get("Hour", 0),
+                minutes=recovery_time.get("Minute", 0),
+                seconds=recovery_time.get("Second", 0)
+            ).total_seconds() + CHECK_SLACK)
+    except (KeyError, TypeError):
+        pass
+
+    return _clamp_delay(delays)
+
+
+def starrail_next_check(note: StarRailNote, notice: StarRailNoteNotice, threshold: int) -> float:
+    """
+    根据星穹铁道便笺数据和通知状态，计算距离下次需要检查的时间（单位：秒）
+
+    :param note: 本次获取的便笺数据
+    :param notice: 本次检查后的通知状态
+    :param threshold: 开拓力提醒阈值
+    """
+    delays = []
+    if note.current_stamina is None or note.stamina_recover_time is None or note.max_stamina is None:
+        delays.append(plugin_config.preference.resin_interval * 60)
+    elif note.current_stamina < threshold:
+        delays.append(
+            note.stamina_recover_time - (note.max_stamina - threshold) * STARRAIL_STAMINA_RECOVERY + CHECK_SLACK
+        )
+    elif notice.current_stamina or notice.current_stamina_full:
+        # 已提醒过：开拓力随时可能被消耗到阈值以下再回升，按最短间隔检查以免错过下一次提醒
+        delays.append(plugin_config.preference.resin_interval * 60)
+    elif note.current_stamina < note.max_stamina:
+        delays.append(note.stamina_recover_time + CHECK_SLACK)
+
+    # 模拟宇宙积分只在提醒时段内提醒（见 Preference.notice_time），每个提醒时段只安排一次检查
+    if note.current_rogue_score != note.max_rogue_score:
+        now = datetime.now()
+        notice_at = now.replace(hour=20, minute=0, second=0, microsecond=0)
+        if notice_at <= now or plugin_config.preference.notice_time:
+            # 已过提醒时间，或本次检查已在提醒时段内，下次在明天的提醒时间检查
+            notice_at += timedelta(days=1)
+        delays.append((notice_at - now).total_seconds())
+
+    return _clamp_delay(delays)
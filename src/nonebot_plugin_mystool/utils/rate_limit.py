@@ -0,0 +1,116 @@
+import asyncio
+import time
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+from ..model import plugin_config
+
+__all__ = ["TokenBucket", "RateLimiter"]
+
+
+class TokenBucket:
+    """
+    令牌桶
+
+    令牌以 ``rate`` 个/秒的速度补充，最多积累 ``burst`` 个。令牌不足时先预支令牌再等待，
+    因此同时等待的多个请求会按到达顺序依次放行，而不需要加锁。
+    """
+
+    def __init__(self, rate: float, burst: int):
+        """
+        :param rate: 每秒补充的令牌数
+        :param burst: 令牌桶容量（允许的突发请求数）
+        """
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens: float = self.burst
+        """当前令牌数，为负数时表示已被预支"""
+        self.updated = time.monotonic()
+        """上次补充令牌的时间"""
+
+    def reserve(self) -> float:
+        """
+        取出一个令牌
+
+        :return: 需要等待的时间（单位：秒）
+        """
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return 0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def try_take(self) -> bool:
+        """
+        如果有可用的令牌则取出一个，不预支
+
+        :return: 是否取得令牌
+        """
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    async def acquire(self):
+        """
+        等待直到取得一个令牌
+        """
+        if (delay := self.reserve()) > 0:
+            await asyncio.sleep(delay)
+
+
+class RateLimiter:
+    """
+    上游接口请求速率限制
+
+    按 ``Preference.rate_limits`` 中最长匹配的 ``主机名/路径前缀`` 规则分组限速，
+    没有匹配的规则时按主机名分组，使用 ``Preference.rate_limit`` 作为默认限制。
+    """
+    buckets: Dict[str, TokenBucket] = {}
+    """规则 -> 令牌桶"""
+
+    @classmethod
+    def match(cls, url: str) -> Tuple[str, Optional[Tuple[float, int]]]:
+        """
+        获取 URL 对应的限速规则
+
+        :param url: 请求的 URL（也可以是带有格式化占位符的 URL 模板）
+        :return: (规则名称, (每秒请求数, 突发请求数))，不限速时后者为 ``None``
+        """
+        split = urlsplit(url)
+        host = split.hostname or ""
+        target = f"{host}{split.path}"
+        rules = plugin_config.preference.rate_limits
+        matched = max((rule for rule in rules if target.startswith(rule)), key=len, default=None)
+        if matched is not None:
+            return matched, rules[matched]
+        return host, plugin_config.preference.rate_limit
+
+    @classmethod
+    def get_bucket(cls, url: str) -> Optional[TokenBucket]:
+        """
+        获取 URL 对应的令牌桶，不限速时返回 ``None``
+
+        :param url: 请求的 URL
+        """
+        key, limit = cls.match(url)
+        if not limit:
+            return None
+        rate, burst = limit
+        bucket = cls.buckets.get(key)
+        if bucket is None or (bucket.rate, bucket.burst) != (rate, max(1, burst)):
+            bucket = cls.buckets[key] = TokenBucket(rate, burst)
+        return bucket
+
+    @classmethod
+    async def acquire(cls, url: str):
+        """
+        等待直到允许向 URL 发送请求
+
+        :param url: 请求的 URL
+        """
+        if (bucket := cls.get_bucket(url)) is not None:
+            await bucket.acquire()
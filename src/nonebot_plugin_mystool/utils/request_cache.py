@@ -0,0 +1,90 @@
+import asyncio
+import time
+from typing import Dict, Tuple, Callable, Awaitable, Generic, TypeVar, Hashable, Optional
+
+__all__ = ["RequestCache"]
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class RequestCache(Generic[K, V]):
+    """
+    网络请求结果缓存
+
+    在有效期内直接返回缓存的结果；同一时间对同一个键的多次请求只会实际发送一次，其余调用等待并共享其结果（Single-flight）。
+    """
+
+    def __init__(self, name: str, ttl: Callable[[], float]):
+        """
+        :param name: 缓存名称，用于日志
+        :param ttl: 返回缓存有效期（单位：秒）的函数，每次写入缓存时调用，以便读取最新的插件配置
+        """
+        self.name = name
+        self.ttl = ttl
+        self.entries: Dict[K, Tuple[float, V]] = {}
+        """键 -> (过期时间戳, 结果)"""
+        self.in_flight: Dict[K, asyncio.Task] = {}
+        """键 -> 进行中的请求"""
+
+    def get_cached(self, key: K) -> Optional[V]:
+        """
+        获取未过期的缓存结果，没有则返回 ``None``
+
+        :param key: 键
+        """
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires < time.time():
+            del self.entries[key]
+            return None
+        return value
+
+    async def get(
+            self,
+            key: K,
+            fetch: Callable[[], Awaitable[V]],
+            cacheable: Callable[[V], bool] = lambda _: True
+    ) -> V:
+        """
+        获取结果，没有有效缓存时调用 ``fetch`` 发送请求
+
+        :param key: 键
+        :param fetch: 发送请求的函数
+        :param cacheable: 判断结果是否可以缓存的函数（例如请求失败的结果不应缓存）
+        """
+        if (value := self.get_cached(key)) is not None:
+            return value
+        task = self.in_flight.get(key)
+        if task is None or task.get_loop() is not asyncio.get_running_loop():
+            task = asyncio.ensure_future(fetch())
+            self.in_flight[key] = task
+
+            def on_done(done_task: asyncio.Task):
+                # 请求进行中缓存被设为失效时，不保存这次请求的结果
+                if self.in_flight.get(key) is not done_task:
+                    return
+                del self.in_flight[key]
+                if not done_task.cancelled() and done_task.exception() is None:
+                    result = done_task.result()
+                    if cacheable(result) and (ttl := self.ttl()) > 0:
+                        self.entries[key] = time.time() + ttl, result
+
+            task.add_done_callback(on_done)
+        # 某个调用方被取消时不影响其他等待同一请求的调用方
+        return await asyncio.shield(task)
+
+    def invalidate(self, key: Optional[K] = None):
+        """
+        使缓存失效
+
+        :param key: 键，为空则清空所有缓存
+        """
+        if key is None:
+            self.entries.clear()
+            self.in_flight.clear()
+        else:
+            self.entries.pop(key, None)
+            self.in_flight.pop(key, None)
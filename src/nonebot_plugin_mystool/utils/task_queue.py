@@ -0,0 +1,313 @@
+import asyncio
+import json
+import sqlite3
+import time
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Any, Callable, Awaitable, Iterable, Tuple
+
+from nonebot.log import logger
+from pydantic import BaseModel
+
+from ..model import data_path, plugin_config
+
+__all__ = ["task_queue_path", "QueuedTask", "TaskQueue"]
+
+task_queue_path = data_path / "tasks.db"
+"""任务队列数据库默认路径"""
+
+_CREATE_TABLE = (
+    "CREATE TABLE IF NOT EXISTS task ("
+    "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+    "run_id TEXT NOT NULL, "
+    "user_id TEXT NOT NULL, "
+    "bbs_uid TEXT NOT NULL, "
+    "task TEXT NOT NULL, "
+    "attempt INTEGER NOT NULL DEFAULT 0, "
+    "state TEXT NOT NULL, "
+    "next_run REAL NOT NULL, "
+    "payload TEXT NOT NULL DEFAULT '{}', "
+    "last_error TEXT, "
+    "updated REAL NOT NULL, "
+    "UNIQUE (run_id, user_id, bbs_uid, task, attempt))"
+)
+"""任务表建表语句，不同用户绑定了同一米游社账户时，各自的任务分别记录"""
+
+
+class QueuedTask(BaseModel):
+    """
+    任务队列中的一条任务记录，每次尝试（包括重试）对应一条记录
+    """
+    id: int
+    run_id: str
+    """所属批次，例如每日任务所在的日期"""
+    user_id: str
+    """用户ID"""
+    bbs_uid: str
+    """米游社账户UID"""
+    task: str
+    """任务类型"""
+    attempt: int = 0
+    """第几次尝试（首次执行为0）"""
+    state: str = "pending"
+    """任务状态"""
+    next_run: float
+    """下次可执行的时间戳"""
+    payload: Dict[str, Any] = {}
+    """任务附带的参数"""
+    last_error: Optional[str] = None
+    """上次执行出错时的错误信息"""
+
+
+class TaskQueue:
+    """
+    基于 SQLite 的持久化任务队列
+
+    每条记录对应一个 (用户, 账户, 任务, 尝试次数)，机器人重启后未完成的任务会继续执行，
+    重试会作为一条新的延时记录加入队列，而不是在协程中等待。
+    数据库读写都在单独的线程中依次执行，不阻塞事件循环。
+    """
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+    connection: Optional[sqlite3.Connection] = None
+    """数据库连接"""
+    executor: Optional[ThreadPoolExecutor] = None
+    """执行数据库读写的单线程线程池"""
+    handlers: Dict[str, Callable[[QueuedTask], Awaitable[Any]]] = OrderedDict()
+    """任务类型 -> 任务处理函数，执行顺序即注册顺序"""
+    drain_task: Optional["asyncio.Future[None]"] = None
+    """正在执行队列中任务的后台任务"""
+
+    @classmethod
+    def get_connection(cls) -> sqlite3.Connection:
+        """
+        获取数据库连接，首次调用时创建数据表
+        """
+        if cls.connection is None:
+            task_queue_path.parent.mkdir(parents=True, exist_ok=True)
+            cls.connection = sqlite3.connect(task_queue_path, check_same_thread=False)
+            cls.connection.row_factory = sqlite3.Row
+            cls.connection.execute("PRAGMA journal_mode=WAL")
+            cls.connection.execute(_CREATE_TABLE)
+            cls.connection.execute("CREATE INDEX IF NOT EXISTS task_due ON task (state, next_run)")
+            cls.connection.commit()
+        return cls.connection
+
+    @classmethod
+    async def _execute(cls, func: Callable[..., Any], *args):
+        """
+        在数据库线程中执行函数
+
+        :param func: 会进行数据库读写的函数
+        :param args: 函数参数
+        """
+        if cls.executor is None:
+            cls.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="mystool-task-queue")
+        return await asyncio.get_running_loop().run_in_executor(cls.executor, func, *args)
+
+    @classmethod
+    def register(cls, task: str):
+        """
+        注册任务处理函数的装饰器
+
+        :param task: 任务类型
+        """
+
+        def decorator(func: Callable[[QueuedTask], Awaitable[Any]]):
+            cls.handlers[task] = func
+            return func
+
+        return decorator
+
+    @classmethod
+    async def enqueue(
+            cls,
+            run_id: str,
+            items: Iterable[Tuple[str, str, str]],
+            attempt: int = 0,
+            delay: float = 0,
+            payload: Optional[Dict[str, Any]] = None
+    ) -> int:
+        """
+        加入任务，同一批次下相同的 (用户, 账户, 任务, 尝试次数) 只会加入一次
+
+        :param run_id: 所属批次
+        :param items: (用户ID, 米游社账户UID, 任务类型) 列表
+        :param attempt: 第几次尝试
+        :param delay: 延迟多久后执行（单位：秒）
+        :param payload: 任务附带的参数
+        :return: 实际加入的任务数
+        """
+        return await cls._execute(cls._enqueue, run_id, list(items), attempt, delay, payload)
+
+    @classmethod
+    def _enqueue(
+            cls,
+            run_id: str,
+            items: List[Tuple[str, str, str]],
+            attempt: int,
+            delay: float,
+            payload: Optional[Dict[str, Any]]
+    ) -> int:
+        now = time.time()
+        connection = cls.get_connection()
+        with connection:
+            cursor = connection.executemany(
+                "INSERT OR IGNORE INTO task "
+                "(run_id, user_id, bbs_uid, task, attempt, state, next_run, payload, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (run_id, user_id, bbs_uid, task, attempt, cls.PENDING, now + delay,
+                     json.dumps(payload or {}, ensure_ascii=False), now)
+                    for user_id, bbs_uid, task in items
+                ]
+            )
+        return cursor.rowcount
+
+    @classmethod
+    async def reschedule(cls, task: QueuedTask, delay: float, payload: Optional[Dict[str, Any]] = None):
+        """
+        将任务作为下一次尝试重新加入队列
+
+        :param task: 当前任务
+        :param delay: 延迟多久后执行（单位：秒）
+        :param payload: 下一次尝试附带的参数，为空则沿用当前参数
+        """
+        await cls.enqueue(
+            task.run_id,
+            [(task.user_id, task.bbs_uid, task.task)],
+            attempt=task.attempt + 1,
+            delay=delay,
+            payload=task.payload if payload is None else payload
+        )
+
+    @classmethod
+    async def _set_state(cls, task_id: int, state: str, error: Optional[str] = None):
+        await cls._execute(cls._update_state, task_id, state, error)
+
+    @classmethod
+    def _update_state(cls, task_id: int, state: str, error: Optional[str]):
+        connection = cls.get_connection()
+        with connection:
+            connection.execute(
+                "UPDATE task SET state = ?, last_error = ?, updated = ? WHERE id = ?",
+                (state, error, time.time(), task_id)
+            )
+
+    @classmethod
+    async def claim_due(cls) -> List[QueuedTask]:
+        """
+        取出所有已到执行时间的任务，并标记为执行中
+        """
+        return await cls._execute(cls._claim_due)
+
+    @classmethod
+    def _claim_due(cls) -> List[QueuedTask]:
+        connection = cls.get_connection()
+        with connection:
+            rows = connection.execute(
+                "SELECT * FROM task WHERE state = ? AND next_run <= ? ORDER BY id",
+                (cls.PENDING, time.time())
+            ).fetchall()
+            connection.executemany(
+                "UPDATE task SET state = ?, updated = ? WHERE id = ?",
+                [(cls.RUNNING, time.time(), row["id"]) for row in rows]
+            )
+        tasks = []
+        for row in rows:
+            data = dict(row)
+            data["payload"] = json.loads(data["payload"] or "{}")
+            tasks.append(QueuedTask.parse_obj(data))
+        return tasks
+
+    @classmethod
+    async def resume(cls):
+        """
+        机器人启动时，将上次运行中断的任务重新标记为待执行，并清理过期记录
+        """
+        resumed = await cls._execute(cls._resume)
+        if resumed:
+            logger.info(f"{plugin_config.preference.log_head}恢复了 {resumed} 个上次未完成的队列任务")
+
+    @classmethod
+    def _resume(cls) -> int:
+        connection = cls.get_connection()
+        with connection:
+            cursor = connection.execute(
+                "UPDATE task SET state = ?, updated = ? WHERE state = ?",
+                (cls.PENDING, time.time(), cls.RUNNING)
+            )
+            connection.execute(
+                "DELETE FROM task WHERE state IN (?, ?) AND updated < ?",
+                (cls.DONE, cls.FAILED, time.time() - plugin_config.preference.task_record_retention * 86400)
+            )
+        return cursor.rowcount
+
+    @classmethod
+    async def run(cls, task: QueuedTask) -> Any:
+        """
+        执行一条任务，并记录执行结果（任务处理函数抛出的异常会被记录为执行失败，不会向外抛出）
+
+        :param task: 从队列中取出的任务
+        :return: 任务处理函数的返回值，执行失败时返回 ``None``
+        """
+        handler = cls.handlers.get(task.task)
+        if handler is None:
+            await cls._set_state(task.id, cls.FAILED, f"未知的任务类型 {task.task}")
+            return None
+        try:
+            result = await handler(task)
+        except Exception:
+            logger.exception(
+                f"{plugin_config.preference.log_head}队列任务 {task.task} 执行出错 - 用户 {task.user_id} 账户 {task.bbs_uid}"
+            )
+            await cls._set_state(task.id, cls.FAILED, traceback.format_exc())
+            return None
+        await cls._set_state(task.id, cls.DONE)
+        return result
+
+    @classmethod
+    async def _drain(cls, runner: Callable[[List[QueuedTask]], Awaitable[None]]):
+        """
+        取出所有已到执行时间的任务交给 ``runner`` 执行，直到没有到期的任务为止
+        """
+        while tasks := await cls.claim_due():
+            await runner(tasks)
+
+    @classmethod
+    async def drain(cls, runner: Callable[[List[QueuedTask]], Awaitable[None]]):
+        """
+        执行所有已到执行时间的任务，返回时调用前加入的到期任务均已执行完成
+
+        同一时间只有一个执行队列任务的后台任务。调用时已有后台任务在执行，则先等待其结束
+        （它可能在本次调用前加入的任务入队之前就已取出任务），再开始新一轮执行；
+        若等待期间已有其他调用开始了新一轮执行，则直接等待该轮结束。
+
+        :param runner: 执行取出的一批任务的函数，应通过 ``run`` 执行每条任务
+        """
+        started_before = cls.drain_task
+        while True:
+            running = cls.drain_task
+            if running is None or running.done():
+                running = cls.drain_task = asyncio.ensure_future(cls._drain(runner))
+            elif running is started_before:
+                await asyncio.wait({running})
+                continue
+            await asyncio.shield(running)
+            return
+
+    @classmethod
+    def close(cls):
+        """
+        等待进行中的数据库读写完成，并关闭数据库连接
+        """
+        if cls.executor is not None:
+            cls.executor.shutdown(wait=True)
+            cls.executor = None
+        if cls.connection is not None:
+            cls.connection.close()
+            cls.connection = None
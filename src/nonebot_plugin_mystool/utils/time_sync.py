@@ -0,0 +1,166 @@
+import asyncio
+import time
+from typing import Optional, NamedTuple
+
+import httpx
+import ntplib
+from nonebot.log import logger
+
+from ..model import plugin_config
+from ..utils.http_client import HttpClientManager
+
+__all__ = ["URL_EXCHANGE_HOST", "ExchangeTiming", "ExchangeClock"]
+
+URL_EXCHANGE_HOST = "https://api-takumi.miyoushe.com/"
+"""兑换接口所在的服务器，用于测量网络往返时延"""
+
+
+class ExchangeTiming(NamedTuple):
+    """
+    一次兑换的计时报告
+    """
+    target: float
+    """商品开售时间（标准时间戳）"""
+    fire_at: float
+    """计划发送首个请求的本地时间戳"""
+    sent_at: float
+    """实际发送首个请求的本地时间戳"""
+    offset: float
+    """本地时钟相对 NTP 服务器的偏差（单位：秒，标准时间 = 本地时间 + offset）"""
+    rtt: Optional[float]
+    """到兑换接口服务器的网络往返时延（单位：秒）"""
+
+    @property
+    def skew(self) -> float:
+        """
+        实际发送时间相对计划发送时间的偏差（单位：秒）
+        """
+        return self.sent_at - self.fire_at
+
+    @property
+    def arrival_error(self) -> float:
+        """
+        预计请求到达服务器的时间相对开售时间的偏差（单位：秒，正数为晚到）
+        """
+        return self.sent_at + self.offset + (self.rtt or 0) / 2 - self.target
+
+    def __str__(self):
+        return f"时钟偏差 {self.offset * 1000:.1f}ms，" \
+               f"往返时延 {(self.rtt or 0) * 1000:.1f}ms，" \
+               f"发送偏差 {self.skew * 1000:.1f}ms，" \
+               f"预计到达偏差 {self.arrival_error * 1000:+.1f}ms"
+
+
+class ExchangeClock:
+    """
+    兑换计时器
+
+    通过 NTP 校准本地时钟偏差，并测量到兑换接口服务器的网络往返时延，
+    使首个兑换请求恰好在商品开售时刻到达服务器。
+    """
+    offset: float = 0
+    """本地时钟相对 NTP 服务器的偏差（单位：秒，标准时间 = 本地时间 + offset）"""
+    rtt: Optional[float] = None
+    """到兑换接口服务器的网络往返时延（单位：秒）"""
+    synced_at: Optional[float] = None
+    """上次校准的本地时间戳"""
+    _lock: Optional[asyncio.Lock] = None
+
+    @classmethod
+    async def sync_ntp(cls) -> bool:
+        """
+        通过 NTP 服务器校准本地时钟偏差
+
+        :return: 是否成功
+        """
+        server = plugin_config.preference.ntp_server
+        if not server:
+            return False
+        try:
+            response = await asyncio.get_running_loop().run_in_executor(
+                None,
+                lambda: ntplib.NTPClient().request(server, version=3, timeout=plugin_config.preference.timeout)
+            )
+        except Exception:
+            logger.exception(f"{plugin_config.preference.log_head}NTP 时间校准失败 - 服务器: {server}")
+            return False
+        cls.offset = response.offset
+        logger.info(f"{plugin_config.preference.log_head}NTP 时间校准完成 - 服务器: {server}，"
+                    f"本地时钟偏差: {cls.offset * 1000:.1f}ms")
+        return True
+
+    @classmethod
+    async def measure_rtt(cls, samples: int = 3) -> Optional[float]:
+        """
+        测量到兑换接口服务器的网络往返时延，取多次测量中的最小值（首次测量可能包含建立连接的耗时）
+
+        :param samples: 测量次数
+        """
+        rtts = []
+        for _ in range(samples):
+            try:
+                async with HttpClientManager.client(URL_EXCHANGE_HOST) as client:
+                    start = time.perf_counter()
+                    await client.head(URL_EXCHANGE_HOST, timeout=plugin_config.preference.timeout)
+                    rtts.append(time.perf_counter() - start)
+            except httpx.HTTPError:
+                logger.exception(f"{plugin_config.preference.log_head}测量兑换接口服务器往返时延失败")
+        if rtts:
+            cls.rtt = min(rtts)
+            logger.info(f"{plugin_config.preference.log_head}兑换接口服务器往返时延: {cls.rtt * 1000:.1f}ms")
+        return cls.rtt
+
+    @classmethod
+    async def ensure_synced(cls, max_age: Optional[float] = None):
+        """
+        如果距离上次校准超过 ``max_age`` 秒，则重新校准时钟偏差和往返时延（多个兑换任务同时调用时只会校准一次）
+
+        :param max_age: 校准结果的有效时间（单位：秒），默认为 ``Preference.exchange_sync_lead``
+        """
+        if max_age is None:
+            max_age = plugin_config.preference.exchange_sync_lead
+        if cls._lock is None:
+            cls._lock = asyncio.Lock()
+        async with cls._lock:
+            if cls.synced_at is not None and time.time() - cls.synced_at < max_age:
+                return
+            await cls.sync_ntp()
+            await cls.measure_rtt()
+            cls.synced_at = time.time()
+
+    @classmethod
+    def now(cls) -> float:
+        """
+        校准后的当前标准时间戳
+        """
+        return time.time() + cls.offset
+
+    @classmethod
+    def fire_time(cls, target: float) -> float:
+        """
+        计算为使请求在标准时间 ``target`` 到达服务器，应当发送请求的本地时间戳（单程时延按往返时延的一半估计）
+
+        :param target: 请求到达服务器的标准时间戳
+        """
+        return target - cls.offset - (cls.rtt or 0) / 2
+
+    @classmethod
+    async def sleep_until(cls, local_timestamp: float):
+        """
+        不阻塞事件循环地等待到指定的本地时间戳，临近时缩短等待间隔以提高精度
+
+        :param local_timestamp: 本地时间戳
+        """
+        while (remaining := local_timestamp - time.time()) > 0:
+            await asyncio.sleep(remaining - 0.005 if remaining > 0.015 else 0)
+
+    @classmethod
+    def report(cls, target: float, fire_at: float, sent_at: float) -> ExchangeTiming:
+        """
+        生成计时报告
+
+        :param target: 商品开售时间（标准时间戳）
+        :param fire_at: 计划发送首个请求的本地时间戳
+        :param sent_at: 实际发送首个请求的本地时间戳
+        """
+        return ExchangeTiming(target=target, fire_at=fire_at, sent_at=sent_at, offset=cls.offset, rtt=cls.rtt)
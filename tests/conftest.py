@@ -0,0 +1,11 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import nonebot
+
+# 插件数据和配置文件保存在工作目录下，测试时使用临时目录，避免写入仓库
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+os.chdir(tempfile.mkdtemp(prefix="mystool-test-"))
+nonebot.init()
@@ -0,0 +1,124 @@
+from datetime import datetime
+
+import pytest
+
+from nonebot_plugin_mystool.model import (plugin_config, Preference, GenshinNote, GenshinNoteNotice, StarRailNote,
+                                          StarRailNoteNotice)
+from nonebot_plugin_mystool.utils import note_scheduler
+from nonebot_plugin_mystool.utils.note_scheduler import (CHECK_SLACK, GENSHIN_RESIN_RECOVERY,
+                                                         STARRAIL_STAMINA_RECOVERY, genshin_next_check,
+                                                         starrail_next_check)
+
+MIN_DELAY = 60 * 60
+MAX_DELAY = 720 * 60
+
+
+@pytest.fixture(autouse=True)
+def preference(monkeypatch):
+    monkeypatch.setattr(plugin_config.preference, "resin_interval", 60)
+    monkeypatch.setattr(plugin_config.preference, "note_max_interval", 720)
+    monkeypatch.setattr(plugin_config.preference, "note_adaptive", True)
+    monkeypatch.setattr(Preference, "notice_time", property(lambda self: False))
+
+
+def set_now(monkeypatch, hour: int, minute: int = 0):
+    """
+    固定 ``note_scheduler`` 中的当前时间
+    """
+    now = datetime(2024, 1, 1, hour, minute)
+
+    class FixedDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return now
+
+    monkeypatch.setattr(note_scheduler, "datetime", FixedDatetime)
+
+
+def genshin_note(**kwargs) -> GenshinNote:
+    data = dict(current_resin=100, resin_recovery_time=100 * GENSHIN_RESIN_RECOVERY,
+                current_home_coin=2400, max_home_coin=2400, home_coin_recovery_time=0,
+                transformer={"obtained": False})
+    data.update(kwargs)
+    return GenshinNote.parse_obj(data)
+
+
+def starrail_note(**kwargs) -> StarRailNote:
+    data = dict(current_stamina=100, max_stamina=240, stamina_recover_time=140 * STARRAIL_STAMINA_RECOVERY,
+                current_rogue_score=14000, max_rogue_score=14000)
+    data.update(kwargs)
+    return StarRailNote.parse_obj(data)
+
+
+def test_genshin_resin_below_threshold():
+    # 100 -> 180 需要 80 点树脂的恢复时间
+    delay = genshin_next_check(genshin_note(), GenshinNoteNotice(), 180)
+    assert delay == 80 * GENSHIN_RESIN_RECOVERY + CHECK_SLACK
+
+
+def test_genshin_resin_far_below_threshold_is_capped():
+    delay = genshin_next_check(genshin_note(current_resin=0, resin_recovery_time=200 * GENSHIN_RESIN_RECOVERY),
+                               GenshinNoteNotice(), 180)
+    assert delay == MAX_DELAY
+
+
+def test_genshin_resin_notified_checks_at_min_interval():
+    note = genshin_note(current_resin=190, resin_recovery_time=10 * GENSHIN_RESIN_RECOVERY)
+    assert genshin_next_check(note, GenshinNoteNotice(current_resin=True), 180) == MIN_DELAY
+    note = genshin_note(current_resin=200, resin_recovery_time=0)
+    assert genshin_next_check(note, GenshinNoteNotice(current_resin_full=True), 180) == MIN_DELAY
+
+
+def test_genshin_home_coin_recovery_time():
+    note = genshin_note(current_resin=0, resin_recovery_time=200 * GENSHIN_RESIN_RECOVERY,
+                        current_home_coin=2000, home_coin_recovery_time=3 * 3600)
+    assert genshin_next_check(note, GenshinNoteNotice(), 180) == 3 * 3600 + CHECK_SLACK
+
+
+def test_genshin_home_coin_not_full_does_not_force_min_interval():
+    note = genshin_note(current_resin=0, resin_recovery_time=200 * GENSHIN_RESIN_RECOVERY,
+                        current_home_coin=100, home_coin_recovery_time=40 * 3600)
+    assert genshin_next_check(note, GenshinNoteNotice(), 180) == MAX_DELAY
+
+
+def test_genshin_home_coin_notified_is_ignored():
+    note = genshin_note(current_resin=0, resin_recovery_time=200 * GENSHIN_RESIN_RECOVERY,
+                        home_coin_recovery_time=0)
+    assert genshin_next_check(note, GenshinNoteNotice(current_home_coin=True), 180) == MAX_DELAY
+
+
+def test_genshin_missing_data_checks_at_min_interval():
+    note = genshin_note(current_resin=None, resin_recovery_time=None)
+    assert genshin_next_check(note, GenshinNoteNotice(), 180) == MIN_DELAY
+
+
+def test_starrail_stamina_below_threshold():
+    # 100 -> 200 需要 100 点开拓力的恢复时间
+    delay = starrail_next_check(starrail_note(), StarRailNoteNotice(), 200)
+    assert delay == 100 * STARRAIL_STAMINA_RECOVERY + CHECK_SLACK
+
+
+def test_starrail_stamina_notified_checks_at_min_interval():
+    note = starrail_note(current_stamina=230, stamina_recover_time=10 * STARRAIL_STAMINA_RECOVERY)
+    assert starrail_next_check(note, StarRailNoteNotice(current_stamina=True), 200) == MIN_DELAY
+
+
+def test_starrail_rogue_score_waits_for_notice_window(monkeypatch):
+    set_now(monkeypatch, 15)
+    note = starrail_note(current_stamina=0, stamina_recover_time=240 * STARRAIL_STAMINA_RECOVERY,
+                         current_rogue_score=0)
+    assert starrail_next_check(note, StarRailNoteNotice(), 200) == 5 * 3600
+
+
+def test_starrail_rogue_score_checks_once_per_window(monkeypatch):
+    set_now(monkeypatch, 20, 10)
+    monkeypatch.setattr(Preference, "notice_time", property(lambda self: True))
+    note = starrail_note(current_stamina=0, stamina_recover_time=240 * STARRAIL_STAMINA_RECOVERY,
+                         current_rogue_score=0)
+    # 本次检查已在提醒时段内，下一次提醒在明天，受最长间隔限制
+    assert starrail_next_check(note, StarRailNoteNotice(), 200) == MAX_DELAY
+
+
+def test_note_adaptive_disabled(monkeypatch):
+    monkeypatch.setattr(plugin_config.preference, "note_adaptive", False)
+    assert genshin_next_check(genshin_note(), GenshinNoteNotice(), 180) == MIN_DELAY